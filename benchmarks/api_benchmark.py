@@ -0,0 +1,396 @@
+"""
+Benchmark the pathway API hot paths against a seeded database.
+
+Seeds a synthetic dataset (users, patients, templates with N steps,
+pathways, notifications and assignments), then drives get_pathways,
+get_notifications, complete_step, initialize_pathway and create_assignment
+through the API and reports throughput and p50/p90/p99 latency per
+operation. Results are written as JSON named after the current commit so
+runs can be compared:
+
+    DATABASE_URL=postgresql://localhost/pathways_bench \\
+        python benchmarks/api_benchmark.py --reset --patients 5000 --steps 12
+    python benchmarks/api_benchmark.py --compare benchmarks/results/<commit>.json
+
+By default requests go through the app in-process; --base-url targets a
+running server instead. The schema relies on PostgreSQL (ARRAY columns,
+ON CONFLICT upserts), so SQLite is not supported. --reset drops and
+recreates every table, so point DATABASE_URL at a dedicated database.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Background jobs would compete with the measured requests
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import numpy as np
+
+OPERATIONS = ("get_pathways", "get_notifications", "complete_step", "initialize_pathway", "create_assignment")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+ROLES = ("nurse", "physician", "care_coordinator", "pharmacist")
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(RESULTS_DIR), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def insert_returning_ids(db, model, rows):
+    from sqlalchemy import insert
+
+    if not rows:
+        return []
+
+    return list(db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows))
+
+
+def seed(args, rng: random.Random):
+    """
+    Bulk insert the synthetic dataset and return the ids the operations draw from
+    """
+    import models
+    from database import SessionLocal
+    from services.pathway_engine import pathway_engine
+
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+
+    try:
+        user_ids = insert_returning_ids(db, models.User, [
+            {"name": f"Bench User {i}", "email": f"bench-{now.timestamp()}-{i}@example.org", "role": ROLES[i % len(ROLES)]}
+            for i in range(args.users)
+        ])
+
+        patient_ids = insert_returning_ids(db, models.Patient, [
+            {
+                "first_name": f"Given{i % 101}",
+                "last_name": f"Family{i % 997}",
+                "date_of_birth": datetime(1930 + rng.randrange(80), rng.randint(1, 12), rng.randint(1, 28)),
+                "gender": rng.choice(("male", "female"))
+            } for i in range(args.patients)
+        ])
+
+        template_ids = insert_returning_ids(db, models.PathwayTemplate, [
+            {"name": f"Bench Template {i}", "version": "1.0", "status": "active", "created_by": user_ids[0]}
+            for i in range(args.templates)
+        ])
+
+        step_ids = insert_returning_ids(db, models.PathwayStep, [
+            {
+                "template_id": template_id,
+                "name": f"Step {order}",
+                "step_order": order,
+                "step_type": "task",
+                "estimated_duration": rng.randint(1, 14),
+                "required_roles": [ROLES[order % len(ROLES)]]
+            } for template_id in template_ids for order in range(1, args.steps + 1)
+        ])
+        steps = {
+            template_id: step_ids[index * args.steps:(index + 1) * args.steps]
+            for index, template_id in enumerate(template_ids)
+        }
+
+        pathway_rows = []
+        for patient_id in patient_ids:
+            for _ in range(args.pathways_per_patient):
+                template_id = rng.choice(template_ids)
+                position = rng.randrange(args.steps)
+                pathway_rows.append({
+                    "patient_id": patient_id,
+                    "template_id": template_id,
+                    "current_step_id": steps[template_id][position],
+                    "status": "active",
+                    "start_date": now - timedelta(days=rng.randint(1, 365)),
+                    "estimated_end_date": now + timedelta(days=rng.randint(1, 365)),
+                    "created_by": rng.choice(user_ids)
+                })
+        pathway_ids = insert_returning_ids(db, models.PatientPathway, pathway_rows)
+
+        # Each seeded pathway gets at most one assignment, on its current step
+        assigned = rng.sample(range(len(pathway_ids)), min(args.assignments, len(pathway_ids)))
+        db.execute(models.StepAssignment.__table__.insert(), [
+            {
+                "pathway_id": pathway_ids[index],
+                "step_id": pathway_rows[index]["current_step_id"],
+                "assigned_to_id": rng.choice(user_ids),
+                "due_date": now + timedelta(days=rng.randint(-10, 30)),
+                "status": "pending"
+            } for index in assigned
+        ])
+
+        db.execute(models.Notification.__table__.insert(), [
+            {
+                "recipient_id": rng.choice(user_ids),
+                "title": "Step assigned",
+                "description": "A pathway step was assigned to you",
+                "notification_type": "assignment",
+                "related_patient_id": rng.choice(patient_ids),
+                "priority": rng.choice(("low", "normal", "high")),
+                "status": rng.choice(("unread", "read"))
+            } for _ in range(args.notifications)
+        ])
+
+        db.commit()
+        pathway_engine.refresh_progress(db, pathway_ids)
+    finally:
+        db.close()
+
+    assigned_set = set(assigned)
+    return {
+        "user_ids": user_ids,
+        "patient_ids": patient_ids,
+        "template_ids": template_ids,
+        "steps": steps,
+        # pathway id -> current step, consumed by complete_step
+        "current_steps": {pathway_ids[i]: row["current_step_id"] for i, row in enumerate(pathway_rows)},
+        # (pathway, step) pairs free for create_assignment
+        "unassigned": [
+            (pathway_ids[i], step_id)
+            for i, row in enumerate(pathway_rows)
+            for step_id in steps[row["template_id"]]
+            if i not in assigned_set or step_id != row["current_step_id"]
+        ]
+    }
+
+
+class Workload:
+    """
+    Request factories per operation, drawing ids from the seeded dataset
+    """
+
+    def __init__(self, data, rng: random.Random, page_size: int):
+        self.data = data
+        self.rng = rng
+        self.page_size = page_size
+        self.pages = max(1, len(data["current_steps"]) // page_size)
+        self._lock = threading.Lock()
+        rng.shuffle(data["unassigned"])
+        self._pathways = list(data["current_steps"])
+        rng.shuffle(self._pathways)
+
+    def get_pathways(self, client):
+        page = self.rng.randint(1, min(self.pages, 20))
+        return client.get("/api/pathways/", params={"status": "active", "limit": self.page_size, "page": page})
+
+    def get_notifications(self, client):
+        return client.get("/api/notifications/", params={"recipient_id": self.rng.choice(self.data["user_ids"])})
+
+    def complete_step(self, client):
+        with self._lock:
+            pathway_id = self._pathways.pop()
+            step_id = self.data["current_steps"][pathway_id]
+
+        response = client.post(f"/api/pathways/{pathway_id}/complete-step", json={
+            "step_id": step_id,
+            "completed_by_id": self.rng.choice(self.data["user_ids"]),
+            "notes": "benchmark"
+        })
+
+        if response.status_code == 200 and response.json().get("current_step_id"):
+            with self._lock:
+                self.data["current_steps"][pathway_id] = response.json()["current_step_id"]
+                self._pathways.insert(0, pathway_id)
+
+        return response
+
+    def initialize_pathway(self, client):
+        return client.post("/api/pathways/", json={
+            "patient_id": self.rng.choice(self.data["patient_ids"]),
+            "template_id": self.rng.choice(self.data["template_ids"]),
+            "created_by_id": self.rng.choice(self.data["user_ids"])
+        })
+
+    def create_assignment(self, client):
+        with self._lock:
+            pathway_id, step_id = self.data["unassigned"].pop()
+
+        return client.post("/api/assignments/", json={
+            "pathway_id": pathway_id,
+            "step_id": step_id,
+            "assigned_to_id": self.rng.choice(self.data["user_ids"]),
+            "due_date": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat()
+        })
+
+
+def make_client(base_url):
+    if base_url:
+        import httpx
+        return httpx.Client(base_url=base_url, timeout=60)
+
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+
+def measure(operation, workload, clients, iterations: int, warmup: int):
+    request = getattr(workload, operation)
+
+    for _ in range(warmup):
+        request(clients[0])
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def run(client, count):
+        for _ in range(count):
+            started = time.perf_counter()
+            try:
+                response = request(client)
+                failed = response.status_code >= 400 and f"HTTP {response.status_code}: {response.text[:200]}"
+            except Exception as e:
+                failed = f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - started
+
+            # Only successful responses are timed; failures are counted apart
+            with lock:
+                if failed:
+                    errors.append(failed)
+                else:
+                    latencies.append(elapsed)
+
+    shares = [iterations // len(clients) + (1 if i < iterations % len(clients) else 0) for i in range(len(clients))]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        list(executor.map(run, clients, shares))
+    wall = time.perf_counter() - started
+
+    summary = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 1)
+    }
+    if not latencies:
+        return summary
+
+    milliseconds = np.array(latencies) * 1000
+    return {
+        **summary,
+        "mean_ms": round(float(milliseconds.mean()), 2),
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 2),
+        "p90_ms": round(float(np.percentile(milliseconds, 90)), 2),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 2),
+        "max_ms": round(float(milliseconds.max()), 2)
+    }
+
+
+def compare(previous, current):
+    print(f"\n{'operation':<20}{'p50 ms':>26}{'p99 ms':>26}{'req/s':>26}")
+    for operation, result in current["results"].items():
+        before = previous.get("results", {}).get(operation)
+        if before is None:
+            continue
+
+        cells = []
+        for key in ("p50_ms", "p99_ms", "throughput_rps"):
+            if before.get(key) is None or result.get(key) is None:
+                cells.append("n/a")
+                continue
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{before[key]:.1f}->{result[key]:.1f} ({change:+.0f}%)")
+
+        print(f"{operation:<20}" + "".join(f"{cell:>26}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables before seeding")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--templates", type=int, default=5)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--pathways-per-patient", type=int, default=1)
+    parser.add_argument("--notifications", type=int, default=20000)
+    parser.add_argument("--assignments", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--operations", default=",".join(OPERATIONS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="result file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to diff against")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("Set DATABASE_URL or pass --database-url")
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from database import Base, engine
+    import models  # noqa: F401  registers the tables
+
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    data = seed(args, rng)
+    seed_seconds = time.perf_counter() - started
+    print(f"Seeded {args.patients} patients and {len(data['current_steps'])} pathways in {seed_seconds:.1f}s")
+
+    operations = [operation.strip() for operation in args.operations.split(",") if operation.strip()]
+    unknown = set(operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"Unknown operations: {', '.join(sorted(unknown))}")
+
+    if "create_assignment" in operations and len(data["unassigned"]) < args.iterations + args.warmup:
+        parser.error("Not enough unassigned pathway steps; seed more patients or fewer assignments")
+    # Pathways leave the complete_step pool once their last step is done, so
+    # only the seeded pathways are guaranteed to be available
+    if "complete_step" in operations and len(data["current_steps"]) < args.iterations + args.warmup:
+        parser.error("Not enough active pathways for complete_step; seed more patients or run fewer iterations")
+
+    workload = Workload(data, rng, args.page_size)
+    clients = [make_client(args.base_url) for _ in range(args.concurrency)]
+
+    results = {}
+    for operation in operations:
+        results[operation] = measure(operation, workload, clients, args.iterations, args.warmup)
+        print(f"{operation:<20} {json.dumps(results[operation])}")
+
+    report = {
+        "commit": current_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.base_url or "in-process",
+        "dataset": {
+            key: getattr(args, key) for key in (
+                "users", "patients", "templates", "steps", "pathways_per_patient",
+                "notifications", "assignments", "seed"
+            )
+        },
+        "run": {"iterations": args.iterations, "warmup": args.warmup, "concurrency": args.concurrency},
+        "seed_seconds": round(seed_seconds, 2),
+        "results": results
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Stress the optimistic concurrency control on patient pathways.
+
+Each round points several clients at the same pathway at once, released
+together by a barrier:
+
+  complete_step  every client completes the pathway's current step
+  update         every client sends PUT /api/pathways/{id} with the version
+                 it read, each setting a different status
+
+Exactly one request per round may succeed; the rest must be rejected
+(409 for a lost compare-and-swap, 400 when the step had already moved on)
+and the database must hold one completed_steps row per step and a version
+equal to the number of successful writes. Any violation is printed and
+the script exits non-zero:
+
+    DATABASE_URL=postgresql://localhost/pathways_bench \\
+        python benchmarks/concurrency_stress.py --pathways 50 --clients 8
+
+By default requests go through the app in-process; --base-url targets a
+running server instead, which exercises real parallel connections.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+STATUSES = ("active", "on_hold", "suspended", "review")
+
+
+def make_client(base_url):
+    if base_url:
+        import httpx
+        return httpx.Client(base_url=base_url, timeout=60)
+
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+
+def seed(pathways: int, steps: int):
+    """
+    One template with the given number of steps and that many fresh pathways on its first step
+    """
+    from sqlalchemy import insert
+    import models
+    from database import SessionLocal
+
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+
+    try:
+        user = models.User(name="Stress User", email=f"stress-{now.timestamp()}@example.org", role="nurse")
+        patient = models.Patient(first_name="Stress", last_name="Patient", date_of_birth=datetime(1960, 1, 1))
+        template = models.PathwayTemplate(name="Stress Template", version="1.0", status="active")
+        db.add_all([user, patient, template])
+        db.flush()
+
+        step_ids = list(db.scalars(insert(models.PathwayStep).returning(models.PathwayStep.id, sort_by_parameter_order=True), [
+            {"template_id": template.id, "name": f"Step {order}", "step_order": order, "step_type": "task", "required_roles": ["nurse"]}
+            for order in range(1, steps + 1)
+        ]))
+        pathway_ids = list(db.scalars(insert(models.PatientPathway).returning(models.PatientPathway.id, sort_by_parameter_order=True), [
+            {
+                "patient_id": patient.id,
+                "template_id": template.id,
+                "current_step_id": step_ids[0],
+                "status": "active",
+                "created_by": user.id
+            } for _ in range(pathways)
+        ]))
+        db.commit()
+
+        return user.id, step_ids, pathway_ids
+    finally:
+        db.close()
+
+
+def race(clients, request):
+    """
+    Fire request(client, index) from every client at once and collect the responses
+    """
+    barrier = threading.Barrier(len(clients))
+    responses = [None] * len(clients)
+
+    def run(index):
+        barrier.wait()
+        responses[index] = request(clients[index], index)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--base-url", help="stress a running server instead of the in-process app")
+    parser.add_argument("--pathways", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("Set DATABASE_URL or pass --database-url")
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import func
+    import models
+    from database import SessionLocal
+
+    user_id, step_ids, pathway_ids = seed(args.pathways, args.steps)
+    clients = [make_client(args.base_url) for _ in range(args.clients)]
+    outcomes = {"complete_step": Counter(), "update": Counter()}
+    successes = Counter()
+    failures = []
+    started = time.perf_counter()
+
+    for pathway_id in pathway_ids:
+        for step_id in step_ids:
+            responses = race(clients, lambda client, index: client.post(
+                f"/api/pathways/{pathway_id}/complete-step",
+                json={"step_id": step_id, "completed_by_id": user_id, "notes": f"client {index}"}
+            ))
+            codes = Counter(response.status_code for response in responses)
+            outcomes["complete_step"].update(codes)
+            successes[pathway_id] += codes[200]
+            if codes[200] != 1 or set(codes) - {200, 400, 409}:
+                failures.append(f"pathway {pathway_id} step {step_id}: {dict(codes)}")
+
+        version = clients[0].get(f"/api/pathways/{pathway_id}").json()["version"]
+        responses = race(clients, lambda client, index: client.put(
+            f"/api/pathways/{pathway_id}",
+            json={"status": STATUSES[index % len(STATUSES)], "version": version}
+        ))
+        codes = Counter(response.status_code for response in responses)
+        outcomes["update"].update(codes)
+        successes[pathway_id] += codes[200]
+        if codes[200] != 1 or set(codes) - {200, 409}:
+            failures.append(f"pathway {pathway_id} update: {dict(codes)}")
+
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        duplicates = db.query(
+            models.CompletedStep.pathway_id, models.CompletedStep.step_id, func.count()
+        ).filter(
+            models.CompletedStep.pathway_id.in_(pathway_ids)
+        ).group_by(
+            models.CompletedStep.pathway_id, models.CompletedStep.step_id
+        ).having(func.count() > 1).all()
+        for pathway_id, step_id, count in duplicates:
+            failures.append(f"pathway {pathway_id} step {step_id}: {count} completed_steps rows")
+
+        versions = dict(db.query(models.PatientPathway.id, models.PatientPathway.version).filter(
+            models.PatientPathway.id.in_(pathway_ids)
+        ).all())
+        for pathway_id in pathway_ids:
+            # Seeded at version 1, plus one per successful write
+            if versions[pathway_id] != 1 + successes[pathway_id]:
+                failures.append(
+                    f"pathway {pathway_id}: version {versions[pathway_id]} after {successes[pathway_id]} successful writes"
+                )
+    finally:
+        db.close()
+
+    rounds = len(pathway_ids) * (len(step_ids) + 1)
+    print(f"{rounds} rounds of {args.clients} concurrent clients in {elapsed:.1f}s")
+    for operation, codes in outcomes.items():
+        print(f"{operation:<14} {dict(sorted(codes.items()))}")
+
+    if failures:
+        print(f"{len(failures)} violations:")
+        for failure in failures[:50]:
+            print(f"  {failure}")
+        sys.exit(1)
+
+    print("No lost updates or duplicate completions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+"""
+Generate a large, consistent synthetic dataset for load testing.
+
+Builds users, pathway templates (steps, dependencies and decision points),
+patients with care teams, pathways part way through their templates with
+their completed_steps history, open step assignments and notifications.
+Each pathway takes one branch at every decision point it reaches, so some
+histories skip steps the way the engine's branches do.
+Columns are generated with numpy per chunk of patients and written with
+COPY with foreign key triggers off, so millions of rows take minutes
+rather than hours:
+
+    DATABASE_URL=postgresql://localhost/pathways_load \\
+        python benchmarks/generate_data.py --preset hospital --seed 7
+
+Timestamps are relative to --as-of (default now); the same seed, sizes,
+--chunk-size and --as-of always produce the same data. Ids are
+reserved from the table sequences, so generated rows can be added to a
+database that already has data, but nothing else should write to it while
+the generator runs. Summary counters, the caseload access index and step
+duration statistics are rebuilt at the end unless --skip-derived is given.
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import numpy as np
+
+PRESETS = {
+    "clinic": {
+        "users": 25, "patients": 2000, "templates": 8, "steps": 8,
+        "pathways_per_patient": 1.5, "notifications_per_pathway": 3.0
+    },
+    "hospital": {
+        "users": 800, "patients": 150000, "templates": 60, "steps": 12,
+        "pathways_per_patient": 2.0, "notifications_per_pathway": 4.0
+    },
+    "region": {
+        "users": 8000, "patients": 2000000, "templates": 250, "steps": 15,
+        "pathways_per_patient": 2.5, "notifications_per_pathway": 4.0
+    },
+}
+
+ROLES = np.array(["nurse", "physician", "care_coordinator", "pharmacist"])
+# Care team members per patient, one per role
+TEAM_ROLES = (0, 1, 2)
+STEP_TYPES = np.array(["assessment", "task", "lab", "consultation", "education", "medication"])
+SPECIALTIES = np.array(["cardiology", "oncology", "endocrinology", "orthopedics", "neurology", "primary_care"])
+FIRST_NAMES = np.array(["John", "Maria", "Wei", "Aisha", "Liam", "Sofia", "Noah", "Fatima", "Lucas", "Mei", "Omar", "Emma"])
+LAST_NAMES = np.array(["Smith", "Garcia", "Chen", "Khan", "Murphy", "Rossi", "Nguyen", "Okafor", "Silva", "Novak", "Cohen", "Ito"])
+NOTIFICATION_TYPES = np.array(["step_assigned", "step_completed", "pathway_completed", "assignment_overdue"])
+NOTIFICATION_TITLES = np.array(["New step assigned", "Pathway step completed", "Pathway completed", "Assignment overdue"])
+PRIORITIES = np.array(["low", "normal", "high"])
+
+COMPLETED_FRACTION = 0.3
+ASSIGNED_FRACTION = 0.6
+READ_FRACTION = 0.6
+DEPENDENCY_SKIP_RATE = 0.2
+DECISION_RATE = 0.15
+# Share of pathways taking the false branch, which skips a step
+FALSE_BRANCH_RATE = 0.5
+# Completed pathways finished within this many days; notifications are newer than NOTIFICATION_DAYS
+HISTORY_DAYS = 365
+NOTIFICATION_DAYS = 90
+
+DAY = 86400
+
+
+def timestamps(seconds, mask=None):
+    """
+    Epoch seconds to ISO strings for COPY, None where mask is False
+    """
+    values = np.datetime_as_string(np.asarray(seconds, dtype="int64").astype("datetime64[s]"), unit="s", timezone="UTC")
+    values = values.astype(object)
+    if mask is not None:
+        values[~mask] = None
+    return values
+
+
+def nullable(values, mask):
+    values = np.asarray(values).astype(object)
+    values[~mask] = None
+    return values
+
+
+class Writer:
+    """
+    Reserves ids and COPYs generated columns over one raw DBAPI connection
+    """
+
+    def __init__(self, connection, check_foreign_keys: bool = False):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.rows = 0
+        # Generated data can be regenerated, so skip waiting on the WAL flush
+        self.cursor.execute("SET synchronous_commit = off")
+        connection.commit()
+
+        if not check_foreign_keys:
+            # The rows reference each other consistently by construction, and
+            # per-row FK triggers dominate COPY time; needs superuser
+            try:
+                self.cursor.execute("SET session_replication_role = replica")
+                connection.commit()
+            except Exception as e:
+                connection.rollback()
+                self.cursor.execute("SET synchronous_commit = off")
+                print(f"Foreign key checks stay on: {str(e).strip()}")
+
+    def reserve_ids(self, table: str, count: int):
+        if count == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        self.cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), nextval(pg_get_serial_sequence(%s, 'id')) + %s - 1)",
+            (table, table, count)
+        )
+        last = self.cursor.fetchone()[0]
+        return np.arange(last - count + 1, last + 1, dtype=np.int64)
+
+    def copy(self, table: str, columns):
+        values = [column.tolist() if isinstance(column, np.ndarray) else list(column) for column in columns.values()]
+        if not values or not values[0]:
+            return
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(zip(*values))
+        buffer.seek(0)
+
+        self.cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        self.rows += len(values[0])
+
+    def commit(self):
+        self.connection.commit()
+
+
+class Generator:
+    def __init__(self, writer: Writer, sizes, seed: int, now: int):
+        self.writer = writer
+        self.sizes = sizes
+        self.seed = seed
+        self.now = now
+
+    def pick_users(self, rng, roles):
+        """
+        A random user holding each requested role index
+        """
+        picked = np.empty(len(roles), dtype=np.int64)
+        for role in range(len(ROLES)):
+            mask = roles == role
+            if mask.any():
+                pool = self.role_users[role]
+                picked[mask] = pool[rng.integers(0, len(pool), mask.sum())]
+        return picked
+
+    def generate_reference_data(self):
+        rng = np.random.default_rng([self.seed, 0])
+        users, templates, steps = self.sizes["users"], self.sizes["templates"], self.sizes["steps"]
+
+        if users < len(ROLES):
+            raise ValueError(f"At least {len(ROLES)} users are needed, one per role")
+        if steps < 3:
+            raise ValueError("Templates need at least 3 steps")
+
+        # Users
+        user_ids = self.writer.reserve_ids("users", users)
+        user_roles = np.arange(users) % len(ROLES)
+        self.writer.copy("users", {
+            "id": user_ids,
+            "name": np.char.add(np.char.add(FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), users)], " "),
+                                LAST_NAMES[rng.integers(0, len(LAST_NAMES), users)]),
+            "email": [f"synthetic-{user_id}@example.org" for user_id in user_ids.tolist()],
+            "role": ROLES[user_roles],
+            "specialty": SPECIALTIES[rng.integers(0, len(SPECIALTIES), users)]
+        })
+        self.user_ids = user_ids
+        self.role_users = [user_ids[user_roles == role] for role in range(len(ROLES))]
+
+        # Templates and their steps, laid out as (template, step_order) grids
+        template_ids = self.writer.reserve_ids("pathway_templates", templates)
+        self.writer.copy("pathway_templates", {
+            "id": template_ids,
+            "name": [f"Synthetic pathway {template_id}" for template_id in template_ids.tolist()],
+            "description": np.full(templates, "Generated for load testing"),
+            "specialty": SPECIALTIES[rng.integers(0, len(SPECIALTIES), templates)],
+            "version": np.full(templates, "1.0"),
+            "status": np.full(templates, "active"),
+            "created_by": user_ids[rng.integers(0, users, templates)]
+        })
+
+        self.step_ids = self.writer.reserve_ids("pathway_steps", templates * steps).reshape(templates, steps)
+        self.step_durations = rng.integers(1, 15, (templates, steps))
+        self.step_roles = rng.integers(0, len(ROLES), (templates, steps))
+        orders = np.tile(np.arange(1, steps + 1), templates)
+        self.writer.copy("pathway_steps", {
+            "id": self.step_ids.ravel(),
+            "template_id": np.repeat(template_ids, steps),
+            "name": np.char.add("Step ", orders.astype(str)),
+            "step_order": orders,
+            "step_type": STEP_TYPES[rng.integers(0, len(STEP_TYPES), templates * steps)],
+            "estimated_duration": self.step_durations.ravel(),
+            "required_roles": np.char.add(np.char.add("{", ROLES[self.step_roles.ravel()]), "}")
+        })
+        self.template_ids = template_ids
+        self.template_durations = self.step_durations.sum(axis=1)
+
+        # Every step depends on the previous one, some also on the one before that
+        chain = self.step_ids[:, 1:].ravel(), self.step_ids[:, :-1].ravel()
+        skip_mask = rng.random((templates, steps - 2)) < DEPENDENCY_SKIP_RATE
+        skip = self.step_ids[:, 2:][skip_mask], self.step_ids[:, :-2][skip_mask]
+        dependent = np.concatenate([chain[0], skip[0]])
+        self.writer.copy("step_dependencies", {
+            "id": self.writer.reserve_ids("step_dependencies", len(dependent)),
+            "step_id": dependent,
+            "dependency_step_id": np.concatenate([chain[1], skip[1]])
+        })
+
+        # Decision points branch to the next step or skip one
+        decision_mask = rng.random((templates, steps - 2)) < DECISION_RATE
+        self.decisions = np.zeros((templates, steps), dtype=bool)
+        self.decisions[:, :-2] = decision_mask
+        decisions = int(decision_mask.sum())
+        self.writer.copy("decision_points", {
+            "id": self.writer.reserve_ids("decision_points", decisions),
+            "step_id": self.step_ids[:, :-2][decision_mask],
+            "condition_expression": [f"risk_score > {value}" for value in rng.integers(20, 80, decisions).tolist()],
+            "true_step_id": self.step_ids[:, 1:-1][decision_mask],
+            "false_step_id": self.step_ids[:, 2:][decision_mask]
+        })
+
+        self.writer.commit()
+
+    def generate_chunk(self, chunk: int, patients: int):
+        rng = np.random.default_rng([self.seed, 1, chunk])
+        now = self.now
+        steps = self.sizes["steps"]
+
+        # Patients and one care team each
+        patient_ids = self.writer.reserve_ids("patients", patients)
+        dob = (np.datetime64("1930-01-01") + rng.integers(0, 85 * 365, patients).astype("timedelta64[D]"))
+        self.writer.copy("patients", {
+            "id": patient_ids,
+            "external_id": [f"SYN-{patient_id}" for patient_id in patient_ids.tolist()],
+            "first_name": FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), patients)],
+            "last_name": LAST_NAMES[rng.integers(0, len(LAST_NAMES), patients)],
+            "date_of_birth": np.datetime_as_string(dob, unit="D"),
+            "gender": np.array(["male", "female"])[rng.integers(0, 2, patients)],
+            "contact_phone": np.char.add("555-", rng.integers(1000, 10000, patients).astype(str)),
+            "contact_email": [f"patient{patient_id}@example.org" for patient_id in patient_ids.tolist()]
+        })
+
+        team_ids = self.writer.reserve_ids("care_teams", patients)
+        self.writer.copy("care_teams", {
+            "id": team_ids,
+            "name": [f"Care team {patient_id}" for patient_id in patient_ids.tolist()],
+            "patient_id": patient_ids
+        })
+
+        member_roles = np.tile(np.array(TEAM_ROLES), patients)
+        # Members hold different roles, so they are distinct users
+        member_users = self.pick_users(rng, member_roles)
+        self.writer.copy("care_team_members", {
+            "id": self.writer.reserve_ids("care_team_members", len(member_roles)),
+            "care_team_id": np.repeat(team_ids, len(TEAM_ROLES)),
+            "user_id": member_users,
+            "role": ROLES[member_roles],
+            "is_primary": member_roles == 1
+        })
+
+        # Pathways: position is how many steps are already completed
+        per_patient = 1 + rng.poisson(max(self.sizes["pathways_per_patient"] - 1, 0), patients)
+        pathway_patient = np.repeat(np.arange(patients), per_patient)
+        pathways = len(pathway_patient)
+        template = rng.integers(0, len(self.template_ids), pathways)
+        completed = rng.random(pathways) < COMPLETED_FRACTION
+
+        # Each pathway's route through its template: the false branch of a
+        # decision at step k goes on to step k + 2, skipping k + 1
+        false_branch = self.decisions[template] & (rng.random((pathways, steps)) < FALSE_BRANCH_RATE)
+        visited = np.ones((pathways, steps), dtype=bool)
+        for step in range(1, steps):
+            visited[:, step] = ~(visited[:, step - 1] & false_branch[:, step - 1])
+        route_length = visited.sum(axis=1)
+        # Step indices of the route in order, padded with the skipped ones
+        route = np.argsort(~visited, axis=1, kind="stable")
+        position = np.where(completed, route_length, (rng.random(pathways) * route_length).astype(np.int64))
+
+        # completed_steps history, one row per completed step in route order
+        history_pathway = np.repeat(np.arange(pathways), position)
+        starts = np.cumsum(position) - position
+        history_step = route[history_pathway, np.arange(len(history_pathway)) - np.repeat(starts, position)]
+        history_template = template[history_pathway]
+        took = self.step_durations[history_template, history_step] * rng.lognormal(0, 0.4, len(history_pathway)) * DAY
+        finished_after = np.cumsum(took) - np.repeat(np.concatenate([[0.0], np.cumsum(took)])[starts], position)
+        elapsed = np.bincount(history_pathway, weights=took, minlength=pathways)
+
+        # Active pathways are part way through their current step; completed
+        # ones finished some time within the history window
+        current = route[np.arange(pathways), np.minimum(position, route_length - 1)]
+        in_step = rng.random(pathways) * self.step_durations[template, current] * DAY
+        ended_ago = rng.random(pathways) * HISTORY_DAYS * DAY
+        start = (now - elapsed - np.where(completed, ended_ago, in_step)).astype(np.int64)
+        last_change = (start + elapsed).astype(np.int64)
+
+        pathway_ids = self.writer.reserve_ids("patient_pathways", pathways)
+        active = ~completed
+        self.writer.copy("patient_pathways", {
+            "id": pathway_ids,
+            "patient_id": patient_ids[pathway_patient],
+            "template_id": self.template_ids[template],
+            "current_step_id": nullable(self.step_ids[template, current], active),
+            "status": np.where(completed, "completed", "active"),
+            "start_date": timestamps(start),
+            "estimated_end_date": timestamps(start + self.template_durations[template] * DAY),
+            "actual_end_date": timestamps(last_change, completed),
+            "created_by": member_users[pathway_patient * len(TEAM_ROLES)],
+            "created_at": timestamps(start),
+            "updated_at": timestamps(last_change)
+        })
+
+        self.writer.copy("completed_steps", {
+            "id": self.writer.reserve_ids("completed_steps", len(history_pathway)),
+            "pathway_id": pathway_ids[history_pathway],
+            "step_id": self.step_ids[history_template, history_step],
+            "completed_by": self.pick_users(rng, self.step_roles[history_template, history_step]),
+            "completed_at": timestamps(start[history_pathway] + finished_after)
+        })
+
+        # Open assignments on the current step of most active pathways
+        assigned = np.flatnonzero(active & (rng.random(pathways) < ASSIGNED_FRACTION))
+        assigned_at = last_change[assigned]
+        self.writer.copy("step_assignments", {
+            "id": self.writer.reserve_ids("step_assignments", len(assigned)),
+            "pathway_id": pathway_ids[assigned],
+            "step_id": self.step_ids[template[assigned], current[assigned]],
+            "assigned_to_id": self.pick_users(rng, self.step_roles[template[assigned], current[assigned]]),
+            "assigned_by_id": member_users[pathway_patient[assigned] * len(TEAM_ROLES) + 2],
+            "assigned_at": timestamps(assigned_at),
+            "due_date": timestamps(assigned_at + self.step_durations[template[assigned], current[assigned]] * DAY),
+            "status": np.array(["pending", "in_progress"])[rng.integers(0, 2, len(assigned))]
+        })
+
+        # Notifications go to members of the pathway's care team
+        notifications = int(round(pathways * self.sizes["notifications_per_pathway"]))
+        related = rng.integers(0, pathways, notifications)
+        kind = rng.integers(0, len(NOTIFICATION_TYPES), notifications)
+        created = now - (rng.random(notifications) * NOTIFICATION_DAYS * DAY).astype(np.int64)
+        read = rng.random(notifications) < READ_FRACTION
+        self.writer.copy("notifications", {
+            "id": self.writer.reserve_ids("notifications", notifications),
+            "recipient_id": member_users[pathway_patient[related] * len(TEAM_ROLES) + rng.integers(0, len(TEAM_ROLES), notifications)],
+            "title": NOTIFICATION_TITLES[kind],
+            "notification_type": NOTIFICATION_TYPES[kind],
+            "related_patient_id": patient_ids[pathway_patient[related]],
+            "related_pathway_id": pathway_ids[related],
+            "priority": PRIORITIES[rng.integers(0, len(PRIORITIES), notifications)],
+            "status": np.where(read, "read", "unread"),
+            "created_at": timestamps(created),
+            "read_at": timestamps(created + (rng.random(notifications) * 2 * DAY).astype(np.int64), read)
+        })
+
+        self.writer.commit()
+        return pathways
+
+
+def refresh_derived():
+    """
+    Rebuild the tables normally maintained by event handlers and jobs
+    """
+    from sqlalchemy import func
+    import models
+    from database import SessionLocal
+    from services.care_team_service import care_team_service
+    from services.pathway_analytics import pathway_analytics
+    from services.pathway_engine import pathway_engine
+    from services.summary_service import summary_service
+
+    db = SessionLocal()
+    try:
+        summary_service.reconcile(db)
+        care_team_service.rebuild_access(db)
+        pathway_engine.refresh_progress(db)
+
+        # Step statistics are materialized for every day with completions
+        first_completed_at = db.query(func.min(models.CompletedStep.completed_at)).scalar()
+        day = first_completed_at.astimezone(timezone.utc).date() if first_completed_at else None
+        today = datetime.now(timezone.utc).date()
+        while day is not None and day <= today:
+            pathway_analytics.materialize_day(db, day)
+            day += timedelta(days=1)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="clinic")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--as-of", type=datetime.fromisoformat, help="anchor time for generated history (default now)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="patients generated per COPY batch")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    parser.add_argument("--skip-derived", action="store_true", help="do not rebuild summaries and statistics")
+    parser.add_argument("--check-foreign-keys", action="store_true", help="keep FK triggers on during COPY (slower)")
+    for name in PRESETS["clinic"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(PRESETS["clinic"][name]),
+                            help=f"override the preset's {name.replace('_', ' ')}")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("Set DATABASE_URL or pass --database-url")
+    os.environ["DATABASE_URL"] = args.database_url
+
+    sizes = {
+        name: getattr(args, name) if getattr(args, name) is not None else value
+        for name, value in PRESETS[args.preset].items()
+    }
+
+    from database import Base, engine
+    import models  # noqa: F401  registers the tables
+
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+
+    as_of = args.as_of or datetime.now(timezone.utc)
+    now = int((as_of if as_of.tzinfo else as_of.replace(tzinfo=timezone.utc)).timestamp())
+    started = time.perf_counter()
+    connection = engine.raw_connection()
+
+    try:
+        writer = Writer(connection, args.check_foreign_keys)
+        generator = Generator(writer, sizes, args.seed, now)
+        generator.generate_reference_data()
+
+        pathways = 0
+        for chunk, first in enumerate(range(0, sizes["patients"], args.chunk_size)):
+            pathways += generator.generate_chunk(chunk, min(args.chunk_size, sizes["patients"] - first))
+            elapsed = time.perf_counter() - started
+            print(f"{min(first + args.chunk_size, sizes['patients'])}/{sizes['patients']} patients, "
+                  f"{pathways} pathways, {writer.rows} rows in {elapsed:.1f}s ({writer.rows / elapsed:,.0f} rows/s)")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    if not args.skip_derived:
+        derived_started = time.perf_counter()
+        refresh_derived()
+        print(f"Rebuilt summaries and statistics in {time.perf_counter() - derived_started:.1f}s")
+
+    print(f"Generated {writer.rows} rows ({args.preset} preset, seed {args.seed}) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
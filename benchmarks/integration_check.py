@@ -0,0 +1,229 @@
+"""
+Exercise the integration worker end to end against mock_ehr.py.
+
+Starts the mock EHR in-process, creates an integration config pointing at
+it and queues requests through the API, then runs worker ticks from
+several threads (standing in for scheduler workers) until the queue
+drains. Checks that:
+
+  retries        every request completes although the mock fails some calls
+  concurrency    the mock never sees more calls in flight than max_concurrency
+  coalescing     queued createOrders requests reach the mock as batch calls
+  not found      a request for an unknown config is rejected with 404
+  patient sync   POST .../patient-sync only queues the sync; the scheduler's
+                 queue job then pages through the mock roster and upserts it
+
+Any violation is printed and the script exits non-zero:
+
+    DATABASE_URL=postgresql://localhost/pathways_scratch \\
+        python benchmarks/integration_check.py --requests 200 --failure-rate 0.2
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+# Retries are the point of the check; keep their backoff short
+os.environ.setdefault("INTEGRATION_BACKOFF_BASE_SECONDS", "0.05")
+os.environ.setdefault("INTEGRATION_BACKOFF_MAX_SECONDS", "0.5")
+# Small pages so the sync checkpoints several times
+os.environ.setdefault("EHR_SYNC_PAGE_SIZE", "100")
+
+FINISHED = ("completed", "failed")
+
+
+def drain(worker, session_factory, workers: int, timeout: float):
+    """
+    Run worker ticks from several threads until no request is left
+    pending or processing, or the timeout passes
+    """
+    import models
+
+    deadline = time.monotonic() + timeout
+
+    def remaining():
+        db = session_factory()
+        try:
+            return db.query(models.IntegrationRequest).filter(
+                models.IntegrationRequest.status.notin_(FINISHED)
+            ).count()
+        finally:
+            db.close()
+
+    def loop():
+        while time.monotonic() < deadline:
+            db = session_factory()
+            try:
+                processed = worker.run_tick(db)
+            finally:
+                db.close()
+
+            if not processed:
+                if not remaining():
+                    return
+                time.sleep(0.05)
+
+    threads = [threading.Thread(target=loop) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return remaining()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--port", type=int, default=8100, help="port for the in-process mock EHR")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=40, help="createOrders requests to coalesce")
+    parser.add_argument("--patients", type=int, default=250, help="roster size for the patient sync")
+    parser.add_argument("--failure-rate", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--max-concurrency", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=3, help="threads running worker ticks")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("Set DATABASE_URL or pass --database-url")
+    os.environ["DATABASE_URL"] = args.database_url
+
+    import httpx
+    import models
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from main import app
+    from mock_ehr import start_mock_ehr, make_patient
+    from services.ehr_sync import ehr_patient_sync
+    from services.integration_worker import integration_worker
+
+    mock_url = f"http://127.0.0.1:{args.port}"
+    server = start_mock_ehr(args.port)
+    client = TestClient(app)
+    failures = []
+
+    try:
+        httpx.post(f"{mock_url}/_mock/config", json={
+            "latency": args.latency,
+            "failure_rate": args.failure_rate,
+            "seed": 1,
+            "reset_stats": True
+        })
+
+        config = client.post("/api/integrations/configs", json={
+            "name": f"Integration check {time.time()}",
+            "system_type": "mock",
+            "endpoint": mock_url,
+            "auth_type": "bearer",
+            "auth_config": {"token": "check"},
+            "max_concurrency": args.max_concurrency,
+            "max_attempts": 20
+        }).json()
+
+        response = client.post("/api/integrations/requests", json={
+            "config_id": config["id"], "operation": "getPatient", "payload": {"patientId": 0}
+        })
+        if response.status_code != 202 or "location" not in response.headers:
+            failures.append(f"enqueue: status {response.status_code}, headers {dict(response.headers)}")
+        request_ids = [response.json()["id"]]
+
+        for index in range(1, args.requests):
+            request_ids.append(client.post("/api/integrations/requests", json={
+                "config_id": config["id"], "operation": "getPatient", "payload": {"patientId": index}
+            }).json()["id"])
+
+        for index in range(args.orders):
+            request_ids.append(client.post("/api/integrations/requests", json={
+                "config_id": config["id"], "operation": "createOrders", "payload": {"patientId": index, "tests": ["A1C"]}
+            }).json()["id"])
+
+        unknown = client.post("/api/integrations/requests", json={
+            "config_id": config["id"] + 1000, "operation": "getPatient", "payload": {}
+        })
+        if unknown.status_code != 404:
+            failures.append(f"unknown config: status {unknown.status_code}, expected 404")
+
+        started = time.perf_counter()
+        left = drain(integration_worker, SessionLocal, args.workers, args.timeout)
+        elapsed = time.perf_counter() - started
+        if left:
+            failures.append(f"{left} requests still unfinished after {args.timeout}s")
+
+        stats = httpx.get(f"{mock_url}/_mock/stats").json()
+
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                models.IntegrationRequest.status,
+                models.IntegrationRequest.attempts,
+                models.IntegrationRequest.batch_id
+            ).filter(models.IntegrationRequest.id.in_(request_ids)).all()
+        finally:
+            db.close()
+
+        statuses = {}
+        for row in rows:
+            statuses[row.status] = statuses.get(row.status, 0) + 1
+        retried = sum(1 for row in rows if row.attempts > 1)
+
+        if statuses.get("completed", 0) != len(request_ids):
+            failures.append(f"expected {len(request_ids)} completed requests, got {statuses}")
+        if stats["max_in_flight"] > args.max_concurrency:
+            failures.append(f"{stats['max_in_flight']} calls in flight, max_concurrency {args.max_concurrency}")
+        if args.failure_rate and not stats["failures"]:
+            failures.append("the mock injected no failures, so retries were not exercised")
+        if stats["orders_batched"] != args.orders:
+            failures.append(f"{stats['orders_batched']} orders reached the mock in batches, expected {args.orders}")
+
+        print(f"{len(request_ids)} requests drained in {elapsed:.1f}s by {args.workers} workers")
+        print(f"request statuses  {statuses}, {retried} retried")
+        print(f"mock EHR          {stats}")
+
+        rng = random.Random(1)
+        roster = [make_patient(index, rng) for index in range(args.patients)]
+        httpx.post(f"{mock_url}/_mock/patients", json=roster)
+
+        response = client.post(f"/api/integrations/configs/{config['id']}/patient-sync")
+        if response.status_code != 202 or response.json()["status"] != "queued":
+            failures.append(f"queue patient sync: status {response.status_code}, body {response.text}")
+
+        # Stands in for the scheduler's ehr-patient-sync-queue job
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            ehr_patient_sync.sync_queued(db)
+            synced = db.query(models.Patient).filter(
+                models.Patient.external_id.in_([record["externalId"] for record in roster])
+            ).count()
+        finally:
+            db.close()
+        elapsed = time.perf_counter() - started
+
+        state = client.get(f"/api/integrations/configs/{config['id']}/patient-sync").json()
+        if state["status"] != "idle" or state["records_synced"] != args.patients:
+            failures.append(f"patient sync ended {state['status']} with {state['records_synced']} of {args.patients} records")
+        if synced != args.patients:
+            failures.append(f"{synced} of {args.patients} roster patients found after the sync")
+
+        print(f"patient sync      {state['records_synced']} records in {state['pages']} pages, {elapsed:.1f}s")
+    finally:
+        server.should_exit = True
+        integration_worker.close()
+
+    if failures:
+        print(f"{len(failures)} failures:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+    print("Integration worker checks passed")
+
+
+if __name__ == "__main__":
+    main()
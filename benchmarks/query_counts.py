@@ -0,0 +1,173 @@
+"""
+Count the SQL statements each write endpoint issues.
+
+Write endpoints validate their references in one query and leave
+duplicates to unique constraints, so their statement counts are fixed.
+This script seeds a patient, users and a template, drives the endpoints
+through the app in-process and counts statements with a
+before_cursor_execute listener on the engine. A count above its budget is
+printed and the script exits non-zero:
+
+    DATABASE_URL=postgresql://localhost/pathways_scratch \\
+        python benchmarks/query_counts.py
+
+Counts include everything the request runs, event publishing and the
+summary counter handlers among them.
+"""
+import argparse
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+# Scenario -> (expected status, statement budget)
+BUDGETS = {
+    "create care team with 2 members": (201, 8),
+    "add care team member": (201, 6),
+    "add duplicate care team member": (400, 2),
+    "add care team member, unknown user": (404, 1),
+    "create assignment": (201, 9),
+    "create duplicate assignment": (400, 2),
+    "create assignment, step from another template": (404, 1),
+    "create 3 assignments in a batch": (201, 17),
+}
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self.statements = []
+        event.listen(engine, "before_cursor_execute", self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement.split("\n", 1)[0][:100])
+
+    @contextmanager
+    def measure(self):
+        self.count = 0
+        self.statements = []
+        yield self
+
+
+def seed():
+    import models
+    from database import SessionLocal
+
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+
+    try:
+        users = [
+            models.User(name=f"Query Count {role}", email=f"query-count-{role}-{now.timestamp()}@example.org", role=role)
+            for role in ("nurse", "physician", "coordinator", "pharmacist")
+        ]
+        patient = models.Patient(first_name="Query", last_name="Count", date_of_birth=datetime(1960, 1, 1))
+        templates = [
+            models.PathwayTemplate(name=f"Query Count {name}", version="1.0", status="active")
+            for name in ("Template", "Other Template")
+        ]
+        db.add_all([*users, patient, *templates])
+        db.flush()
+
+        steps = [
+            models.PathwayStep(template_id=templates[0].id, name=f"Step {order}", step_order=order,
+                               step_type="task", required_roles=["nurse"])
+            for order in range(1, 6)
+        ]
+        other_step = models.PathwayStep(template_id=templates[1].id, name="Other step", step_order=1, step_type="task")
+        db.add_all([*steps, other_step])
+        db.flush()
+
+        pathway = models.PatientPathway(
+            patient_id=patient.id,
+            template_id=templates[0].id,
+            current_step_id=steps[0].id,
+            status="active",
+            created_by=users[0].id
+        )
+        db.add(pathway)
+        db.commit()
+
+        return [user.id for user in users], patient.id, pathway.id, [step.id for step in steps], other_step.id
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--verbose", action="store_true", help="print every statement issued")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("Set DATABASE_URL or pass --database-url")
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from fastapi.testclient import TestClient
+    from database import engine
+    from main import app
+
+    user_ids, patient_id, pathway_id, step_ids, other_step_id = seed()
+    client = TestClient(app)
+    counter = StatementCounter(engine)
+    results = []
+
+    def run(name, method, url, body):
+        with counter.measure():
+            response = client.request(method, url, json=body)
+        results.append((name, response.status_code, counter.count, list(counter.statements)))
+        return response
+
+    team = run("create care team with 2 members", "POST", "/api/care-teams/", {
+        "name": "Query Count Team",
+        "patient_id": patient_id,
+        "members": [
+            {"user_id": user_ids[0], "role": "nurse", "is_primary": True},
+            {"user_id": user_ids[1], "role": "physician"}
+        ]
+    }).json()
+    member = {"user_id": user_ids[2], "role": "coordinator"}
+    run("add care team member", "POST", f"/api/care-teams/{team['id']}/members", member)
+    run("add duplicate care team member", "POST", f"/api/care-teams/{team['id']}/members", member)
+    run("add care team member, unknown user", "POST", f"/api/care-teams/{team['id']}/members",
+        {"user_id": max(user_ids) + 1000, "role": "nurse"})
+
+    assignment = {"pathway_id": pathway_id, "step_id": step_ids[0], "assigned_to_id": user_ids[0], "assigned_by_id": user_ids[1]}
+    run("create assignment", "POST", "/api/assignments/", assignment)
+    run("create duplicate assignment", "POST", "/api/assignments/", assignment)
+    run("create assignment, step from another template", "POST", "/api/assignments/",
+        {**assignment, "step_id": other_step_id})
+    run("create 3 assignments in a batch", "POST", "/api/assignments/batch", {"assignments": [
+        {**assignment, "step_id": step_id} for step_id in step_ids[1:4]
+    ]})
+
+    failures = []
+    print(f"{'scenario':<48} {'status':>6} {'queries':>8} {'budget':>7}")
+    for name, status, count, statements in results:
+        expected_status, budget = BUDGETS[name]
+        print(f"{name:<48} {status:>6} {count:>8} {budget:>7}")
+        if args.verbose:
+            for statement in statements:
+                print(f"    {statement}")
+        if status != expected_status:
+            failures.append(f"{name}: status {status}, expected {expected_status}")
+        if count > budget:
+            failures.append(f"{name}: {count} queries, budget {budget}")
+
+    if failures:
+        print(f"{len(failures)} failures:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+    print("All write endpoints within their query budgets")
+
+
+if __name__ == "__main__":
+    main()
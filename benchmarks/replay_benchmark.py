@@ -0,0 +1,142 @@
+"""
+Benchmark pathway state replay for aggregates with long event streams.
+
+Seeds a throwaway pathway with N step-completed events into DATABASE_URL,
+then times full replays, snapshot-bounded replays and point-in-time reads.
+All seeded rows are removed afterwards.
+
+    python benchmarks/replay_benchmark.py --events 5000 --tail 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import models
+from database import SessionLocal
+from services.event_replay import PathwayReplayEngine
+
+
+def seed_pathway(db, event_count: int):
+    patient = models.Patient(first_name="Replay", last_name="Benchmark", date_of_birth=datetime(1970, 1, 1))
+    template = models.PathwayTemplate(name="Replay benchmark", version="1.0")
+    db.add_all([patient, template])
+    db.flush()
+
+    step = models.PathwayStep(template_id=template.id, name="Repeated step", step_order=1, step_type="task")
+    db.add(step)
+    db.flush()
+
+    pathway = models.PatientPathway(patient_id=patient.id, template_id=template.id, current_step_id=step.id)
+    db.add(pathway)
+    db.flush()
+
+    start = datetime.now(timezone.utc) - timedelta(seconds=event_count + 1)
+    rows = [{
+        "event_type": "pathway:initialized",
+        "aggregate_type": "pathway",
+        "aggregate_id": str(pathway.id),
+        "data": {"pathway_id": pathway.id, "patient_id": patient.id, "template_id": template.id, "current_step_id": step.id},
+        "created_at": start
+    }]
+    rows.extend({
+        "event_type": "pathway:step:completed",
+        "aggregate_type": "pathway",
+        "aggregate_id": str(pathway.id),
+        "data": {"pathway_id": pathway.id, "step_id": step.id, "completed_by_id": None, "next_step_id": step.id},
+        "created_at": start + timedelta(seconds=i + 1)
+    } for i in range(event_count - 1))
+
+    db.bulk_insert_mappings(models.Event, rows)
+    db.commit()
+
+    return patient, template, pathway, start
+
+
+def append_events(db, pathway, step_id: int, start: datetime, count: int):
+    db.bulk_insert_mappings(models.Event, [{
+        "event_type": "pathway:step:completed",
+        "aggregate_type": "pathway",
+        "aggregate_id": str(pathway.id),
+        "data": {"pathway_id": pathway.id, "step_id": step_id, "completed_by_id": None, "next_step_id": step_id},
+        "created_at": start + timedelta(microseconds=i + 1)
+    } for i in range(count)])
+    db.commit()
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"min_ms": round(samples[0], 3), "median_ms": round(samples[len(samples) // 2], 3)}
+
+
+def cleanup(db, patient, template, pathway):
+    db.query(models.Event).filter(
+        models.Event.aggregate_type == "pathway",
+        models.Event.aggregate_id == str(pathway.id)
+    ).delete(synchronize_session=False)
+    db.query(models.PathwaySnapshot).filter(
+        models.PathwaySnapshot.pathway_id == pathway.id
+    ).delete(synchronize_session=False)
+    db.delete(pathway)
+    db.flush()
+    db.query(models.PathwayStep).filter(models.PathwayStep.template_id == template.id).delete(synchronize_session=False)
+    db.delete(template)
+    db.delete(patient)
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--tail", type=int, default=50, help="events appended after the snapshot")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    patient, template, pathway, start = seed_pathway(db, args.events)
+    step_id = pathway.current_step_id
+    midpoint = start + timedelta(seconds=args.events // 2)
+
+    # Reads never write snapshots, so the first timings are full replays
+    replay = PathwayReplayEngine()
+    # The seeded events are only seconds old, so snapshot all of them
+    snapshotter = PathwayReplayEngine(snapshot_lag=0)
+
+    try:
+        results = {
+            "events": args.events,
+            "tail": args.tail,
+            "full_replay": timed(lambda: replay.get_state(db, pathway.id), args.repeat),
+            "full_replay_as_of_midpoint": timed(lambda: replay.get_state(db, pathway.id, midpoint), args.repeat),
+        }
+
+        snapshotter.take_snapshot(db, pathway.id)
+        latest = db.query(models.PathwaySnapshot).filter(
+            models.PathwaySnapshot.pathway_id == pathway.id
+        ).one()
+        append_events(db, pathway, step_id, latest.last_event_at, args.tail)
+
+        results["snapshot_plus_tail"] = timed(lambda: replay.get_state(db, pathway.id), args.repeat)
+        results["state_event_count"] = replay.get_state(db, pathway.id)["event_count"]
+
+        print(json.dumps(results, indent=2))
+    finally:
+        cleanup(db, patient, template, pathway)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
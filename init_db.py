@@ -1,4 +1,14 @@
-from sqlalchemy import create_engine
+"""
+Create the database tables, and bring a database created by an earlier
+release up to the current models.
+
+create_all only creates missing tables, so columns and indexes added to
+existing tables are applied here by idempotent DDL. Run this script after
+every upgrade, before starting the API:
+
+    python init_db.py
+"""
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from database import Base
 import models
@@ -11,14 +21,86 @@ load_dotenv()
 # Get database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+def add_unique_constraint(table, name, columns):
+    """
+    DDL adding a unique constraint unless it exists. Duplicates left by
+    earlier check-then-insert races are removed first, keeping the oldest row.
+    """
+    first, second = columns
+    return f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{name}') THEN
+                DELETE FROM {table} newer USING {table} older
+                WHERE newer.{first} = older.{first}
+                    AND newer.{second} = older.{second}
+                    AND newer.id > older.id;
+                ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE ({first}, {second});
+            END IF;
+        END
+        $$
+    """
+
+# Idempotent DDL for tables that existed before a change added to them, in order
+SCHEMA_UPGRADES = [
+    # Overdue detection
+    "ALTER TABLE step_assignments ADD COLUMN IF NOT EXISTS overdue_at TIMESTAMP WITH TIME ZONE",
+    # Reference validation leaves duplicates to these constraints
+    add_unique_constraint("care_team_members", "uq_care_team_members_team_user", ("care_team_id", "user_id")),
+    add_unique_constraint("step_assignments", "uq_step_assignments_pathway_step", ("pathway_id", "step_id")),
+    # Integration worker
+    "ALTER TABLE integration_configs ADD COLUMN IF NOT EXISTS rate_limit_per_second FLOAT",
+    "ALTER TABLE integration_configs ADD COLUMN IF NOT EXISTS max_concurrency INTEGER NOT NULL DEFAULT 4",
+    "ALTER TABLE integration_configs ADD COLUMN IF NOT EXISTS timeout_seconds FLOAT NOT NULL DEFAULT 10",
+    "ALTER TABLE integration_configs ADD COLUMN IF NOT EXISTS max_attempts INTEGER NOT NULL DEFAULT 5",
+    "ALTER TABLE integration_requests ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE integration_requests ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP WITH TIME ZONE DEFAULT now()",
+    "ALTER TABLE integration_requests ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITH TIME ZONE",
+    # EHR patient sync
+    "ALTER TABLE integration_configs ADD COLUMN IF NOT EXISTS sync_patients BOOLEAN NOT NULL DEFAULT false",
+    # Coalesced integration calls
+    "ALTER TABLE integration_requests ADD COLUMN IF NOT EXISTS batch_id INTEGER",
+    # Optimistic locking on pathways; every ORM query selects the column
+    "ALTER TABLE patient_pathways ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    # Denormalized pathway progress, backfilled by upgrade_schema
+    "ALTER TABLE patient_pathways ADD COLUMN IF NOT EXISTS steps_completed INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE patient_pathways ADD COLUMN IF NOT EXISTS total_steps INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE patient_pathways ADD COLUMN IF NOT EXISTS progress_percent FLOAT NOT NULL DEFAULT 0",
+    "ALTER TABLE patient_pathways ADD COLUMN IF NOT EXISTS last_completed_at TIMESTAMP WITH TIME ZONE",
+]
+
+def upgrade_schema(engine):
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
+
+        # Indexes declared on tables that already existed
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+    # Pathways from before the progress fields, or bulk loaded, have no step
+    # total yet; POST /api/pathways/progress/rebuild recomputes every pathway
+    from services.pathway_engine import pathway_engine
+
+    db = sessionmaker(bind=engine)()
+    try:
+        pathway_engine.refresh_progress(db, missing_only=True)
+    finally:
+        db.close()
+
 def init_db():
     # Create SQLAlchemy engine
     engine = create_engine(DATABASE_URL)
-    
+
     # Create all tables
     Base.metadata.create_all(bind=engine)
-    
+
     print("Database tables created successfully!")
 
+    upgrade_schema(engine)
+
+    print("Database schema upgraded successfully!")
+
 if __name__ == "__main__":
     init_db()
@@ -1,5 +1,7 @@
+import os
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
@@ -7,7 +9,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import routers
-from routers import patients, pathways, templates, notifications, insights, care_teams, assignments
+from routers import patients, pathways, templates, notifications, insights, care_teams, assignments, analytics, summary, caseload, integrations
+from services.scheduler import scheduler
+from services.integration_worker import integration_worker
+from services.instrumentation import MetricsMiddleware, instrument_engine, metrics_registry
+from services import profiling
+from database import engine
 
 # Create FastAPI app
 app = FastAPI(
@@ -25,6 +32,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record latency, query count, DB time and rows per route
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+
+# Opt-in per-request profiling (PROFILING_ENABLED plus an X-Profile header)
+app.add_middleware(profiling.ProfilingMiddleware)
+profiling.instrument_engine(engine)
+
 # Include routers
 app.include_router(patients.router, prefix="/api/patients", tags=["patients"])
 app.include_router(pathways.router, prefix="/api/pathways", tags=["pathways"])
@@ -33,6 +48,21 @@ app.include_router(notifications.router, prefix="/api/notifications", tags=["not
 app.include_router(insights.router, prefix="/api/insights", tags=["insights"])
 app.include_router(care_teams.router, prefix="/api/care-teams", tags=["care-teams"])
 app.include_router(assignments.router, prefix="/api/assignments", tags=["assignments"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(summary.router, prefix="/api/summary", tags=["summary"])
+app.include_router(caseload.router, prefix="/api/caseload", tags=["caseload"])
+app.include_router(integrations.router, prefix="/api/integrations", tags=["integrations"])
+
+# Run periodic background jobs (overdue detection, summary reconcile, analytics refresh, insight jobs, integration requests)
+@app.on_event("startup")
+def start_scheduler():
+    if os.getenv("SCHEDULER_ENABLED", "true").lower() == "true":
+        scheduler.start()
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    scheduler.stop()
+    integration_worker.close()
 
 # Health check endpoint
 @app.get("/api", tags=["health"])
@@ -43,6 +73,29 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Prometheus scrape endpoint
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+def get_metrics():
+    return metrics_registry.render()
+
+@app.get("/api/metrics/slow-requests", tags=["health"])
+def get_slow_requests(limit: int = 50):
+    return metrics_registry.get_slow_requests(limit)
+
+@app.get("/api/profiling/traces", tags=["health"])
+def get_profiling_traces():
+    return profiling.trace_store.list()
+
+# Chrome Trace Event JSON, viewable in Perfetto or chrome://tracing
+@app.get("/api/profiling/traces/{trace_id}", tags=["health"])
+def get_profiling_trace(trace_id: str):
+    trace = profiling.trace_store.get(trace_id)
+    
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    
+    return trace.to_chrome_trace()
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
 
@@ -0,0 +1,222 @@
+"""
+Local mock EHR for exercising the integration worker.
+
+Serves POST /{operation} with canned responses, and can inject latency,
+server errors and 429 rate limiting:
+
+    python mock_ehr.py --port 8100 --latency 0.05 --failure-rate 0.1 --patients 10000
+
+listPatients pages through an in-memory roster of changed patients in
+(lastUpdated, id) order. Load or change roster records with
+POST /_mock/patients.
+
+Tests can start it in-process with start_mock_ehr() and tune it at runtime
+with POST /_mock/config.
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+import argparse
+import asyncio
+import random
+import threading
+import time
+import uvicorn
+
+app = FastAPI(title="Mock EHR")
+
+# Behaviour knobs; rate_limit is requests per second, 0 disables
+settings: Dict[str, Any] = {
+    "latency": 0.0,
+    "failure_rate": 0.0,
+    "rate_limit": 0,
+    "seed": None,
+}
+# Patient roster served by listPatients, keyed by externalId
+roster: Dict[str, Dict[str, Any]] = {}
+stats: Dict[str, int] = {"requests": 0, "failures": 0, "throttled": 0, "in_flight": 0, "max_in_flight": 0, "orders_batched": 0}
+_window = {"second": 0, "count": 0}
+_random = random.Random()
+
+
+def make_patient(index: int, rng: random.Random = _random) -> Dict[str, Any]:
+    return {
+        "externalId": f"EHR-{index}",
+        "demographics": {
+            "firstName": rng.choice(["John", "Maria", "Wei", "Aisha", "Liam", "Sofia"]),
+            "lastName": rng.choice(["Smith", "Garcia", "Chen", "Khan", "Murphy", "Rossi"]),
+            "dateOfBirth": f"{rng.randint(1930, 2010)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "gender": rng.choice(["male", "female"])
+        },
+        "contact": {
+            "phone": f"555-{rng.randint(1000, 9999)}",
+            "email": f"patient{index}@example.org"
+        }
+    }
+
+
+def upsert_roster(records: List[Dict[str, Any]]):
+    now = datetime.now(timezone.utc).isoformat()
+    for record in records:
+        record.setdefault("lastUpdated", now)
+        roster[record["externalId"]] = record
+
+
+def list_patients(payload: Dict[str, Any]):
+    since = payload.get("since")
+    limit = int(payload.get("limit") or 100)
+    cursor = payload.get("cursor")
+
+    changed = sorted(
+        (record for record in roster.values() if not since or record["lastUpdated"] >= since),
+        key=lambda record: (record["lastUpdated"], record["externalId"])
+    )
+
+    # The cursor is the (lastUpdated, externalId) of the last record served
+    if cursor:
+        after = tuple(cursor.split("|", 1))
+        changed = [record for record in changed if (record["lastUpdated"], record["externalId"]) > after]
+
+    page = changed[:limit]
+    next_cursor = None
+    if len(changed) > limit:
+        next_cursor = f"{page[-1]['lastUpdated']}|{page[-1]['externalId']}"
+
+    return {"patients": page, "next_cursor": next_cursor}
+
+
+def canned_response(operation: str, payload: Dict[str, Any]):
+    if operation == "listPatients":
+        return list_patients(payload)
+
+    if operation == "getPatient":
+        return {
+            "id": payload.get("patientId"),
+            "externalId": f"EHR-{payload.get('patientId')}",
+            "demographics": {
+                "firstName": "John",
+                "lastName": "Smith",
+                "dateOfBirth": "1955-03-15",
+                "gender": "male"
+            },
+            "diagnoses": [
+                {"code": "E11.9", "description": "Type 2 diabetes mellitus without complications"}
+            ],
+            "medications": [
+                {"name": "Metformin", "dosage": "500mg", "frequency": "twice daily"}
+            ]
+        }
+
+    if operation == "createOrdersBatch":
+        stats["orders_batched"] += len(payload.get("orders", []))
+        return {
+            "results": [
+                {"requestId": order.get("requestId"), "result": canned_response("createOrders", order.get("order") or {})}
+                for order in payload.get("orders", [])
+            ]
+        }
+
+    if operation == "createOrders":
+        return {
+            "orderId": f"order-{datetime.now().timestamp()}",
+            "patientId": payload.get("patientId"),
+            "tests": [
+                {
+                    "code": test,
+                    "status": "ordered",
+                    "orderedDate": datetime.now().isoformat()
+                } for test in payload.get("tests", [])
+            ]
+        }
+
+    return {"message": "Operation executed successfully"}
+
+
+@app.post("/_mock/config")
+def configure(config: Dict[str, Any]):
+    settings.update({key: value for key, value in config.items() if key in settings})
+
+    if config.get("seed") is not None:
+        _random.seed(config["seed"])
+
+    if config.get("reset_stats"):
+        for key in stats:
+            stats[key] = 0
+
+    return {"settings": settings, "stats": stats}
+
+
+@app.post("/_mock/patients")
+def load_patients(records: List[Dict[str, Any]]):
+    upsert_roster(records)
+    return {"patients": len(roster)}
+
+
+@app.get("/_mock/stats")
+def get_stats():
+    return stats
+
+
+@app.post("/{operation}")
+async def handle(operation: str, request: Request):
+    payload = await request.json()
+    stats["requests"] += 1
+
+    if settings["rate_limit"]:
+        second = int(time.time())
+        if _window["second"] != second:
+            _window["second"], _window["count"] = second, 0
+        _window["count"] += 1
+
+        if _window["count"] > settings["rate_limit"]:
+            stats["throttled"] += 1
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        if settings["latency"]:
+            await asyncio.sleep(settings["latency"])
+
+        if settings["failure_rate"] and _random.random() < settings["failure_rate"]:
+            stats["failures"] += 1
+            return JSONResponse({"error": "upstream unavailable"}, status_code=503)
+
+        return canned_response(operation, payload)
+    finally:
+        stats["in_flight"] -= 1
+
+
+def start_mock_ehr(port: int = 8100, host: str = "127.0.0.1") -> uvicorn.Server:
+    """
+    Run the mock on a daemon thread and return the server; set
+    server.should_exit = True to stop it
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="mock-ehr", daemon=True)
+    thread.start()
+
+    while not server.started:
+        time.sleep(0.01)
+
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the mock EHR server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--patients", type=int, default=0, help="roster size to generate")
+    args = parser.parse_args()
+
+    settings.update(latency=args.latency, failure_rate=args.failure_rate, rate_limit=args.rate_limit, seed=args.seed)
+    if args.seed is not None:
+        _random.seed(args.seed)
+    upsert_roster([make_patient(i) for i in range(args.patients)])
+
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -1,12 +1,15 @@
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, Float, ForeignKey, 
-    Table, Text, ARRAY, JSON, Numeric
+    Column, Integer, String, Boolean, DateTime, Date, Float, ForeignKey, 
+    Table, Text, ARRAY, JSON, Numeric, Index, UniqueConstraint
 )
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from database import Base
 import datetime
 
+# Assignment statuses that no longer count as open work
+CLOSED_ASSIGNMENT_STATUSES = ("completed", "cancelled")
+
 class User(Base):
     __tablename__ = "users"
 
@@ -139,6 +142,13 @@ class PatientPathway(Base):
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Bumped on every ORM update, which only applies while the row still has the version it was read with
+    version = Column(Integer, nullable=False, server_default="1")
+    # Progress maintained by the pathway engine so list views need no step lists
+    steps_completed = Column(Integer, nullable=False, server_default="0")
+    total_steps = Column(Integer, nullable=False, server_default="0")
+    progress_percent = Column(Float, nullable=False, server_default="0")
+    last_completed_at = Column(DateTime(timezone=True))
 
     # Relationships
     patient = relationship("Patient", back_populates="pathways")
@@ -150,6 +160,12 @@ class PatientPathway(Base):
     ai_insights = relationship("AIInsight", back_populates="related_pathway")
     step_assignments = relationship("StepAssignment", back_populates="pathway")
 
+    __table_args__ = (
+        Index("ix_patient_pathways_patient_status", "patient_id", "status"),
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
 
 class CompletedStep(Base):
     __tablename__ = "completed_steps"
@@ -161,12 +177,74 @@ class CompletedStep(Base):
     completed_at = Column(DateTime(timezone=True), server_default=func.now())
     notes = Column(String)
 
+    __table_args__ = (
+        Index("ix_completed_steps_completed_at", "completed_at"),
+        Index("ix_completed_steps_pathway_completed_at", "pathway_id", "completed_at"),
+    )
+
     # Relationships
     pathway = relationship("PatientPathway", back_populates="completed_steps")
     step = relationship("PathwayStep", back_populates="completed_in_pathways")
     completed_by_user = relationship("User", back_populates="completed_steps")
 
 
+class StepDurationStat(Base):
+    __tablename__ = "step_duration_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    template_id = Column(Integer, ForeignKey("pathway_templates.id", ondelete="CASCADE"), nullable=False)
+    step_id = Column(Integer, ForeignKey("pathway_steps.id", ondelete="CASCADE"), nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    mean_days = Column(Float, nullable=False)
+    p50_days = Column(Float, nullable=False)
+    p90_days = Column(Float, nullable=False)
+    max_days = Column(Float, nullable=False)
+    estimated_duration = Column(Integer)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("day", "template_id", "step_id", name="uq_step_duration_stats_day_step"),
+        Index("ix_step_duration_stats_template_day", "template_id", "day"),
+    )
+
+
+class StepDurationBucket(Base):
+    __tablename__ = "step_duration_buckets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    template_id = Column(Integer, ForeignKey("pathway_templates.id", ondelete="CASCADE"), nullable=False)
+    step_id = Column(Integer, ForeignKey("pathway_steps.id", ondelete="CASCADE"), nullable=False)
+    bucket = Column(Integer, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("day", "template_id", "step_id", "bucket", name="uq_step_duration_buckets_day_step_bucket"),
+        Index("ix_step_duration_buckets_template_day", "template_id", "day"),
+    )
+
+
+class TemplateStatusSummary(Base):
+    __tablename__ = "template_status_summaries"
+
+    template_id = Column(Integer, ForeignKey("pathway_templates.id", ondelete="CASCADE"), primary_key=True)
+    active = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    overdue = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class AssigneeWorkloadSummary(Base):
+    __tablename__ = "assignee_workload_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    active = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    overdue = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class Notification(Base):
     __tablename__ = "notifications"
 
@@ -187,6 +265,10 @@ class Notification(Base):
     related_patient = relationship("Patient", back_populates="notifications")
     related_pathway = relationship("PatientPathway", back_populates="notifications")
 
+    __table_args__ = (
+        Index("ix_notifications_patient_created_at", "related_patient_id", "created_at", "id"),
+    )
+
 
 class Event(Base):
     __tablename__ = "events"
@@ -199,6 +281,26 @@ class Event(Base):
     event_metadata = Column(JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_events_aggregate_stream", "aggregate_type", "aggregate_id", "created_at", "id"),
+    )
+
+
+class PathwaySnapshot(Base):
+    __tablename__ = "pathway_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    pathway_id = Column(Integer, ForeignKey("patient_pathways.id", ondelete="CASCADE"), nullable=False)
+    last_event_id = Column(Integer, nullable=False)
+    last_event_at = Column(DateTime(timezone=True), nullable=False)
+    event_count = Column(Integer, nullable=False)
+    state = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_pathway_snapshots_position", "pathway_id", "last_event_at", "last_event_id"),
+    )
+
 
 class AIInsight(Base):
     __tablename__ = "ai_insights"
@@ -220,6 +322,75 @@ class AIInsight(Base):
     related_pathway = relationship("PatientPathway", back_populates="ai_insights")
     acted_on_by_user = relationship("User", back_populates="acted_on_insights")
 
+    __table_args__ = (
+        Index("ix_ai_insights_patient_created_at", "related_patient_id", "created_at", "id"),
+    )
+
+
+class InsightJob(Base):
+    __tablename__ = "insight_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    insight_type = Column(String, nullable=False)
+    request = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    insight_id = Column(Integer, ForeignKey("ai_insights.id", ondelete="SET NULL"))
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+
+    # Relationships
+    insight = relationship("AIInsight")
+
+    __table_args__ = (
+        # Workers claim the oldest unfinished jobs of one type at a time
+        Index(
+            "ix_insight_jobs_claim",
+            "insight_type", "created_at",
+            postgresql_where=text("status IN ('pending', 'running')")
+        ),
+    )
+
+
+class InsightSuppression(Base):
+    __tablename__ = "insight_suppressions"
+
+    # sha256 of (insight_type, related_patient_id, related_pathway_id, content_hash)
+    dedup_key = Column(String(64), primary_key=True)
+    insight_type = Column(String, nullable=False)
+    related_patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"))
+    related_pathway_id = Column(Integer, ForeignKey("patient_pathways.id", ondelete="CASCADE"))
+    content_hash = Column(String(64), nullable=False)
+    insight_id = Column(Integer, ForeignKey("ai_insights.id", ondelete="SET NULL"))
+    suppressed_count = Column(Integer, nullable=False, default=0)
+    first_seen_at = Column(DateTime(timezone=True), nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_insight_suppressions_expires_at", "expires_at"),
+    )
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of the client's Idempotency-Key header
+    key_hash = Column(String(64), primary_key=True)
+    # sha256 of the method, path and body of the first request with the key
+    fingerprint = Column(String(64), nullable=False)
+    status = Column(String, nullable=False)  # processing, completed
+    response_status = Column(Integer)
+    response_body = Column(JSON)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
 
 class IntegrationConfig(Base):
     __tablename__ = "integration_configs"
@@ -233,6 +404,14 @@ class IntegrationConfig(Base):
     enabled = Column(Boolean, default=True)
     mappings = Column(JSON)
     transformations = Column(JSON)
+    # Worker limits; a NULL rate limit means unlimited. The rate limit is
+    # enforced per worker process, max_concurrency across all of them.
+    rate_limit_per_second = Column(Float)
+    max_concurrency = Column(Integer, nullable=False, default=4, server_default="4")
+    timeout_seconds = Column(Float, nullable=False, default=10.0, server_default="10")
+    max_attempts = Column(Integer, nullable=False, default=5, server_default="5")
+    # Pull the patient roster from this system on a schedule
+    sync_patients = Column(Boolean, nullable=False, default=False, server_default="false")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -247,15 +426,66 @@ class IntegrationRequest(Base):
     config_id = Column(Integer, ForeignKey("integration_configs.id"), nullable=False)
     operation = Column(String, nullable=False)
     payload = Column(JSON, nullable=False)
-    status = Column(String, default="pending")
+    status = Column(String, default="pending")  # pending, processing, completed, failed
     result = Column(JSON)
     error = Column(String)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    # Id of the first request of the coalesced call this request was sent in
+    batch_id = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True))
 
     # Relationships
     config = relationship("IntegrationConfig", back_populates="requests")
 
+    __table_args__ = (
+        # Workers claim due requests in next_attempt_at order
+        Index(
+            "ix_integration_requests_claim",
+            "next_attempt_at",
+            postgresql_where=text("status IN ('pending', 'processing')")
+        ),
+    )
+
+
+class IntegrationSyncState(Base):
+    __tablename__ = "integration_sync_states"
+
+    config_id = Column(Integer, ForeignKey("integration_configs.id", ondelete="CASCADE"), primary_key=True)
+    resource = Column(String, primary_key=True)
+    status = Column(String, nullable=False, default="idle")  # idle, queued, running, failed
+    # Last change time fully synced; the next run asks for changes since then
+    watermark = Column(DateTime(timezone=True))
+    # Checkpoint of the run in progress: its starting watermark, the next
+    # page cursor and the newest change seen so far
+    run_since = Column(DateTime(timezone=True))
+    cursor = Column(String)
+    run_watermark = Column(DateTime(timezone=True))
+    pages = Column(Integer, nullable=False, default=0)
+    records_synced = Column(Integer, nullable=False, default=0)
+    records_failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+
+
+class SnapshotExportState(Base):
+    __tablename__ = "snapshot_export_states"
+
+    table_name = Column(String, primary_key=True)
+    status = Column(String, nullable=False, default="idle")  # idle, running, failed
+    # Position of the last exported row in (watermark column, id) order
+    watermark = Column(DateTime(timezone=True))
+    last_id = Column(Integer)
+    rows_exported = Column(Integer, nullable=False, default=0)
+    files_written = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+
 
 # New models for care teams and assignments
 
@@ -289,6 +519,19 @@ class CareTeamMember(Base):
     care_team = relationship("CareTeam", back_populates="members")
     user = relationship("User", back_populates="care_team_memberships")
 
+    __table_args__ = (
+        UniqueConstraint("care_team_id", "user_id", name="uq_care_team_members_team_user"),
+    )
+
+
+class UserPatientAccess(Base):
+    __tablename__ = "user_patient_access"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True)
+    roles = Column(ARRAY(String), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 
 class StepAssignment(Base):
     __tablename__ = "step_assignments"
@@ -302,9 +545,24 @@ class StepAssignment(Base):
     due_date = Column(DateTime(timezone=True))
     status = Column(String, default="pending")
     notes = Column(String)
+    overdue_at = Column(DateTime(timezone=True))
 
     # Relationships
     pathway = relationship("PatientPathway", back_populates="step_assignments")
     step = relationship("PathwayStep", back_populates="assignments")
     assigned_to = relationship("User", back_populates="step_assignments")
 
+    __table_args__ = (
+        UniqueConstraint("pathway_id", "step_id", name="uq_step_assignments_pathway_step"),
+        Index("ix_step_assignments_pathway_assigned_at", "pathway_id", "assigned_at"),
+        # Covers only open, unmarked assignments so the overdue scan stays small
+        Index(
+            "ix_step_assignments_overdue_scan",
+            "due_date",
+            postgresql_where=text(
+                "overdue_at IS NULL AND status NOT IN (%s)"
+                % ", ".join(f"'{status}'" for status in CLOSED_ASSIGNMENT_STATUSES)
+            )
+        ),
+    )
+
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+import models
+import schemas
+from database import get_db
+from services.pathway_analytics import pathway_analytics
+from services.snapshot_exporter import snapshot_exporter, SNAPSHOT_EXPORT_DIR
+
+router = APIRouter()
+
+@router.get("/step-durations", response_model=List[schemas.StepDurationStatistics])
+def get_step_durations(
+    template_id: int,
+    days: int = Query(30, ge=1),
+    db: Session = Depends(get_db)
+):
+    return pathway_analytics.get_step_statistics(db, template_id, days)
+
+@router.get("/bottlenecks", response_model=List[schemas.StepDurationStatistics])
+def get_bottlenecks(
+    template_id: int,
+    days: int = Query(30, ge=1),
+    limit: int = Query(5, ge=1),
+    min_samples: int = Query(5, ge=1),
+    db: Session = Depends(get_db)
+):
+    return pathway_analytics.get_bottlenecks(db, template_id, days, limit, min_samples)
+
+@router.post("/step-durations/refresh", response_model=schemas.StandardResponse)
+def refresh_step_durations(day: Optional[date] = None, db: Session = Depends(get_db)):
+    try:
+        # Rebuild a single day on request, otherwise catch up incrementally
+        if day:
+            rows = pathway_analytics.materialize_day(db, day)
+            return {"success": True, "message": f"Materialized {rows} step aggregates for {day}"}
+        
+        days = pathway_analytics.refresh(db)
+        return {"success": True, "message": f"Materialized {days} days of step aggregates"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to refresh step durations: {str(e)}")
+
+@router.get("/snapshots", response_model=List[schemas.SnapshotExportState])
+def get_snapshot_states(db: Session = Depends(get_db)):
+    return snapshot_exporter.get_states(db)
+
+@router.post("/snapshots/run", response_model=schemas.SnapshotExportState)
+def run_snapshot_export(table: str, full: bool = False, db: Session = Depends(get_db)):
+    if not SNAPSHOT_EXPORT_DIR:
+        raise HTTPException(status_code=400, detail="SNAPSHOT_EXPORT_DIR is not configured")
+    
+    try:
+        state = snapshot_exporter.export_table(db, table, SNAPSHOT_EXPORT_DIR, full)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Snapshot export failed: {str(e)}")
+    
+    if state is None:
+        raise HTTPException(status_code=409, detail=f"A snapshot export of {table} is already running")
+    
+    return state
@@ -1,20 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import models
 import schemas
 from database import get_db
-from services.notification_service import notification_service
 from services.event_bus import publish_event
-from datetime import datetime
+from services.overdue_detector import overdue_detector
+from services.assignment_service import assignment_service
+from services.idempotency import idempotency_service
+from services.validation import ReferenceNotFoundError, ConflictError
+from datetime import datetime, timezone
 
 router = APIRouter()
 
+def batch_error_detail(error):
+    # Point at the offending entry when the error is tied to one
+    if error.index is None:
+        return str(error)
+    return f"Assignment {error.index}: {str(error)}"
+
 @router.get("/", response_model=List[schemas.StepAssignment])
 def get_assignments(
     pathway_id: Optional[int] = None,
     assigned_to_id: Optional[int] = None,
     status: Optional[str] = None,
+    overdue: Optional[bool] = None,
     db: Session = Depends(get_db)
 ):
     # Build query
@@ -30,100 +40,55 @@ def get_assignments(
     if status:
         query = query.filter(models.StepAssignment.status == status)
     
+    if overdue is not None:
+        if overdue:
+            query = query.filter(models.StepAssignment.overdue_at.isnot(None))
+        else:
+            query = query.filter(models.StepAssignment.overdue_at.is_(None))
+    
     # Get assignments
     assignments = query.order_by(models.StepAssignment.assigned_at.desc()).all()
     
     return assignments
 
 @router.post("/", response_model=schemas.StepAssignment, status_code=201)
-def create_assignment(assignment: schemas.StepAssignmentCreate, db: Session = Depends(get_db)):
-    # Check if pathway exists
-    pathway = db.query(models.PatientPathway).filter(
-        models.PatientPathway.id == assignment.pathway_id
-    ).first()
-    
-    if pathway is None:
-        raise HTTPException(status_code=404, detail="Pathway not found")
-    
-    # Check if step exists
-    step = db.query(models.PathwayStep).filter(
-        models.PathwayStep.id == assignment.step_id
-    ).first()
-    
-    if step is None:
-        raise HTTPException(status_code=404, detail="Step not found")
-    
-    # Check if user exists
-    user = db.query(models.User).filter(
-        models.User.id == assignment.assigned_to_id
-    ).first()
-    
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Check if assignment already exists
-    existing_assignment = db.query(models.StepAssignment).filter(
-        models.StepAssignment.pathway_id == assignment.pathway_id,
-        models.StepAssignment.step_id == assignment.step_id
-    ).first()
-    
-    if existing_assignment:
-        raise HTTPException(status_code=400, detail="Assignment already exists for this step")
-    
-    # Create assignment
-    db_assignment = models.StepAssignment(
-        pathway_id=assignment.pathway_id,
-        step_id=assignment.step_id,
-        assigned_to_id=assignment.assigned_to_id,
-        assigned_by_id=assignment.assigned_by_id,
-        due_date=assignment.due_date,
-        status=assignment.status,
-        notes=assignment.notes
-    )
-    
-    db.add(db_assignment)
-    db.commit()
-    db.refresh(db_assignment)
-    
-    # Get patient details for notification
-    patient = db.query(models.Patient).join(
-        models.PatientPathway, models.Patient.id == models.PatientPathway.patient_id
-    ).filter(
-        models.PatientPathway.id == assignment.pathway_id
-    ).first()
-    
-    # Send notification to assignee
-    notification_service.create_notification(
-        db,
-        schemas.NotificationCreate(
-            recipient_id=assignment.assigned_to_id,
-            title="New Step Assignment",
-            description=f"You have been assigned to step \"{step.name}\" for patient {patient.first_name} {patient.last_name}.",
-            notification_type="assignment",
-            related_patient_id=patient.id,
-            related_pathway_id=assignment.pathway_id,
-            priority="normal"
-        )
-    )
-    
-    # Publish event
-    publish_event(
-        db,
-        {
-            "event_type": "step:assigned",
-            "aggregate_type": "assignment",
-            "aggregate_id": str(db_assignment.id),
-            "data": {
-                "assignment_id": db_assignment.id,
-                "pathway_id": assignment.pathway_id,
-                "step_id": assignment.step_id,
-                "assigned_to_id": assignment.assigned_to_id,
-                "assigned_by_id": assignment.assigned_by_id
-            }
-        }
+def create_assignment(
+    assignment: schemas.StepAssignmentCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    def run():
+        try:
+            return assignment_service.create_assignments(db, [assignment])[0]
+        except ReferenceNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ConflictError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    return idempotency_service.execute(
+        db, idempotency_key, request, assignment.model_dump(mode="json"), run, schemas.StepAssignment, 201
     )
-    
-    return db_assignment
+
+@router.post("/batch", response_model=List[schemas.StepAssignment], status_code=201)
+def create_assignments(batch: schemas.StepAssignmentBatchCreate, db: Session = Depends(get_db)):
+    if not batch.assignments:
+        return []
+    
+    try:
+        return assignment_service.create_assignments(db, batch.assignments)
+    except ReferenceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=batch_error_detail(e))
+    except ConflictError as e:
+        raise HTTPException(status_code=400, detail=batch_error_detail(e))
+
+@router.post("/detect-overdue", response_model=schemas.StandardResponse)
+def detect_overdue_assignments(db: Session = Depends(get_db)):
+    try:
+        marked = overdue_detector.run_tick(db)
+        return {"success": True, "message": f"Marked {marked} assignments as overdue", "data": {"marked": marked}}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to detect overdue assignments: {str(e)}")
 
 @router.get("/{assignment_id}", response_model=schemas.StepAssignment)
 def get_assignment(assignment_id: int, db: Session = Depends(get_db)):
@@ -145,12 +110,25 @@ def update_assignment(assignment_id: int, assignment: schemas.StepAssignmentUpda
     if db_assignment is None:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
+    old_status = db_assignment.status
+    was_overdue = db_assignment.overdue_at is not None
+    overdue_cleared = False
+    
     # Update assignment attributes
     if assignment.status is not None:
         db_assignment.status = assignment.status
     
     if assignment.due_date is not None:
-        db_assignment.due_date = assignment.due_date
+        # A due date without a timezone is taken as UTC
+        due_date = assignment.due_date
+        if due_date.tzinfo is None:
+            due_date = due_date.replace(tzinfo=timezone.utc)
+        db_assignment.due_date = due_date
+        
+        # Moving the due date into the future lifts the overdue mark
+        if was_overdue and due_date > datetime.now(timezone.utc):
+            db_assignment.overdue_at = None
+            overdue_cleared = db_assignment.status not in models.CLOSED_ASSIGNMENT_STATUSES
     
     if assignment.notes is not None:
         db_assignment.notes = assignment.notes
@@ -158,6 +136,39 @@ def update_assignment(assignment_id: int, assignment: schemas.StepAssignmentUpda
     db.commit()
     db.refresh(db_assignment)
     
+    if overdue_cleared:
+        publish_event(
+            db,
+            {
+                "event_type": "assignment:overdue:cleared",
+                "aggregate_type": "assignment",
+                "aggregate_id": str(assignment_id),
+                "data": {
+                    "assignment_id": assignment_id,
+                    "pathway_id": db_assignment.pathway_id,
+                    "assigned_to_id": db_assignment.assigned_to_id
+                }
+            }
+        )
+    
+    if db_assignment.status != old_status:
+        publish_event(
+            db,
+            {
+                "event_type": "assignment:status:changed",
+                "aggregate_type": "assignment",
+                "aggregate_id": str(assignment_id),
+                "data": {
+                    "assignment_id": assignment_id,
+                    "pathway_id": db_assignment.pathway_id,
+                    "assigned_to_id": db_assignment.assigned_to_id,
+                    "old_status": old_status,
+                    "new_status": db_assignment.status,
+                    "was_overdue": was_overdue and not overdue_cleared
+                }
+            }
+        )
+    
     return db_assignment
 
 @router.delete("/{assignment_id}", status_code=204)
@@ -169,8 +180,26 @@ def delete_assignment(assignment_id: int, db: Session = Depends(get_db)):
     if db_assignment is None:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
+    deleted_data = {
+        "assignment_id": assignment_id,
+        "pathway_id": db_assignment.pathway_id,
+        "assigned_to_id": db_assignment.assigned_to_id,
+        "status": db_assignment.status,
+        "was_overdue": db_assignment.overdue_at is not None and db_assignment.status not in models.CLOSED_ASSIGNMENT_STATUSES
+    }
+    
     db.delete(db_assignment)
     db.commit()
     
+    publish_event(
+        db,
+        {
+            "event_type": "assignment:deleted",
+            "aggregate_type": "assignment",
+            "aggregate_id": str(assignment_id),
+            "data": deleted_data
+        }
+    )
+    
     return None
 
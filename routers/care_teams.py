@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import models
 import schemas
 from database import get_db
+from services.care_team_service import care_team_service
+from services.validation import check_references, conflicts_mapped, ReferenceNotFoundError, ConflictError
 
 router = APIRouter()
 
@@ -20,6 +23,15 @@ def get_care_teams(
 
 @router.post("/", response_model=schemas.CareTeam, status_code=201)
 def create_care_team(care_team: schemas.CareTeamCreate, db: Session = Depends(get_db)):
+    # Check the patient and all member users in one query
+    try:
+        check_references(db, {
+            "Patient": (models.Patient, care_team.patient_id),
+            "User": (models.User, [member.user_id for member in care_team.members])
+        })
+    except ReferenceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
     # Create care team
     db_care_team = models.CareTeam(
         name=care_team.name,
@@ -32,19 +44,26 @@ def create_care_team(care_team: schemas.CareTeamCreate, db: Session = Depends(ge
     
     # Add members if provided
     if care_team.members:
-        for member in care_team.members:
-            db_member = models.CareTeamMember(
+        db.add_all([
+            models.CareTeamMember(
                 care_team_id=db_care_team.id,
                 user_id=member.user_id,
                 role=member.role,
                 is_primary=member.is_primary
-            )
-            db.add(db_member)
-    
-    db.commit()
-    db.refresh(db_care_team)
-    
-    return db_care_team
+            ) for member in care_team.members
+        ])
+    
+    try:
+        with conflicts_mapped(db):
+            db.flush()
+            care_team_service.refresh_access(db, care_team.patient_id, [member.user_id for member in care_team.members])
+            db.commit()
+    except ReferenceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ConflictError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return care_team_service.get_care_team(db, db_care_team.id)
 
 @router.get("/{care_team_id}", response_model=schemas.CareTeam)
 def get_care_team(care_team_id: int, db: Session = Depends(get_db)):
@@ -84,7 +103,18 @@ def delete_care_team(care_team_id: int, db: Session = Depends(get_db)):
     if db_care_team is None:
         raise HTTPException(status_code=404, detail="Care team not found")
     
-    db.delete(db_care_team)
+    member_user_ids = [
+        user_id for (user_id,) in db.query(models.CareTeamMember.user_id).filter(
+            models.CareTeamMember.care_team_id == care_team_id
+        )
+    ]
+    
+    # Delete in SQL so members go through the ON DELETE CASCADE
+    db.execute(
+        delete(models.CareTeam).where(models.CareTeam.id == care_team_id),
+        execution_options={"synchronize_session": False}
+    )
+    care_team_service.refresh_access(db, db_care_team.patient_id, member_user_ids)
     db.commit()
     
     return None
@@ -97,32 +127,25 @@ def get_care_team_members(care_team_id: int, db: Session = Depends(get_db)):
     
     return members
 
+@router.put("/{care_team_id}/members", response_model=schemas.CareTeam)
+def sync_care_team_members(care_team_id: int, members: List[schemas.CareTeamMemberCreate], db: Session = Depends(get_db)):
+    try:
+        return care_team_service.sync_members(db, care_team_id, members)
+    except ReferenceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ConflictError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/{care_team_id}/members", response_model=schemas.CareTeamMember, status_code=201)
 def add_care_team_member(care_team_id: int, member: schemas.CareTeamMemberCreate, db: Session = Depends(get_db)):
-    # Check if care team exists
-    care_team = db.query(models.CareTeam).filter(
-        models.CareTeam.id == care_team_id
-    ).first()
-    
-    if care_team is None:
-        raise HTTPException(status_code=404, detail="Care team not found")
-    
-    # Check if user exists
-    user = db.query(models.User).filter(
-        models.User.id == member.user_id
-    ).first()
-    
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Check if member already exists
-    existing_member = db.query(models.CareTeamMember).filter(
-        models.CareTeamMember.care_team_id == care_team_id,
-        models.CareTeamMember.user_id == member.user_id
-    ).first()
-    
-    if existing_member:
-        raise HTTPException(status_code=400, detail="User is already a member of this care team")
+    # Check the care team and user in one query; duplicates hit the unique constraint
+    try:
+        check_references(db, {
+            "Care team": (models.CareTeam, care_team_id),
+            "User": (models.User, member.user_id)
+        })
+    except ReferenceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     
     # Create member
     db_member = models.CareTeamMember(
@@ -133,7 +156,17 @@ def add_care_team_member(care_team_id: int, member: schemas.CareTeamMemberCreate
     )
     
     db.add(db_member)
-    db.commit()
+    
+    try:
+        with conflicts_mapped(db):
+            db.flush()
+            care_team_service.refresh_access_for_team(db, care_team_id, [member.user_id])
+            db.commit()
+    except ReferenceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ConflictError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     db.refresh(db_member)
     
     return db_member
@@ -149,6 +182,8 @@ def remove_care_team_member(care_team_id: int, member_id: int, db: Session = Dep
         raise HTTPException(status_code=404, detail="Care team member not found")
     
     db.delete(member)
+    db.flush()
+    care_team_service.refresh_access_for_team(db, care_team_id, [member.user_id])
     db.commit()
     
     return None
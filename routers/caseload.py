@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import models
+import schemas
+from database import get_db
+from services.care_team_service import care_team_service
+
+router = APIRouter()
+
+@router.get("/{user_id}", response_model=List[schemas.CaseloadPatient])
+def get_caseload(
+    user_id: int,
+    pathway_status: Optional[str] = "active",
+    db: Session = Depends(get_db)
+):
+    return care_team_service.get_caseload(db, user_id, pathway_status)
+
+@router.post("/rebuild", response_model=schemas.StandardResponse)
+def rebuild_caseload_index(db: Session = Depends(get_db)):
+    try:
+        care_team_service.rebuild_access(db)
+        return {"success": True, "message": "Caseload index rebuilt"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild caseload index: {str(e)}")
@@ -5,6 +5,7 @@ import models
 import schemas
 from database import get_db
 from services.ai_orchestrator import ai_orchestrator
+from services.insight_queue import insight_queue, INSIGHT_MAX_WAIT
 
 router = APIRouter()
 
@@ -41,6 +42,55 @@ def generate_insight(insight: schemas.AIInsightCreate, db: Session = Depends(get
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate insight: {str(e)}")
 
+@router.get("/panel/{user_id}/scores", response_model=List[schemas.PathwayRiskScore])
+def get_panel_scores(user_id: int, db: Session = Depends(get_db)):
+    return sorted(ai_orchestrator.score_panel(db, user_id), key=lambda s: s["score"], reverse=True)
+
+@router.post("/jobs", response_model=schemas.InsightJob, status_code=202)
+def enqueue_insight_job(insight: schemas.AIInsightCreate, db: Session = Depends(get_db)):
+    try:
+        return insight_queue.enqueue(db, [insight])[0]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to enqueue insight job: {str(e)}")
+
+@router.post("/jobs/batch", response_model=List[schemas.InsightJob], status_code=202)
+def enqueue_insight_jobs(insights: List[schemas.AIInsightCreate], db: Session = Depends(get_db)):
+    try:
+        return insight_queue.enqueue(db, insights)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to enqueue insight jobs: {str(e)}")
+
+@router.get("/jobs/{job_id}", response_model=schemas.InsightJob)
+def get_insight_job(
+    job_id: int,
+    wait: float = Query(0, ge=0, le=INSIGHT_MAX_WAIT, description="Seconds to wait for the job to finish; poll again if it has not"),
+    db: Session = Depends(get_db)
+):
+    if wait:
+        job = insight_queue.wait_for_job(db, job_id, wait)
+    else:
+        job = insight_queue.get_job(db, job_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Insight job not found")
+    
+    return job
+
+@router.post("/update-status", response_model=schemas.StandardResponse)
+def update_insight_statuses(status_update: schemas.AIInsightBulkStatusUpdate, db: Session = Depends(get_db)):
+    try:
+        updated, missing = ai_orchestrator.update_insight_statuses(
+            db, status_update.insight_ids, status_update.status, status_update.user_id
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update insight statuses: {str(e)}")
+    
+    return {
+        "success": True,
+        "message": f"Updated {len(updated)} insights",
+        "data": {"updated": updated, "missing": missing}
+    }
+
 @router.post("/{insight_id}/update-status", response_model=schemas.AIInsight)
 def update_insight_status(insight_id: int, status_update: schemas.AIInsightStatusUpdate, db: Session = Depends(get_db)):
     try:
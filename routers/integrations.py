@@ -0,0 +1,111 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import models
+import schemas
+from database import get_db
+from services.ehr_sync import ehr_patient_sync
+from services.integration_service import integration_service
+from services.integration_worker import integration_worker, INTEGRATION_MAX_WAIT
+from services.transformation_engine import MappingError
+from services.validation import ReferenceNotFoundError
+
+router = APIRouter()
+
+@router.get("/configs", response_model=List[schemas.IntegrationConfig])
+def get_integration_configs(db: Session = Depends(get_db)):
+    return integration_service.get_integration_configs(db)
+
+@router.post("/configs", response_model=schemas.IntegrationConfig)
+def upsert_integration_config(config: schemas.IntegrationConfigCreate, db: Session = Depends(get_db)):
+    try:
+        return integration_service.upsert_integration_config(db, config.model_dump())
+    except MappingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/configs/{config_id}/transform", response_model=schemas.IntegrationTransformResult)
+def transform_payloads(config_id: int, request: schemas.IntegrationTransformRequest, db: Session = Depends(get_db)):
+    try:
+        results, errors = integration_service.transform_payloads(db, config_id, request.operation, request.payloads)
+    except MappingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return {"results": results, "errors": errors}
+
+@router.get("/configs/{config_id}/patient-sync", response_model=schemas.IntegrationSyncState)
+def get_patient_sync_state(config_id: int, db: Session = Depends(get_db)):
+    state = ehr_patient_sync.get_state(db, config_id)
+    
+    if state is None:
+        raise HTTPException(status_code=404, detail="Patient sync has not run for this config")
+    
+    return state
+
+@router.post("/configs/{config_id}/patient-sync", response_model=schemas.IntegrationSyncState, status_code=202)
+def queue_patient_sync(config_id: int, db: Session = Depends(get_db)):
+    # The scheduler runs the sync; follow it through GET .../patient-sync
+    try:
+        state = ehr_patient_sync.enqueue(db, config_id)
+    except ReferenceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    if state is None:
+        raise HTTPException(status_code=409, detail="Patient sync is already running for this config")
+    
+    return state
+
+@router.get("/requests", response_model=List[schemas.IntegrationRequest])
+def get_integration_requests(
+    config_id: Optional[int] = None,
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1),
+    db: Session = Depends(get_db)
+):
+    query = db.query(models.IntegrationRequest)
+    
+    if config_id:
+        query = query.filter(models.IntegrationRequest.config_id == config_id)
+    
+    if status:
+        query = query.filter(models.IntegrationRequest.status == status)
+    
+    return query.order_by(models.IntegrationRequest.created_at.desc()).limit(limit).all()
+
+@router.post("/requests", response_model=schemas.IntegrationRequest, status_code=202)
+def enqueue_integration_request(
+    request: schemas.IntegrationRequestCreate,
+    http_request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    try:
+        queued = integration_service.execute_integration(db, request.config_id, request.operation, request.payload)
+    except ReferenceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    # Where to follow the request until the worker finishes it
+    response.headers["Location"] = str(http_request.url_for("get_integration_request", request_id=queued.id))
+    
+    return queued
+
+@router.get("/requests/{request_id}", response_model=schemas.IntegrationRequest)
+def get_integration_request(
+    request_id: int,
+    wait: float = Query(0, ge=0, le=INTEGRATION_MAX_WAIT, description="Seconds to wait for the request to finish; poll again if it has not"),
+    db: Session = Depends(get_db)
+):
+    if wait:
+        request = integration_worker.wait_for_request(db, request_id, wait)
+    else:
+        request = db.query(models.IntegrationRequest).filter(
+            models.IntegrationRequest.id == request_id
+        ).first()
+    
+    if request is None:
+        raise HTTPException(status_code=404, detail="Integration request not found")
+    
+    return request
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import models
 import schemas
 from database import get_db
 from services.notification_service import notification_service
+from services.idempotency import idempotency_service
 
 router = APIRouter()
 
@@ -30,11 +31,21 @@ def get_notifications(
     return notifications
 
 @router.post("/", response_model=schemas.Notification, status_code=201)
-def create_notification(notification: schemas.NotificationCreate, db: Session = Depends(get_db)):
-    try:
-        return notification_service.create_notification(db, notification)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to create notification: {str(e)}")
+def create_notification(
+    notification: schemas.NotificationCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    def run():
+        try:
+            return notification_service.create_notification(db, notification)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to create notification: {str(e)}")
+    
+    return idempotency_service.execute(
+        db, idempotency_key, request, notification.model_dump(mode="json"), run, schemas.Notification, 201
+    )
 
 @router.post("/{notification_id}/mark-as-read", response_model=schemas.Notification)
 def mark_notification_as_read(notification_id: int, db: Session = Depends(get_db)):
@@ -1,11 +1,16 @@
 import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import models
 import schemas
 from database import get_db
 from services.pathway_engine import pathway_engine
+from services.event_replay import pathway_replay
+from services.validation import StaleVersionError
+from services.idempotency import idempotency_service
+from services.export_service import export_service, EXPORT_FORMATS
 import math
 
 router = APIRouter()
@@ -46,6 +51,36 @@ def get_pathways(
         }
     }
 
+@router.get("/export")
+def export_pathways(
+    dataset: str = Query("pathways", description="pathways or completed_steps"),
+    format: str = Query("ndjson", description="ndjson or csv"),
+    template_id: Optional[int] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime.datetime] = Query(None, description="Inclusive; pathway start date or step completion time"),
+    date_to: Optional[datetime.datetime] = Query(None, description="Exclusive; pathway start date or step completion time")
+):
+    # Rows are streamed as they are read, so the export is never held in memory
+    try:
+        chunks = export_service.stream(dataset, format, template_id, status, date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filename = f"{dataset}-{datetime.date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/progress/rebuild", response_model=schemas.StandardResponse)
+def rebuild_pathway_progress(db: Session = Depends(get_db)):
+    try:
+        count = pathway_engine.refresh_progress(db)
+        return {"success": True, "message": f"Progress rebuilt for {count} pathways"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild pathway progress: {str(e)}")
+
 @router.post("/", response_model=schemas.PatientPathway, status_code=201)
 def create_pathway(pathway: schemas.PatientPathwayCreate, db: Session = Depends(get_db)):
     try:
@@ -64,32 +99,56 @@ def get_pathway(pathway_id: int, db: Session = Depends(get_db)):
     
     return pathway
 
-@router.put("/{pathway_id}", response_model=schemas.PatientPathway)
-def update_pathway(pathway_id: int, pathway_update: schemas.PatientPathwayUpdate, db: Session = Depends(get_db)):
-    db_pathway = db.query(models.PatientPathway).filter(models.PatientPathway.id == pathway_id).first()
+@router.get("/{pathway_id}/state", response_model=schemas.PathwayState)
+def get_pathway_state(pathway_id: int, as_of: Optional[datetime.datetime] = None, db: Session = Depends(get_db)):
+    state = pathway_replay.get_state(db, pathway_id, as_of)
     
-    if db_pathway is None:
-        raise HTTPException(status_code=404, detail="Pathway not found")
+    if state is None:
+        raise HTTPException(status_code=404, detail="No events found for pathway")
     
-    # Only allow updating status and currentStepId
-    if pathway_update.status is not None:
-        db_pathway.status = pathway_update.status
+    return state
+
+@router.post("/{pathway_id}/snapshot", response_model=schemas.StandardResponse)
+def snapshot_pathway_state(pathway_id: int, db: Session = Depends(get_db)):
+    # Folds only events older than the snapshot lag; newer ones are replayed on read
+    snapshot = pathway_replay.take_snapshot(db, pathway_id)
     
-    if pathway_update.current_step_id is not None:
-        db_pathway.current_step_id = pathway_update.current_step_id
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No settled events found for pathway")
     
-    db_pathway.updated_at = datetime.now()
+    return {"success": True, "message": f"Snapshot at event {snapshot.last_event_id} ({snapshot.event_count} events)"}
+
+@router.put("/{pathway_id}", response_model=schemas.PatientPathway)
+def update_pathway(pathway_id: int, pathway_update: schemas.PatientPathwayUpdate, db: Session = Depends(get_db)):
+    try:
+        db_pathway = pathway_engine.update_pathway(db, pathway_id, pathway_update)
+    except StaleVersionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
-    db.commit()
-    db.refresh(db_pathway)
+    if db_pathway is None:
+        raise HTTPException(status_code=404, detail="Pathway not found")
     
     return db_pathway
 
 @router.post("/{pathway_id}/complete-step", response_model=schemas.PatientPathway)
-def complete_step(pathway_id: int, step_data: schemas.CompleteStepRequest, db: Session = Depends(get_db)):
-    try:
-        return pathway_engine.complete_step(db, pathway_id, step_data)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to complete step: {str(e)}")
+def complete_step(
+    pathway_id: int,
+    step_data: schemas.CompleteStepRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    def run():
+        try:
+            return pathway_engine.complete_step(db, pathway_id, step_data)
+        except StaleVersionError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to complete step: {str(e)}")
+    
+    # Retries with the same Idempotency-Key replay the first response
+    return idempotency_service.execute(
+        db, idempotency_key, request, step_data.model_dump(mode="json"), run, schemas.PatientPathway
+    )
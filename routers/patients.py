@@ -4,6 +4,7 @@ from typing import List, Optional
 import models
 import schemas
 from database import get_db
+from services.timeline_service import timeline_service
 import math
 
 router = APIRouter()
@@ -72,6 +73,24 @@ def get_patient(patient_id: int, db: Session = Depends(get_db)):
     
     return db_patient
 
+@router.get("/{patient_id}/timeline", response_model=schemas.PatientTimeline)
+def get_patient_timeline(
+    patient_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    kinds: Optional[str] = Query(None, description="Comma-separated entry kinds to include"),
+    db: Session = Depends(get_db)
+):
+    if not db.query(models.Patient.id).filter(models.Patient.id == patient_id).first():
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    kind_list = [kind.strip() for kind in kinds.split(",") if kind.strip()] if kinds else None
+    
+    try:
+        return timeline_service.get_page(db, patient_id, limit, cursor, kind_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.put("/{patient_id}", response_model=schemas.Patient)
 def update_patient(patient_id: int, patient: schemas.PatientUpdate, db: Session = Depends(get_db)):
     db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import models
+import schemas
+from database import get_db
+from services.summary_service import summary_service
+
+router = APIRouter()
+
+@router.get("/", response_model=schemas.DashboardSummary)
+def get_summary(
+    template_id: Optional[int] = None,
+    assignee_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    return summary_service.get_summary(db, template_id, assignee_id)
+
+@router.post("/refresh", response_model=schemas.StandardResponse)
+def refresh_summary(db: Session = Depends(get_db)):
+    try:
+        summary_service.reconcile(db)
+        return {"success": True, "message": "Summary counters reconciled"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to refresh summary: {str(e)}")
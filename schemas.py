@@ -125,6 +125,28 @@ class CareTeam(CareTeamBase):
     class Config:
         from_attributes = True
 
+# Caseload schemas
+class CaseloadPathway(BaseModel):
+    pathway_id: int
+    template_id: int
+    template_name: str
+    status: str
+    start_date: Optional[datetime] = None
+    estimated_end_date: Optional[datetime] = None
+    current_step_id: Optional[int] = None
+    current_step_name: Optional[str] = None
+    steps_completed: int = 0
+    total_steps: int = 0
+    progress_percent: float = 0
+    last_completed_at: Optional[datetime] = None
+
+class CaseloadPatient(BaseModel):
+    patient_id: int
+    first_name: str
+    last_name: str
+    roles: List[str] = []
+    pathways: List[CaseloadPathway] = []
+
 # Step Assignment schemas
 class StepAssignmentBase(BaseModel):
     pathway_id: int
@@ -136,7 +158,11 @@ class StepAssignmentBase(BaseModel):
     notes: Optional[str] = None
 
 class StepAssignmentCreate(StepAssignmentBase):
-    pass
+    # Leave unset to auto-assign the least loaded eligible care team member
+    assigned_to_id: Optional[int] = None
+
+class StepAssignmentBatchCreate(BaseModel):
+    assignments: List[StepAssignmentCreate]
 
 class StepAssignmentUpdate(BaseModel):
     status: Optional[str] = None
@@ -146,6 +172,7 @@ class StepAssignmentUpdate(BaseModel):
 class StepAssignment(StepAssignmentBase):
     id: int
     assigned_at: datetime
+    overdue_at: Optional[datetime] = None
     pathway: "PatientPathway"
     step: PathwayStep
     assigned_to: User
@@ -182,6 +209,8 @@ class PatientPathwayCreate(PatientPathwayBase):
 class PatientPathwayUpdate(BaseModel):
     status: Optional[str] = None
     current_step_id: Optional[int] = None
+    # Version the client read; the update is rejected if the pathway changed since
+    version: Optional[int] = None
 
 class PatientPathway(PatientPathwayBase):
     id: int
@@ -192,6 +221,11 @@ class PatientPathway(PatientPathwayBase):
     created_by: Optional[int] = None
     created_at: datetime
     updated_at: datetime
+    version: int
+    steps_completed: int = 0
+    total_steps: int = 0
+    progress_percent: float = 0
+    last_completed_at: Optional[datetime] = None
     patient: Patient
     template: PathwayTemplate
     current_step: Optional[PathwayStep] = None
@@ -201,6 +235,83 @@ class PatientPathway(PatientPathwayBase):
     class Config:
         from_attributes = True
 
+# List views read the progress fields instead of the nested template and steps
+class PatientPathwaySummary(PatientPathwayBase):
+    id: int
+    current_step_id: Optional[int] = None
+    start_date: datetime
+    estimated_end_date: Optional[datetime] = None
+    actual_end_date: Optional[datetime] = None
+    created_by: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+    version: int
+    steps_completed: int = 0
+    total_steps: int = 0
+    progress_percent: float = 0
+    last_completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Replayed pathway state schemas
+class ReplayedCompletedStep(BaseModel):
+    step_id: int
+    completed_by_id: Optional[int] = None
+    completed_at: Optional[datetime] = None
+
+class PathwayState(BaseModel):
+    pathway_id: int
+    patient_id: Optional[int] = None
+    template_id: Optional[int] = None
+    status: Optional[str] = None
+    current_step_id: Optional[int] = None
+    completed_steps: List[ReplayedCompletedStep] = []
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    event_count: int
+    last_event_id: Optional[int] = None
+    last_event_at: Optional[datetime] = None
+
+# Pathway analytics schemas
+class StepDurationStatistics(BaseModel):
+    template_id: int
+    step_id: int
+    step_name: str
+    step_order: int
+    estimated_duration: Optional[int] = None
+    sample_count: int
+    mean_days: float
+    p50_days: float
+    p90_days: float
+    max_days: float
+    overrun_ratio: Optional[float] = None
+
+# Dashboard summary schemas
+class TemplateStatusSummary(BaseModel):
+    template_id: int
+    active: int
+    completed: int
+    overdue: int
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class AssigneeWorkloadSummary(BaseModel):
+    user_id: int
+    active: int
+    completed: int
+    overdue: int
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class DashboardSummary(BaseModel):
+    templates: List[TemplateStatusSummary] = []
+    assignees: List[AssigneeWorkloadSummary] = []
+
 # Notification schemas
 class NotificationBase(BaseModel):
     title: str
@@ -241,6 +352,11 @@ class AIInsightStatusUpdate(BaseModel):
     status: str
     user_id: Optional[int] = None
 
+class AIInsightBulkStatusUpdate(BaseModel):
+    insight_ids: List[int]
+    status: str
+    user_id: Optional[int] = None
+
 class AIInsight(AIInsightBase):
     id: int
     status: str
@@ -253,6 +369,114 @@ class AIInsight(AIInsightBase):
     class Config:
         from_attributes = True
 
+class PathwayRiskScore(BaseModel):
+    pathway_id: int
+    patient_id: int
+    score: float
+    features: Dict[str, float]
+
+class InsightJob(BaseModel):
+    id: int
+    insight_type: str
+    status: str
+    attempts: int
+    insight_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    insight: Optional[AIInsight] = None
+
+    class Config:
+        from_attributes = True
+
+# Integration schemas
+class IntegrationConfigBase(BaseModel):
+    name: str
+    system_type: str
+    endpoint: str
+    auth_type: str
+    auth_config: Dict[str, Any] = {}
+    enabled: bool = True
+    mappings: Optional[Dict[str, Any]] = None
+    transformations: Optional[Dict[str, Any]] = None
+    rate_limit_per_second: Optional[float] = None
+    max_concurrency: int = 4
+    timeout_seconds: float = 10.0
+    max_attempts: int = 5
+    sync_patients: bool = False
+
+class IntegrationConfigCreate(IntegrationConfigBase):
+    id: Optional[int] = None
+
+class IntegrationConfig(IntegrationConfigBase):
+    id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class IntegrationTransformRequest(BaseModel):
+    operation: str
+    payloads: List[Any]
+
+class IntegrationTransformResult(BaseModel):
+    results: List[Any]
+    errors: List[Optional[str]]
+
+class IntegrationSyncState(BaseModel):
+    config_id: int
+    resource: str
+    status: str
+    watermark: Optional[datetime] = None
+    cursor: Optional[str] = None
+    pages: int
+    records_synced: int
+    records_failed: int
+    last_error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class SnapshotExportState(BaseModel):
+    table_name: str
+    status: str
+    watermark: Optional[datetime] = None
+    last_id: Optional[int] = None
+    rows_exported: int
+    files_written: int
+    last_error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class IntegrationRequestCreate(BaseModel):
+    config_id: int
+    operation: str
+    payload: Dict[str, Any] = {}
+
+class IntegrationRequest(BaseModel):
+    id: int
+    config_id: int
+    operation: str
+    payload: Dict[str, Any]
+    status: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int
+    next_attempt_at: Optional[datetime] = None
+    batch_id: Optional[int] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Pagination schemas
 class PaginationParams(BaseModel):
     page: int = 1
@@ -269,9 +493,23 @@ class PaginatedPatients(BaseModel):
     pagination: PaginationParams
 
 class PaginatedPathways(BaseModel):
-    pathways: List[PatientPathway]
+    pathways: List[PatientPathwaySummary]
     pagination: PaginationParams
 
+# Patient timeline schemas
+class TimelineEntry(BaseModel):
+    kind: str
+    occurred_at: datetime
+    id: int
+    pathway_id: Optional[int] = None
+    title: Optional[str] = None
+    detail: Dict[str, Any] = {}
+
+class PatientTimeline(BaseModel):
+    entries: List[TimelineEntry]
+    # Pass back as cursor for the next page; None on the last page
+    next_cursor: Optional[str] = None
+
 # Response schemas
 class StandardResponse(BaseModel):
     success: bool
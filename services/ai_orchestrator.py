@@ -1,21 +1,37 @@
+from sqlalchemy import insert, update, delete, case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 import models
 import schemas
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
-from decimal import Decimal
-import random
+import hashlib
+import json
+import os
 from services.event_bus import subscribe_to_event
+from services.feature_store import feature_store, FEATURE_NAMES
+from services.insight_models import InsightModel, get_insight_model
+from services.scheduler import scheduler
+
+# Seconds during which an identical insight is not generated again. An hour
+# covers repeated triggers and retries for the same pathway; 0 turns it off.
+INSIGHT_SUPPRESSION_WINDOW = int(os.getenv("INSIGHT_SUPPRESSION_WINDOW_SECONDS", "3600"))
+INSIGHT_SUPPRESSION_PURGE_INTERVAL = int(os.getenv("INSIGHT_SUPPRESSION_PURGE_INTERVAL_SECONDS", "3600"))
 
 class AIOrchestrator:
-    def __init__(self):
+    def __init__(self, model: Optional[InsightModel] = None):
+        self.model = model or get_insight_model()
         self.setup_event_listeners()
+        self.setup_scheduled_jobs()
     
     def setup_event_listeners(self):
         # Subscribe to events that should trigger AI analysis
         subscribe_to_event("pathway:initialized", self.handle_pathway_initialized)
         subscribe_to_event("pathway:step:completed", self.handle_pathway_step_completed)
     
+    def setup_scheduled_jobs(self):
+        scheduler.register("insight-suppression-purge", INSIGHT_SUPPRESSION_PURGE_INTERVAL, self.purge_suppressions)
+    
     def handle_pathway_initialized(self, event):
         # This would be implemented to handle the event
         # For now, we'll just print a message
@@ -26,45 +42,155 @@ class AIOrchestrator:
         # For now, we'll just print a message
         print(f"AI handling pathway:step:completed event: {event.id}")
     
+    def set_model(self, model: InsightModel):
+        """
+        Swap the insight model, e.g. for the deterministic stub in tests
+        """
+        self.model = model
+
+    def generate_batch(self, db: Session, insight_type: str, requests: List[schemas.AIInsightCreate]):
+        """
+        Run the model once over requests of one insight type, with the
+        feature vectors of their related pathways
+        """
+        features = feature_store.get_features(db, [request.related_pathway_id for request in requests])
+        
+        return self.model.generate(db, insight_type, requests, features)
+    
+    def score_panel(self, db: Session, user_id: int):
+        """
+        Score every active pathway on a user's caseload in one vectorized pass
+        """
+        panel = feature_store.get_panel(db, user_id)
+        features = feature_store.get_features(db, [row.id for row in panel])
+        scores = self.model.score(features) if panel else []
+        
+        return [
+            {
+                "pathway_id": row.id,
+                "patient_id": row.patient_id,
+                "score": float(score),
+                "features": dict(zip(FEATURE_NAMES, vector.tolist()))
+            } for row, score, vector in zip(panel, scores, features)
+        ]
+    
     def generate_insight(self, db: Session, data: schemas.AIInsightCreate):
-        # In a real implementation, we would use an AI model to generate insights
-        # based on the context and patient data
-        
-        # For now, we'll simulate AI-generated insights
-        title = ""
-        description = ""
-        confidence = Decimal("0.85")
-        
-        if data.insight_type == "care-gap":
-            title = "Potential Care Gap Detected"
-            description = "Patient may be missing recommended follow-up appointments based on their care history."
-        elif data.insight_type == "recommendation":
-            title = "Treatment Recommendation"
-            description = "Consider adjusting medication schedule based on recent lab results and patient feedback."
-        elif data.insight_type == "optimization":
-            title = "Pathway Optimization Opportunity"
-            description = "This step typically takes longer than estimated. Consider adjusting the timeline or providing additional resources."
-        elif data.insight_type == "alert":
-            title = "Clinical Alert"
-            description = "Recent vital signs indicate potential concern. Recommend immediate clinical review."
-            confidence = Decimal("0.92")
-        
-        # Create the insight in the database
-        insight = models.AIInsight(
-            title=title or data.title,
-            description=description or data.description,
-            insight_type=data.insight_type,
-            related_patient_id=data.related_patient_id,
-            related_pathway_id=data.related_pathway_id,
-            confidence=confidence,
-            status="pending"
-        )
-        
-        db.add(insight)
-        db.commit()
-        db.refresh(insight)
+        result = self.generate_batch(db, data.insight_type, [data])[0]
         
-        return insight
+        try:
+            insight_id = self.store_insights(db, [data], [result])[0]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+        
+        return db.query(models.AIInsight).filter(models.AIInsight.id == insight_id).first()
+    
+    def dedup_key(self, values: Dict[str, Any]):
+        content_hash = hashlib.sha256(
+            f"{values['title']}\n{values['description'] or ''}".strip().lower().encode()
+        ).hexdigest()
+        key = hashlib.sha256(json.dumps([
+            values["insight_type"],
+            values["related_patient_id"],
+            values["related_pathway_id"],
+            content_hash
+        ]).encode()).hexdigest()
+        
+        return key, content_hash
+    
+    def store_insights(self, db: Session, requests: List[schemas.AIInsightCreate], results: List[Dict[str, Any]]):
+        """
+        Insert generated insights, skipping any whose dedup key already has an
+        insight inside the suppression window. Returns the insight id of each
+        request, new or existing, in order. The caller commits.
+        
+        The dedup row is claimed with an upsert before inserting, so
+        concurrent generators of the same key wait on its row lock and then
+        see the winner's insight.
+        """
+        values = [self.insight_values(request, result) for request, result in zip(requests, results)]
+        
+        if not INSIGHT_SUPPRESSION_WINDOW:
+            return db.execute(
+                insert(models.AIInsight).returning(models.AIInsight.id, sort_by_parameter_order=True), values
+            ).scalars().all()
+        
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=INSIGHT_SUPPRESSION_WINDOW)
+        keys = [self.dedup_key(row) for row in values]
+        
+        # One row per key; a statement may not upsert the same row twice
+        claims = {}
+        for row, (key, content_hash) in zip(values, keys):
+            claims.setdefault(key, {
+                "dedup_key": key,
+                "insight_type": row["insight_type"],
+                "related_patient_id": row["related_patient_id"],
+                "related_pathway_id": row["related_pathway_id"],
+                "content_hash": content_hash,
+                "suppressed_count": 0,
+                "first_seen_at": now,
+                "last_seen_at": now,
+                "expires_at": expires_at
+            })
+        
+        table = models.InsightSuppression.__table__
+        statement = pg_insert(table).values(list(claims.values()))
+        expired = table.c.expires_at <= statement.excluded.first_seen_at
+        statement = statement.on_conflict_do_update(
+            index_elements=["dedup_key"],
+            set_={
+                "insight_id": case((expired, None), else_=table.c.insight_id),
+                "suppressed_count": case((expired, 0), else_=table.c.suppressed_count + 1),
+                "first_seen_at": case((expired, statement.excluded.first_seen_at), else_=table.c.first_seen_at),
+                "expires_at": case((expired, statement.excluded.expires_at), else_=table.c.expires_at),
+                "last_seen_at": statement.excluded.last_seen_at
+            }
+        ).returning(table.c.dedup_key, table.c.insight_id)
+        
+        insight_ids = dict(db.execute(statement).all())
+        
+        # Keys without a live insight (new, expired, or deleted) get one now
+        new_keys = [key for key, insight_id in insight_ids.items() if insight_id is None]
+        if new_keys:
+            first_row = {}
+            for row, (key, _) in zip(values, keys):
+                first_row.setdefault(key, row)
+            
+            created = db.execute(
+                insert(models.AIInsight).returning(models.AIInsight.id, sort_by_parameter_order=True),
+                [first_row[key] for key in new_keys]
+            ).scalars().all()
+            
+            db.execute(update(models.InsightSuppression), [
+                {"dedup_key": key, "insight_id": insight_id} for key, insight_id in zip(new_keys, created)
+            ])
+            insight_ids.update(zip(new_keys, created))
+        
+        return [insight_ids[key] for key, _ in keys]
+    
+    def purge_suppressions(self, db: Session):
+        try:
+            db.execute(delete(models.InsightSuppression).where(
+                models.InsightSuppression.expires_at <= datetime.now(timezone.utc)
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+    
+    def insight_values(self, data: schemas.AIInsightCreate, result: Dict[str, Any]):
+        # Column values for an insight generated from a request
+        return {
+            "title": result["title"] or data.title,
+            "description": result["description"] or data.description,
+            "insight_type": data.insight_type,
+            "related_patient_id": data.related_patient_id,
+            "related_pathway_id": data.related_pathway_id,
+            "confidence": result["confidence"],
+            "status": "pending"
+        }
     
     def get_insights_for_patient(self, db: Session, patient_id: int, limit: Optional[int] = None):
         query = db.query(models.AIInsight).filter(
@@ -102,6 +228,31 @@ class AIOrchestrator:
         db.refresh(insight)
         
         return insight
+    
+    def update_insight_statuses(self, db: Session, insight_ids: List[int], status: str, user_id: Optional[int] = None):
+        """
+        Set the status of many insights with one UPDATE. Returns the ids that
+        were updated and those that do not exist.
+        """
+        insight_ids = sorted(set(insight_ids))
+        
+        try:
+            updated = db.execute(
+                update(models.AIInsight).where(
+                    models.AIInsight.id.in_(insight_ids)
+                ).values(
+                    status=status,
+                    acted_on_at=func.now(),
+                    acted_on_by=user_id
+                ).returning(models.AIInsight.id),
+                execution_options={"synchronize_session": False}
+            ).scalars().all()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+        
+        return sorted(updated), sorted(set(insight_ids) - set(updated))
 
 # Create a singleton instance
 ai_orchestrator = AIOrchestrator()
@@ -0,0 +1,199 @@
+from sqlalchemy import values, column, select, func, cast, and_, Integer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+import schemas
+from typing import Optional, List, Dict, Any
+from services.event_bus import publish_events
+from services.notification_service import notification_service
+from services.validation import ReferenceNotFoundError, ConflictError, conflict_from_integrity_error
+
+
+class AssignmentService:
+    def load_references(self, db: Session, requests: List[schemas.StepAssignmentCreate]):
+        """
+        Resolve the pathway, patient, step and assignee for every requested
+        assignment in a single query. A step only resolves within the
+        pathway's template. Duplicate assignments are left to the
+        (pathway_id, step_id) unique constraint.
+        """
+        requested = values(
+            column("idx", Integer),
+            column("pathway_id", Integer),
+            column("step_id", Integer),
+            column("user_id", Integer),
+            name="requested"
+        ).data([
+            (index, request.pathway_id, request.step_id, request.assigned_to_id)
+            for index, request in enumerate(requests)
+        ])
+
+        query = select(
+            requested.c.idx,
+            models.PatientPathway.id.label("pathway_id"),
+            models.Patient.id.label("patient_id"),
+            models.Patient.first_name,
+            models.Patient.last_name,
+            models.PathwayStep.id.label("step_id"),
+            models.PathwayStep.name.label("step_name"),
+            models.PathwayStep.required_roles,
+            models.User.id.label("user_id")
+        ).select_from(requested).outerjoin(
+            models.PatientPathway, models.PatientPathway.id == requested.c.pathway_id
+        ).outerjoin(
+            models.Patient, models.Patient.id == models.PatientPathway.patient_id
+        ).outerjoin(
+            models.PathwayStep, and_(
+                models.PathwayStep.id == requested.c.step_id,
+                models.PathwayStep.template_id == models.PatientPathway.template_id
+            )
+        ).outerjoin(
+            # An all-NULL column in VALUES is typed text, so cast explicitly
+            models.User, models.User.id == cast(requested.c.user_id, Integer)
+        ).order_by(requested.c.idx)
+
+        return db.execute(query).all()
+
+    def load_candidates(self, db: Session, patient_ids: List[int]):
+        """
+        Care team members of the given patients with their current open
+        workload from the assignee summary counters
+        """
+        rows = db.query(
+            models.CareTeam.patient_id,
+            models.CareTeamMember.user_id,
+            models.CareTeamMember.role,
+            models.CareTeamMember.is_primary,
+            func.coalesce(models.AssigneeWorkloadSummary.active, 0).label("open_assignments")
+        ).join(
+            models.CareTeam, models.CareTeam.id == models.CareTeamMember.care_team_id
+        ).outerjoin(
+            models.AssigneeWorkloadSummary, models.AssigneeWorkloadSummary.user_id == models.CareTeamMember.user_id
+        ).filter(
+            models.CareTeam.patient_id.in_(patient_ids)
+        ).all()
+
+        candidates: Dict[int, List[Any]] = {}
+        loads: Dict[int, int] = {}
+        for row in rows:
+            candidates.setdefault(row.patient_id, []).append(row)
+            loads[row.user_id] = row.open_assignments
+
+        return candidates, loads
+
+    def choose_assignee(self, candidates: List[Any], required_roles: Optional[List[str]], loads: Dict[int, int]):
+        eligible = [
+            candidate for candidate in candidates
+            if not required_roles or candidate.role in required_roles
+        ]
+
+        if not eligible:
+            return None
+
+        # Lowest open workload wins; primary members break ties
+        best = min(eligible, key=lambda c: (loads.get(c.user_id, 0), not c.is_primary, c.user_id))
+        return best.user_id
+
+    def create_assignments(self, db: Session, requests: List[schemas.StepAssignmentCreate]):
+        """
+        Validate and insert a batch of assignments in one transaction. Requests
+        without assigned_to_id are given to the least loaded eligible care
+        team member of the patient.
+        """
+        references = self.load_references(db, requests)
+
+        for index, (request, reference) in enumerate(zip(requests, references)):
+            if reference.pathway_id is None:
+                raise ReferenceNotFoundError("Pathway not found", index)
+
+            if reference.step_id is None:
+                raise ReferenceNotFoundError("Step not found in the pathway's template", index)
+
+            if request.assigned_to_id is not None and reference.user_id is None:
+                raise ReferenceNotFoundError("User not found", index)
+
+        candidates: Dict[int, List[Any]] = {}
+        loads: Dict[int, int] = {}
+        if any(request.assigned_to_id is None for request in requests):
+            candidates, loads = self.load_candidates(db, list({r.patient_id for r in references}))
+
+        db_assignments = []
+        for index, (request, reference) in enumerate(zip(requests, references)):
+            assigned_to_id = request.assigned_to_id
+
+            if assigned_to_id is None:
+                assigned_to_id = self.choose_assignee(
+                    candidates.get(reference.patient_id, []), reference.required_roles, loads
+                )
+
+                if assigned_to_id is None:
+                    raise ConflictError(
+                        f"No care team member with a required role is available for step \"{reference.step_name}\"",
+                        index
+                    )
+
+            # Count the new assignment so the rest of the batch spreads out
+            loads[assigned_to_id] = loads.get(assigned_to_id, 0) + 1
+
+            db_assignments.append(models.StepAssignment(
+                pathway_id=request.pathway_id,
+                step_id=request.step_id,
+                assigned_to_id=assigned_to_id,
+                assigned_by_id=request.assigned_by_id,
+                due_date=request.due_date,
+                status=request.status,
+                notes=request.notes
+            ))
+
+        try:
+            db.add_all(db_assignments)
+            db.flush()
+
+            # Notify each assignee as part of the same transaction
+            notification_service.create_notifications(db, [
+                schemas.NotificationCreate(
+                    recipient_id=db_assignment.assigned_to_id,
+                    title="New Step Assignment",
+                    description=f"You have been assigned to step \"{reference.step_name}\" for patient {reference.first_name} {reference.last_name}.",
+                    notification_type="assignment",
+                    related_patient_id=reference.patient_id,
+                    related_pathway_id=db_assignment.pathway_id,
+                    priority="normal"
+                ) for db_assignment, reference in zip(db_assignments, references)
+            ], commit=False)
+
+            # Capture event payloads before the commit expires the new rows
+            events = [
+                {
+                    "event_type": "step:assigned",
+                    "aggregate_type": "assignment",
+                    "aggregate_id": str(db_assignment.id),
+                    "data": {
+                        "assignment_id": db_assignment.id,
+                        "pathway_id": db_assignment.pathway_id,
+                        "step_id": db_assignment.step_id,
+                        "assigned_to_id": db_assignment.assigned_to_id,
+                        "assigned_by_id": db_assignment.assigned_by_id,
+                        "status": db_assignment.status,
+                        "auto_assigned": request.assigned_to_id is None
+                    }
+                } for db_assignment, request in zip(db_assignments, requests)
+            ]
+
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            conflict = conflict_from_integrity_error(e)
+            if conflict:
+                raise conflict
+            raise e
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        publish_events(db, events)
+
+        return db_assignments
+
+# Create a singleton instance
+assignment_service = AssignmentService()
@@ -0,0 +1,267 @@
+from sqlalchemy import select, insert, update, delete, func, distinct
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, selectinload, joinedload
+import models
+import schemas
+from typing import Optional, List, Dict, Any, Iterable
+import os
+from services.event_bus import publish_event
+from services.scheduler import scheduler
+from services.validation import check_references, commit_or_raise_conflict, ReferenceNotFoundError, ConflictError
+
+# Seconds between full rebuilds of the user -> patient access index
+ACCESS_REBUILD_INTERVAL = int(os.getenv("ACCESS_REBUILD_INTERVAL_SECONDS", "86400"))
+
+
+class CareTeamService:
+    def __init__(self):
+        self.setup_scheduled_jobs()
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("user-patient-access-rebuild", ACCESS_REBUILD_INTERVAL, self.rebuild_access)
+
+    def get_care_team(self, db: Session, care_team_id: int):
+        return db.query(models.CareTeam).options(
+            selectinload(models.CareTeam.members).joinedload(models.CareTeamMember.user),
+            joinedload(models.CareTeam.patient)
+        ).filter(
+            models.CareTeam.id == care_team_id
+        ).first()
+
+    def _access_select(self, patient_id: Optional[int] = None, user_ids: Optional[List[int]] = None):
+        query = select(
+            models.CareTeamMember.user_id,
+            models.CareTeam.patient_id,
+            func.array_agg(distinct(models.CareTeamMember.role))
+        ).join(
+            models.CareTeam, models.CareTeam.id == models.CareTeamMember.care_team_id
+        ).group_by(
+            models.CareTeamMember.user_id,
+            models.CareTeam.patient_id
+        )
+
+        if patient_id is not None:
+            query = query.where(models.CareTeam.patient_id == patient_id)
+
+        if user_ids is not None:
+            query = query.where(models.CareTeamMember.user_id.in_(user_ids))
+
+        return query
+
+    def refresh_access(self, db: Session, patient_id, user_ids: Iterable[int]):
+        """
+        Recompute the access index rows of the given users for one patient.
+        patient_id may be an id or a scalar subquery. Runs in the caller's
+        transaction, after membership changes are flushed.
+        """
+        user_ids = sorted(set(user_ids))
+
+        if not user_ids:
+            return
+
+        access = models.UserPatientAccess
+        db.execute(delete(access).where(
+            access.patient_id == patient_id,
+            access.user_id.in_(user_ids)
+        ))
+        # Upsert in case another team of the same patient refreshed concurrently
+        statement = pg_insert(access).from_select(
+            ["user_id", "patient_id", "roles"],
+            self._access_select(patient_id, user_ids)
+        )
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["user_id", "patient_id"],
+            set_={"roles": statement.excluded.roles, "updated_at": func.now()}
+        ))
+
+    def refresh_access_for_team(self, db: Session, care_team_id: int, user_ids: Iterable[int]):
+        patient_id = select(models.CareTeam.patient_id).where(
+            models.CareTeam.id == care_team_id
+        ).scalar_subquery()
+
+        self.refresh_access(db, patient_id, user_ids)
+
+    def rebuild_access(self, db: Session):
+        """
+        Rebuild the whole access index from care team membership
+        """
+        try:
+            db.execute(delete(models.UserPatientAccess))
+            db.execute(insert(models.UserPatientAccess).from_select(
+                ["user_id", "patient_id", "roles"],
+                self._access_select()
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+    def get_caseload(self, db: Session, user_id: int, pathway_status: Optional[str] = "active"):
+        """
+        Patients the user is on the care team for, with their pathways and
+        current step, from one query driven by the access index
+        """
+        pathway_join = models.PatientPathway.patient_id == models.UserPatientAccess.patient_id
+        if pathway_status:
+            pathway_join = pathway_join & (models.PatientPathway.status == pathway_status)
+
+        rows = db.query(
+            models.UserPatientAccess.patient_id,
+            models.UserPatientAccess.roles,
+            models.Patient.first_name,
+            models.Patient.last_name,
+            models.PatientPathway.id.label("pathway_id"),
+            models.PatientPathway.template_id,
+            models.PathwayTemplate.name.label("template_name"),
+            models.PatientPathway.status,
+            models.PatientPathway.start_date,
+            models.PatientPathway.estimated_end_date,
+            models.PatientPathway.current_step_id,
+            models.PathwayStep.name.label("current_step_name"),
+            models.PatientPathway.steps_completed,
+            models.PatientPathway.total_steps,
+            models.PatientPathway.progress_percent,
+            models.PatientPathway.last_completed_at
+        ).join(
+            models.Patient, models.Patient.id == models.UserPatientAccess.patient_id
+        ).outerjoin(
+            models.PatientPathway, pathway_join
+        ).outerjoin(
+            models.PathwayTemplate, models.PathwayTemplate.id == models.PatientPathway.template_id
+        ).outerjoin(
+            models.PathwayStep, models.PathwayStep.id == models.PatientPathway.current_step_id
+        ).filter(
+            models.UserPatientAccess.user_id == user_id
+        ).order_by(
+            models.Patient.last_name,
+            models.Patient.first_name,
+            models.UserPatientAccess.patient_id,
+            models.PatientPathway.id
+        ).all()
+
+        caseload: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            patient = caseload.setdefault(row.patient_id, {
+                "patient_id": row.patient_id,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "roles": row.roles,
+                "pathways": []
+            })
+
+            if row.pathway_id is not None:
+                patient["pathways"].append({
+                    "pathway_id": row.pathway_id,
+                    "template_id": row.template_id,
+                    "template_name": row.template_name,
+                    "status": row.status,
+                    "start_date": row.start_date,
+                    "estimated_end_date": row.estimated_end_date,
+                    "current_step_id": row.current_step_id,
+                    "current_step_name": row.current_step_name,
+                    "steps_completed": row.steps_completed,
+                    "total_steps": row.total_steps,
+                    "progress_percent": row.progress_percent,
+                    "last_completed_at": row.last_completed_at
+                })
+
+        return list(caseload.values())
+
+    def sync_members(self, db: Session, care_team_id: int, members: List[schemas.CareTeamMemberCreate]):
+        """
+        Make the team's membership match the given list, applying the diff
+        with bulk DELETE/INSERT/UPDATE statements in a single transaction
+        """
+        desired = {member.user_id: member for member in members}
+
+        if len(desired) != len(members):
+            raise ConflictError("Member list contains the same user more than once")
+
+        # Locking the team row serializes concurrent syncs of the same team
+        care_team = db.query(models.CareTeam.id, models.CareTeam.patient_id).filter(
+            models.CareTeam.id == care_team_id
+        ).with_for_update().first()
+
+        if care_team is None:
+            db.rollback()
+            raise ReferenceNotFoundError("Care team not found")
+
+        try:
+            check_references(db, {"User": (models.User, list(desired))})
+        except ReferenceNotFoundError:
+            db.rollback()
+            raise
+
+        current = db.query(
+            models.CareTeamMember.id,
+            models.CareTeamMember.user_id,
+            models.CareTeamMember.role,
+            models.CareTeamMember.is_primary
+        ).filter(
+            models.CareTeamMember.care_team_id == care_team_id
+        ).all()
+        current_by_user = {row.user_id: row for row in current}
+
+        removed = [row for row in current if row.user_id not in desired]
+        added = [member for user_id, member in desired.items() if user_id not in current_by_user]
+        changed = [
+            (current_by_user[user_id], member) for user_id, member in desired.items()
+            if user_id in current_by_user and (
+                current_by_user[user_id].role != member.role or
+                current_by_user[user_id].is_primary != member.is_primary
+            )
+        ]
+
+        try:
+            if removed:
+                db.execute(
+                    delete(models.CareTeamMember).where(models.CareTeamMember.id.in_([row.id for row in removed])),
+                    execution_options={"synchronize_session": False}
+                )
+
+            if added:
+                db.execute(insert(models.CareTeamMember), [
+                    {
+                        "care_team_id": care_team_id,
+                        "user_id": member.user_id,
+                        "role": member.role,
+                        "is_primary": member.is_primary
+                    } for member in added
+                ])
+
+            if changed:
+                # ORM bulk UPDATE by primary key: one executemany for all rows
+                db.execute(update(models.CareTeamMember), [
+                    {"id": row.id, "role": member.role, "is_primary": member.is_primary}
+                    for row, member in changed
+                ])
+
+            self.refresh_access(
+                db,
+                care_team.patient_id,
+                [row.user_id for row in removed] + [member.user_id for member in added] + [row.user_id for row, _ in changed]
+            )
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        commit_or_raise_conflict(db)
+
+        if removed or added or changed:
+            publish_event(db, {
+                "event_type": "care_team:members:synced",
+                "aggregate_type": "care_team",
+                "aggregate_id": str(care_team_id),
+                "data": {
+                    "care_team_id": care_team_id,
+                    "patient_id": care_team.patient_id,
+                    "added_user_ids": [member.user_id for member in added],
+                    "removed_user_ids": [row.user_id for row in removed],
+                    "updated_user_ids": [row.user_id for row, _ in changed]
+                }
+            })
+
+        return self.get_care_team(db, care_team_id)
+
+# Create a singleton instance
+care_team_service = CareTeamService()
@@ -0,0 +1,381 @@
+from sqlalchemy import update, or_, case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+import models
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any
+import os
+import time
+from services.event_bus import publish_event
+from services.integration_worker import integration_worker, RetryableError, backoff_delay
+from services.scheduler import scheduler
+from services.transformation_engine import transformation_engine
+from services.validation import check_references
+
+EHR_SYNC_INTERVAL = int(os.getenv("EHR_SYNC_INTERVAL_SECONDS", "300"))
+# Seconds between checks for syncs queued through the API
+EHR_SYNC_QUEUE_POLL_INTERVAL = float(os.getenv("EHR_SYNC_QUEUE_POLL_INTERVAL_SECONDS", "5"))
+EHR_SYNC_PAGE_SIZE = int(os.getenv("EHR_SYNC_PAGE_SIZE", "500"))
+# A running sync without a heartbeat for this long is taken over and resumed
+EHR_SYNC_STALE_SECONDS = int(os.getenv("EHR_SYNC_STALE_SECONDS", "600"))
+
+PATIENT_RESOURCE = "patients"
+
+# EHR operation returning {"patients": [...], "next_cursor": ...} for a
+# payload of {"since", "cursor", "limit"}; records carry WATERMARK_FIELD
+LIST_PATIENTS_OPERATION = "listPatients"
+WATERMARK_FIELD = "lastUpdated"
+
+# Used when the config has no listPatients mapping
+DEFAULT_PATIENT_MAPPING = {
+    "external_id": "externalId",
+    "first_name": "demographics.firstName",
+    "last_name": "demographics.lastName",
+    "date_of_birth": "demographics.dateOfBirth",
+    "gender": "demographics.gender",
+    "contact_phone": "contact.phone",
+    "contact_email": "contact.email",
+    "address": "contact.address",
+}
+
+PATIENT_COLUMNS = (
+    "external_id", "first_name", "last_name", "date_of_birth",
+    "gender", "contact_phone", "contact_email", "address"
+)
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class EHRPatientSync:
+    """
+    Incremental patient roster sync per IntegrationConfig.
+
+    Each run asks the EHR for patients changed since the stored watermark,
+    page by page, maps every page through the config's listPatients mapping
+    and upserts it into patients by external_id with one statement. The page
+    cursor is checkpointed in the same transaction as the upsert, so a
+    crashed or failed run resumes after the last committed page. The
+    watermark only advances once a run has read every page.
+
+    Runs happen on the scheduler: periodically for configs with
+    sync_patients, and on request for configs whose sync was queued.
+    """
+
+    def __init__(self):
+        self._default_mapping = transformation_engine.compile_mapping(DEFAULT_PATIENT_MAPPING, {})
+        self.setup_scheduled_jobs()
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("ehr-patient-sync", EHR_SYNC_INTERVAL, self.sync_all)
+        scheduler.register("ehr-patient-sync-queue", EHR_SYNC_QUEUE_POLL_INTERVAL, self.sync_queued)
+
+    def sync_all(self, db: Session):
+        config_ids = [
+            config_id for (config_id,) in db.query(models.IntegrationConfig.id).filter(
+                models.IntegrationConfig.enabled.is_(True),
+                models.IntegrationConfig.sync_patients.is_(True)
+            ).order_by(models.IntegrationConfig.id)
+        ]
+
+        for config_id in config_ids:
+            try:
+                self.sync(db, config_id)
+            except Exception as e:
+                print(f"Error syncing patients from integration config {config_id}: {e}")
+
+    def sync_queued(self, db: Session):
+        config_ids = [
+            config_id for (config_id,) in db.query(models.IntegrationSyncState.config_id).filter(
+                models.IntegrationSyncState.resource == PATIENT_RESOURCE,
+                models.IntegrationSyncState.status == "queued"
+            ).order_by(models.IntegrationSyncState.config_id)
+        ]
+
+        for config_id in config_ids:
+            try:
+                self.sync(db, config_id)
+            except Exception as e:
+                print(f"Error syncing patients from integration config {config_id}: {e}")
+
+    def enqueue(self, db: Session, config_id: int, now: Optional[datetime] = None):
+        """
+        Queue a sync of the config for the scheduler. Returns the state, or
+        None when a run is already in progress.
+        """
+        check_references(db, {"Integration config": (models.IntegrationConfig, config_id)})
+
+        now = now or datetime.now(timezone.utc)
+        state = models.IntegrationSyncState
+
+        try:
+            db.execute(pg_insert(state).values(
+                config_id=config_id,
+                resource=PATIENT_RESOURCE,
+                status="idle",
+                pages=0,
+                records_synced=0,
+                records_failed=0
+            ).on_conflict_do_nothing())
+
+            queued = db.execute(
+                update(state).where(
+                    state.config_id == config_id,
+                    state.resource == PATIENT_RESOURCE,
+                    or_(
+                        state.status != "running",
+                        state.heartbeat_at < now - timedelta(seconds=EHR_SYNC_STALE_SECONDS)
+                    )
+                ).values(status="queued", last_error=None).returning(state.config_id),
+                execution_options={"synchronize_session": False}
+            ).first()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        if queued is None:
+            return None
+
+        return self.get_state(db, config_id)
+
+    def load_config(self, db: Session, config_id: int) -> Dict[str, Any]:
+        config = models.IntegrationConfig
+        row = db.query(
+            config.id,
+            config.endpoint,
+            config.auth_type,
+            config.auth_config,
+            config.rate_limit_per_second,
+            config.max_concurrency,
+            config.timeout_seconds,
+            config.max_attempts,
+            config.mappings,
+            config.transformations,
+            config.updated_at
+        ).filter(config.id == config_id).first()
+
+        if row is None:
+            raise ValueError(f"Integration config {config_id} not found")
+
+        return dict(row._mapping)
+
+    def get_state(self, db: Session, config_id: int):
+        return db.query(models.IntegrationSyncState).filter(
+            models.IntegrationSyncState.config_id == config_id,
+            models.IntegrationSyncState.resource == PATIENT_RESOURCE
+        ).first()
+
+    def claim(self, db: Session, config_id: int, now: datetime):
+        """
+        Mark the config's sync as running unless another live run holds it.
+        Returns the state row, or None when the sync is already running.
+        """
+        state = models.IntegrationSyncState
+
+        try:
+            db.execute(pg_insert(state).values(
+                config_id=config_id,
+                resource=PATIENT_RESOURCE,
+                status="idle",
+                pages=0,
+                records_synced=0,
+                records_failed=0
+            ).on_conflict_do_nothing())
+
+            fresh_run = state.cursor.is_(None)
+            claimed = db.execute(
+                update(state).where(
+                    state.config_id == config_id,
+                    state.resource == PATIENT_RESOURCE,
+                    or_(
+                        state.status != "running",
+                        state.heartbeat_at < now - timedelta(seconds=EHR_SYNC_STALE_SECONDS)
+                    )
+                ).values(
+                    status="running",
+                    heartbeat_at=now,
+                    last_error=None,
+                    # A new run starts from the watermark; a resumed one keeps its checkpoint
+                    started_at=case((fresh_run, now), else_=state.started_at),
+                    run_since=case((fresh_run, state.watermark), else_=state.run_since),
+                    run_watermark=case((fresh_run, state.watermark), else_=state.run_watermark),
+                    pages=case((fresh_run, 0), else_=state.pages),
+                    records_synced=case((fresh_run, 0), else_=state.records_synced),
+                    records_failed=case((fresh_run, 0), else_=state.records_failed)
+                ).returning(state.config_id),
+                execution_options={"synchronize_session": False}
+            ).first()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        if claimed is None:
+            return None
+
+        return self.get_state(db, config_id)
+
+    def fetch_page(self, config: Dict[str, Any], since: Optional[datetime], cursor: Optional[str]):
+        payload = {
+            "since": since.isoformat() if since else None,
+            "cursor": cursor,
+            "limit": EHR_SYNC_PAGE_SIZE
+        }
+
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                return integration_worker.call(config, LIST_PATIENTS_OPERATION, payload)
+            except RetryableError as e:
+                if attempts >= config["max_attempts"]:
+                    raise
+                time.sleep(backoff_delay(attempts, e.retry_after))
+
+    def prepare(self, config: Dict[str, Any], records: List[Dict[str, Any]]):
+        """
+        Map a page of EHR records to patient rows. Returns the rows keyed by
+        external_id, the number of unusable records and the newest change time.
+        """
+        pipeline = transformation_engine.get_pipeline(config, LIST_PATIENTS_OPERATION) or self._default_mapping
+        rows: Dict[str, Dict[str, Any]] = {}
+        failed = 0
+        newest: Optional[datetime] = None
+
+        for record in records:
+            changed_at = parse_timestamp(record.get(WATERMARK_FIELD)) if isinstance(record, dict) else None
+            if changed_at and (newest is None or changed_at > newest):
+                newest = changed_at
+
+            try:
+                mapped = pipeline(record)
+                row = {column: mapped.get(column) for column in PATIENT_COLUMNS}
+                row["external_id"] = str(row["external_id"]) if row["external_id"] is not None else None
+                row["date_of_birth"] = datetime.fromisoformat(str(row["date_of_birth"])[:10])
+            except Exception:
+                failed += 1
+                continue
+
+            if not row["external_id"] or not row["first_name"] or not row["last_name"]:
+                failed += 1
+                continue
+
+            # A record repeated within a page keeps its latest version
+            rows[row["external_id"]] = row
+
+        return rows, failed, newest
+
+    def upsert_patients(self, db: Session, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+
+        table = models.Patient.__table__
+        statement = pg_insert(table).values(rows)
+        changed = [column for column in PATIENT_COLUMNS if column != "external_id"]
+
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["external_id"],
+            set_={
+                **{column: statement.excluded[column] for column in changed},
+                "updated_at": func.now()
+            },
+            # Leave unchanged patients (and their updated_at) alone
+            where=or_(*[table.c[column].is_distinct_from(statement.excluded[column]) for column in changed])
+        ))
+
+    def sync(self, db: Session, config_id: int):
+        """
+        Run or resume the patient sync of one config. Returns the final state,
+        or None if another run of the same config is in progress.
+        """
+        config = self.load_config(db, config_id)
+        state = self.claim(db, config_id, datetime.now(timezone.utc))
+
+        if state is None:
+            return None
+
+        since = state.run_since
+        cursor = state.cursor
+        run_watermark = state.run_watermark
+
+        try:
+            while True:
+                page = self.fetch_page(config, since, cursor)
+                rows, failed, newest = self.prepare(config, page.get("patients") or [])
+
+                if newest and (run_watermark is None or newest > run_watermark):
+                    run_watermark = newest
+                cursor = page.get("next_cursor")
+
+                self.upsert_patients(db, list(rows.values()))
+
+                # Checkpoint in the same transaction as the page's upsert
+                values = {
+                    "cursor": cursor,
+                    "run_watermark": run_watermark,
+                    "pages": models.IntegrationSyncState.pages + 1,
+                    "records_synced": models.IntegrationSyncState.records_synced + len(rows),
+                    "records_failed": models.IntegrationSyncState.records_failed + failed,
+                    "heartbeat_at": datetime.now(timezone.utc)
+                }
+
+                if not cursor:
+                    values.update(
+                        status="idle",
+                        watermark=run_watermark,
+                        run_since=None,
+                        completed_at=datetime.now(timezone.utc)
+                    )
+
+                db.execute(
+                    update(models.IntegrationSyncState).where(
+                        models.IntegrationSyncState.config_id == config_id,
+                        models.IntegrationSyncState.resource == PATIENT_RESOURCE
+                    ).values(**values),
+                    execution_options={"synchronize_session": False}
+                )
+                db.commit()
+
+                if not cursor:
+                    break
+        except Exception as e:
+            db.rollback()
+            db.execute(
+                update(models.IntegrationSyncState).where(
+                    models.IntegrationSyncState.config_id == config_id,
+                    models.IntegrationSyncState.resource == PATIENT_RESOURCE
+                ).values(status="failed", last_error=str(e)),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+            raise e
+
+        state = self.get_state(db, config_id)
+
+        publish_event(db, {
+            "event_type": "integration:patients:synced",
+            "aggregate_type": "integration_config",
+            "aggregate_id": str(config_id),
+            "data": {
+                "config_id": config_id,
+                "pages": state.pages,
+                "records_synced": state.records_synced,
+                "records_failed": state.records_failed,
+                "watermark": state.watermark.isoformat() if state.watermark else None
+            }
+        })
+
+        return state
+
+# Create a singleton instance
+ehr_patient_sync = EHRPatientSync()
@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 import models
 from typing import Dict, Any, Callable, List
 import json
+from services.profiling import span
 
 # Event handlers registry
 event_handlers: Dict[str, List[Callable]] = {}
@@ -16,23 +17,56 @@ def publish_event(db: Session, event_data: Dict[str, Any]):
         aggregate_type=event_data["aggregate_type"],
         aggregate_id=event_data["aggregate_id"],
         data=event_data["data"],
-        metadata=event_data.get("metadata", {})
+        event_metadata=event_data.get("metadata", {})
     )
     
-    db.add(event)
-    db.commit()
-    db.refresh(event)
+    with span("event_bus.commit", "db", event_type=event_data["event_type"]):
+        db.add(event)
+        db.commit()
+        db.refresh(event)
     
     # Execute handlers
     handlers = event_handlers.get(event_data["event_type"], [])
     for handler in handlers:
         try:
-            handler(event)
+            with span(handler_name(handler), "handler", event_type=event_data["event_type"]):
+                handler(event)
         except Exception as e:
             print(f"Error in event handler for {event_data['event_type']}: {e}")
     
     return event
 
+def publish_events(db: Session, events_data: List[Dict[str, Any]]):
+    """
+    Publish several events with a single commit, then run their handlers in order
+    """
+    events = [
+        models.Event(
+            event_type=event_data["event_type"],
+            aggregate_type=event_data["aggregate_type"],
+            aggregate_id=event_data["aggregate_id"],
+            data=event_data["data"],
+            event_metadata=event_data.get("metadata", {})
+        ) for event_data in events_data
+    ]
+    
+    with span("event_bus.commit", "db", events=len(events)):
+        db.add_all(events)
+        db.commit()
+    
+    for event in events:
+        for handler in event_handlers.get(event.event_type, []):
+            try:
+                with span(handler_name(handler), "handler", event_type=event.event_type):
+                    handler(event)
+            except Exception as e:
+                print(f"Error in event handler for {event.event_type}: {e}")
+    
+    return events
+
+def handler_name(handler: Callable) -> str:
+    return getattr(handler, "__qualname__", None) or repr(handler)
+
 def subscribe_to_event(event_type: str, handler: Callable):
     """
     Subscribe to an event type
@@ -55,4 +89,4 @@ def get_events_for_aggregate(db: Session, aggregate_type: str, aggregate_id: str
     return db.query(models.Event).filter(
         models.Event.aggregate_type == aggregate_type,
         models.Event.aggregate_id == aggregate_id
-    ).order_by(models.Event.created_at.asc()).all()
+    ).order_by(models.Event.created_at.asc(), models.Event.id.asc()).all()
@@ -0,0 +1,232 @@
+from sqlalchemy import tuple_, select, func, cast, String
+from sqlalchemy.orm import Session
+import models
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Iterable
+import copy
+import os
+from services.scheduler import scheduler
+
+# Number of events folded past the latest snapshot before a new snapshot is written
+SNAPSHOT_INTERVAL = int(os.getenv("PATHWAY_SNAPSHOT_INTERVAL", "100"))
+# Snapshots only fold events at least this old. Events get created_at at the
+# start of their transaction, so one committing late can land behind newer
+# events; a snapshot past it would make later replays skip it.
+SNAPSHOT_LAG = int(os.getenv("PATHWAY_SNAPSHOT_LAG_SECONDS", "300"))
+SNAPSHOT_JOB_INTERVAL = int(os.getenv("PATHWAY_SNAPSHOT_JOB_INTERVAL_SECONDS", "600"))
+# Pathways snapshotted per job run
+SNAPSHOT_JOB_BATCH = int(os.getenv("PATHWAY_SNAPSHOT_JOB_BATCH", "500"))
+
+
+def empty_state(pathway_id: int) -> Dict[str, Any]:
+    return {
+        "pathway_id": pathway_id,
+        "patient_id": None,
+        "template_id": None,
+        "status": None,
+        "current_step_id": None,
+        "completed_steps": [],
+        "started_at": None,
+        "completed_at": None,
+        "event_count": 0,
+        "last_event_id": None,
+        "last_event_at": None
+    }
+
+
+def _apply_initialized(state: Dict[str, Any], data: Dict[str, Any], occurred_at: str):
+    state["patient_id"] = data.get("patient_id")
+    state["template_id"] = data.get("template_id")
+    state["current_step_id"] = data.get("current_step_id")
+    state["status"] = "active"
+    state["started_at"] = occurred_at
+
+
+def _apply_step_completed(state: Dict[str, Any], data: Dict[str, Any], occurred_at: str):
+    state["completed_steps"].append({
+        "step_id": data.get("step_id"),
+        "completed_by_id": data.get("completed_by_id"),
+        "completed_at": occurred_at
+    })
+    state["current_step_id"] = data.get("next_step_id")
+
+
+def _apply_completed(state: Dict[str, Any], data: Dict[str, Any], occurred_at: str):
+    state["status"] = "completed"
+    state["current_step_id"] = None
+    state["completed_at"] = occurred_at
+
+
+# Event type -> function folding that event's data into the pathway state
+EVENT_APPLIERS = {
+    "pathway:initialized": _apply_initialized,
+    "pathway:step:completed": _apply_step_completed,
+    "pathway:completed": _apply_completed,
+}
+
+
+def apply_event(state: Dict[str, Any], event) -> Dict[str, Any]:
+    """
+    Fold a single event into the state in place. Unknown event types only
+    advance the stream position.
+    """
+    occurred_at = event.created_at.isoformat() if event.created_at else None
+    applier = EVENT_APPLIERS.get(event.event_type)
+
+    if applier:
+        applier(state, event.data or {}, occurred_at)
+
+    state["event_count"] += 1
+    state["last_event_id"] = event.id
+    state["last_event_at"] = occurred_at
+
+    return state
+
+
+def replay(pathway_id: int, events: Iterable, state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fold an ordered event stream into a pathway state, optionally starting
+    from a previously captured state
+    """
+    state = copy.deepcopy(state) if state is not None else empty_state(pathway_id)
+
+    for event in events:
+        apply_event(state, event)
+
+    return state
+
+
+class PathwayReplayEngine:
+    """
+    Rebuilds pathway state from events. Reads never write: snapshots are
+    taken by the scheduled job (or take_snapshot) for pathways with at least
+    snapshot_interval settled events past their latest snapshot.
+    """
+
+    def __init__(self, snapshot_interval: int = SNAPSHOT_INTERVAL, snapshot_lag: int = SNAPSHOT_LAG):
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_lag = snapshot_lag
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("pathway-snapshots", SNAPSHOT_JOB_INTERVAL, self.snapshot_due)
+
+    def get_latest_snapshot(self, db: Session, pathway_id: int, as_of: Optional[datetime] = None):
+        query = db.query(models.PathwaySnapshot).filter(
+            models.PathwaySnapshot.pathway_id == pathway_id
+        )
+
+        if as_of:
+            query = query.filter(models.PathwaySnapshot.last_event_at <= as_of)
+
+        return query.order_by(
+            models.PathwaySnapshot.last_event_at.desc(),
+            models.PathwaySnapshot.last_event_id.desc()
+        ).first()
+
+    def get_events_after(self, db: Session, pathway_id: int, snapshot=None, as_of: Optional[datetime] = None):
+        query = db.query(models.Event).filter(
+            models.Event.aggregate_type == "pathway",
+            models.Event.aggregate_id == str(pathway_id)
+        )
+
+        # Resume strictly after the snapshot position using the (created_at, id) keyset
+        if snapshot:
+            query = query.filter(
+                tuple_(models.Event.created_at, models.Event.id) >
+                tuple_(snapshot.last_event_at, snapshot.last_event_id)
+            )
+
+        if as_of:
+            query = query.filter(models.Event.created_at <= as_of)
+
+        return query.order_by(models.Event.created_at.asc(), models.Event.id.asc()).all()
+
+    def get_state(self, db: Session, pathway_id: int, as_of: Optional[datetime] = None):
+        """
+        Rebuild the pathway state from its event stream, as of a point in time
+        when given. Returns None if the pathway has no events by then.
+        """
+        snapshot = self.get_latest_snapshot(db, pathway_id, as_of)
+        events = self.get_events_after(db, pathway_id, snapshot, as_of)
+
+        if snapshot is None and not events:
+            return None
+
+        return replay(pathway_id, events, snapshot.state if snapshot else None)
+
+    def save_snapshot(self, db: Session, state: Dict[str, Any]):
+        snapshot = models.PathwaySnapshot(
+            pathway_id=state["pathway_id"],
+            last_event_id=state["last_event_id"],
+            last_event_at=datetime.fromisoformat(state["last_event_at"]),
+            event_count=state["event_count"],
+            state=state
+        )
+
+        db.add(snapshot)
+        db.commit()
+
+        return snapshot
+
+    def take_snapshot(self, db: Session, pathway_id: int):
+        """
+        Capture the state of a pathway up to the snapshot lag, regardless of the interval
+        """
+        settled = datetime.now(timezone.utc) - timedelta(seconds=self.snapshot_lag)
+        snapshot = self.get_latest_snapshot(db, pathway_id)
+        events = self.get_events_after(db, pathway_id, snapshot, settled)
+
+        if not events:
+            return snapshot
+
+        state = replay(pathway_id, events, snapshot.state if snapshot else None)
+
+        return self.save_snapshot(db, state)
+
+    def due_pathway_ids(self, db: Session, limit: int = SNAPSHOT_JOB_BATCH) -> List[int]:
+        """
+        Pathways with at least snapshot_interval settled events past their latest snapshot
+        """
+        settled = datetime.now(timezone.utc) - timedelta(seconds=self.snapshot_lag)
+        event = models.Event
+        snapshot = models.PathwaySnapshot
+
+        latest = select(
+            cast(snapshot.pathway_id, String).label("aggregate_id"),
+            snapshot.last_event_at,
+            snapshot.last_event_id
+        ).distinct(snapshot.pathway_id).order_by(
+            snapshot.pathway_id, snapshot.last_event_at.desc(), snapshot.last_event_id.desc()
+        ).subquery()
+
+        rows = db.execute(
+            select(event.aggregate_id).outerjoin(
+                latest, latest.c.aggregate_id == event.aggregate_id
+            ).where(
+                event.aggregate_type == "pathway",
+                event.created_at <= settled,
+                latest.c.last_event_id.is_(None) | (
+                    tuple_(event.created_at, event.id) > tuple_(latest.c.last_event_at, latest.c.last_event_id)
+                )
+            ).group_by(event.aggregate_id).having(
+                func.count() >= self.snapshot_interval
+            ).limit(limit)
+        ).all()
+
+        return [int(aggregate_id) for (aggregate_id,) in rows]
+
+    def snapshot_due(self, db: Session):
+        snapshots = 0
+        for pathway_id in self.due_pathway_ids(db):
+            try:
+                self.take_snapshot(db, pathway_id)
+                snapshots += 1
+            except Exception as e:
+                db.rollback()
+                print(f"Error snapshotting pathway {pathway_id}: {e}")
+
+        return snapshots
+
+# Create a singleton instance
+pathway_replay = PathwayReplayEngine()
+pathway_replay.setup_scheduled_jobs()
@@ -0,0 +1,206 @@
+from sqlalchemy import select, DateTime, Date, Numeric
+from sqlalchemy.orm import Session
+import models
+from database import SessionLocal
+from datetime import datetime
+from typing import Optional, List, Any, Iterator, Tuple, Callable
+import csv
+import io
+import json
+import os
+
+# Rows fetched from the server-side cursor at a time
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+# Rows encoded into each chunk written to the response
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "500"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _pathway_rows(template_id: Optional[int], status: Optional[str],
+                  date_from: Optional[datetime], date_to: Optional[datetime]):
+    pathway = models.PatientPathway
+
+    statement = select(
+        pathway.id,
+        pathway.patient_id,
+        pathway.template_id,
+        models.PathwayTemplate.name.label("template_name"),
+        pathway.status,
+        pathway.current_step_id,
+        pathway.start_date,
+        pathway.estimated_end_date,
+        pathway.actual_end_date,
+        pathway.created_by,
+        pathway.steps_completed,
+        pathway.total_steps,
+        pathway.progress_percent,
+        pathway.last_completed_at
+    ).join(
+        models.PathwayTemplate, models.PathwayTemplate.id == pathway.template_id
+    )
+
+    # The date range applies to when the pathway started
+    return _filtered(statement, template_id, status, pathway.start_date, date_from, date_to).order_by(pathway.id)
+
+
+def _completed_step_rows(template_id: Optional[int], status: Optional[str],
+                         date_from: Optional[datetime], date_to: Optional[datetime]):
+    completed = models.CompletedStep
+
+    statement = select(
+        completed.id,
+        completed.pathway_id,
+        models.PatientPathway.patient_id,
+        models.PatientPathway.template_id,
+        models.PatientPathway.status.label("pathway_status"),
+        completed.step_id,
+        models.PathwayStep.name.label("step_name"),
+        models.PathwayStep.step_order,
+        completed.completed_by,
+        completed.completed_at,
+        completed.notes
+    ).join(
+        models.PatientPathway, models.PatientPathway.id == completed.pathway_id
+    ).join(
+        models.PathwayStep, models.PathwayStep.id == completed.step_id
+    )
+
+    # Template and status filter the owning pathway; the date range applies to the completion
+    return _filtered(
+        statement, template_id, status, completed.completed_at, date_from, date_to
+    ).order_by(completed.id)
+
+
+def _filtered(statement, template_id, status, date_column, date_from, date_to):
+    if template_id is not None:
+        statement = statement.where(models.PatientPathway.template_id == template_id)
+    if status:
+        statement = statement.where(models.PatientPathway.status == status)
+    if date_from is not None:
+        statement = statement.where(date_column >= date_from)
+    if date_to is not None:
+        statement = statement.where(date_column < date_to)
+    return statement
+
+
+# Dataset -> function building its ordered select from the filters
+EXPORT_DATASETS = {
+    "pathways": _pathway_rows,
+    "completed_steps": _completed_step_rows,
+}
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+class ExportService:
+    """
+    Streams flat exports of pathways and completed steps.
+
+    Rows come from a server-side cursor (yield_per), are encoded in small
+    chunks and handed to the response as they are produced, so memory stays
+    constant however many rows match.
+    """
+
+    def iter_rows(self, db: Session, dataset: str, template_id: Optional[int] = None,
+                  status: Optional[str] = None, date_from: Optional[datetime] = None,
+                  date_to: Optional[datetime] = None) -> Iterator[Tuple]:
+        statement = EXPORT_DATASETS[dataset](template_id, status, date_from, date_to)
+        # Plain column tuples from the connection skip ORM row processing;
+        # yield_per turns on a server-side cursor. It is passed per statement
+        # because Connection.execution_options() changes the session's
+        # connection in place, so later queries on it would stream too.
+        result = db.connection().execute(statement, execution_options={"yield_per": EXPORT_YIELD_PER})
+
+        try:
+            for row in result:
+                yield row
+        finally:
+            result.close()
+
+    def columns(self, dataset: str) -> List[Tuple[str, Optional[Callable[[Any], Any]]]]:
+        """
+        (name, converter) per exported column; converters turn dates and
+        decimals into JSON and CSV friendly values
+        """
+        statement = EXPORT_DATASETS[dataset](None, None, None, None)
+        columns = []
+        for column in statement.selected_columns:
+            converter = None
+            if isinstance(column.type, (DateTime, Date)):
+                converter = _isoformat
+            elif isinstance(column.type, Numeric) and column.type.asdecimal:
+                converter = float
+            columns.append((column.name, converter))
+        return columns
+
+    def validate(self, dataset: str, export_format: str):
+        if dataset not in EXPORT_DATASETS:
+            raise ValueError(f"Unknown export dataset {dataset}; expected one of {', '.join(EXPORT_DATASETS)}")
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {export_format}; expected one of {', '.join(EXPORT_FORMATS)}")
+
+    def encode(self, rows: Iterator[Tuple], columns: List[Tuple[str, Optional[Callable[[Any], Any]]]],
+               export_format: str) -> Iterator[str]:
+        """
+        Encode rows as NDJSON lines or CSV (with a header row), a chunk of rows at a time
+        """
+        names = [name for name, _ in columns]
+        converters = [(index, converter) for index, (_, converter) in enumerate(columns) if converter]
+        buffer = io.StringIO()
+        writer = None
+
+        if export_format == "csv":
+            writer = csv.writer(buffer)
+            writer.writerow(names)
+
+        pending = 0
+        for row in rows:
+            values = list(row)
+            for index, converter in converters:
+                if values[index] is not None:
+                    values[index] = converter(values[index])
+
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(names, values))))
+                buffer.write("\n")
+
+            pending += 1
+            if pending >= EXPORT_CHUNK_ROWS:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def stream(self, dataset: str, export_format: str, template_id: Optional[int] = None,
+               status: Optional[str] = None, date_from: Optional[datetime] = None,
+               date_to: Optional[datetime] = None) -> Iterator[str]:
+        """
+        Encoded export chunks. The generator owns its session because it keeps
+        running after the endpoint has returned the response.
+        """
+        self.validate(dataset, export_format)
+        columns = self.columns(dataset)
+
+        def generate():
+            db = SessionLocal()
+            try:
+                rows = self.iter_rows(db, dataset, template_id, status, date_from, date_to)
+                yield from self.encode(rows, columns, export_format)
+            finally:
+                db.close()
+
+        return generate()
+
+# Create a singleton instance
+export_service = ExportService()
@@ -0,0 +1,309 @@
+from sqlalchemy import select, extract, func, and_
+from sqlalchemy.orm import Session, object_session
+import models
+from models import CLOSED_ASSIGNMENT_STATUSES
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+import numpy as np
+import os
+import threading
+import time
+from services.event_bus import subscribe_to_event
+
+SECONDS_PER_DAY = 86400.0
+
+# Maximum number of pathway vectors kept in memory
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "50000"))
+# Seconds a cached vector is trusted. Events only reach the process that
+# published them, so this bounds how stale a vector can be after a change
+# made through another API worker.
+FEATURE_CACHE_TTL = float(os.getenv("FEATURE_CACHE_TTL_SECONDS", "60"))
+
+# Cached per-pathway state. Timestamps are epoch seconds so the derived
+# time-relative features can be computed at read time.
+RAW_COLUMNS = (
+    "active",
+    "start_ts",
+    "last_progress_ts",
+    "total_steps",
+    "completed_steps",
+    "elapsed_days",
+    "estimated_days",
+    "max_overrun",
+    "open_assignments",
+    "overdue_assignments",
+)
+RAW = {name: index for index, name in enumerate(RAW_COLUMNS)}
+
+# Model-facing features derived from the raw vectors
+FEATURE_NAMES = (
+    "active",
+    "progress",
+    "completed_steps",
+    "remaining_steps",
+    "days_active",
+    "days_since_progress",
+    "overrun_ratio",
+    "max_overrun",
+    "open_assignments",
+    "overdue_assignments",
+)
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    if value is None:
+        return np.nan
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class FeatureStore:
+    """
+    Per-pathway feature vectors for insight scoring. Vectors are built with
+    set-based queries on a cache miss, kept in an LRU cache and updated in
+    place from step completion events; other changes evict the entry.
+    Entries expire after ttl seconds so changes made in other processes,
+    whose events this process never sees, are picked up.
+    """
+
+    def __init__(self, capacity: int = FEATURE_CACHE_SIZE, ttl: float = FEATURE_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        # pathway_id -> (monotonic time loaded, raw vector)
+        self._cache: "OrderedDict[int, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.setup_event_listeners()
+
+    def setup_event_listeners(self):
+        subscribe_to_event("pathway:step:completed", self.handle_step_completed)
+        subscribe_to_event("pathway:status:changed", self.handle_pathway_changed)
+        subscribe_to_event("step:assigned", self.handle_pathway_changed)
+        subscribe_to_event("assignment:status:changed", self.handle_pathway_changed)
+        subscribe_to_event("assignment:deleted", self.handle_pathway_changed)
+        subscribe_to_event("assignment:overdue:cleared", self.handle_pathway_changed)
+        subscribe_to_event("assignments:overdue", self.handle_assignments_overdue)
+
+    def handle_step_completed(self, event):
+        with self._lock:
+            entry = self._cache.get(event.data.get("pathway_id"))
+            if entry is None:
+                return
+            loaded_at, vector = entry
+            vector = vector.copy()
+
+        estimate = object_session(event).query(models.PathwayStep.estimated_duration).filter(
+            models.PathwayStep.id == event.data.get("step_id")
+        ).scalar()
+
+        completed_ts = _epoch(event.created_at)
+        previous_ts = vector[RAW["last_progress_ts"]]
+        if np.isnan(previous_ts):
+            previous_ts = vector[RAW["start_ts"]]
+        duration = max(completed_ts - previous_ts, 0.0) / SECONDS_PER_DAY
+
+        vector[RAW["completed_steps"]] += 1
+        vector[RAW["elapsed_days"]] += duration
+        vector[RAW["last_progress_ts"]] = completed_ts
+
+        if estimate:
+            vector[RAW["estimated_days"]] += estimate
+            vector[RAW["max_overrun"]] = max(vector[RAW["max_overrun"]], duration / estimate)
+
+        if event.data.get("next_step_id") is None:
+            vector[RAW["active"]] = 0.0
+
+        # The update does not make the rest of the vector any fresher
+        self._put({event.data["pathway_id"]: vector}, replace_only=True, loaded_at=loaded_at)
+
+    def handle_pathway_changed(self, event):
+        self.invalidate([event.data.get("pathway_id")])
+
+    def handle_assignments_overdue(self, event):
+        self.invalidate(event.data.get("pathway_ids", []))
+
+    def invalidate(self, pathway_ids: Iterable[Optional[int]]):
+        with self._lock:
+            for pathway_id in pathway_ids:
+                self._cache.pop(pathway_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _put(self, vectors: Dict[int, np.ndarray], replace_only: bool = False, loaded_at: Optional[float] = None):
+        loaded_at = time.monotonic() if loaded_at is None else loaded_at
+
+        with self._lock:
+            for pathway_id, vector in vectors.items():
+                if replace_only and pathway_id not in self._cache:
+                    continue
+                self._cache[pathway_id] = (loaded_at, vector)
+                self._cache.move_to_end(pathway_id)
+
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+
+    def get_raw(self, db: Session, pathway_ids: List[int]) -> np.ndarray:
+        """
+        Raw vectors of the given pathways as a (len(pathway_ids), RAW_COLUMNS)
+        matrix. Unknown pathways and None ids get rows of NaN.
+        """
+        matrix = np.full((len(pathway_ids), len(RAW_COLUMNS)), np.nan)
+        missing = []
+        expired_before = time.monotonic() - self.ttl
+
+        with self._lock:
+            for row, pathway_id in enumerate(pathway_ids):
+                entry = self._cache.get(pathway_id)
+                if entry is None or entry[0] <= expired_before:
+                    if pathway_id is not None:
+                        missing.append(pathway_id)
+                else:
+                    self._cache.move_to_end(pathway_id)
+                    matrix[row] = entry[1]
+
+        if missing:
+            loaded = self.load(db, sorted(set(missing)))
+            self._put(loaded)
+
+            for row, pathway_id in enumerate(pathway_ids):
+                if pathway_id in loaded:
+                    matrix[row] = loaded[pathway_id]
+
+        return matrix
+
+    def get_features(self, db: Session, pathway_ids: List[int], now: Optional[datetime] = None) -> np.ndarray:
+        return self.derive(self.get_raw(db, pathway_ids), now)
+
+    def derive(self, raw: np.ndarray, now: Optional[datetime] = None) -> np.ndarray:
+        """
+        Compute FEATURE_NAMES columns from raw vectors, for all rows at once
+        """
+        now_ts = _epoch(now or datetime.now(timezone.utc))
+        column = lambda name: raw[:, RAW[name]]
+
+        total = column("total_steps")
+        completed = column("completed_steps")
+        last_progress = np.where(np.isnan(column("last_progress_ts")), column("start_ts"), column("last_progress_ts"))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            progress = np.where(total > 0, completed / total, 0.0)
+            overrun = np.where(column("estimated_days") > 0, column("elapsed_days") / column("estimated_days"), 0.0)
+
+        features = np.column_stack([
+            column("active"),
+            progress,
+            completed,
+            np.maximum(total - completed, 0.0),
+            (now_ts - column("start_ts")) / SECONDS_PER_DAY,
+            (now_ts - last_progress) / SECONDS_PER_DAY,
+            overrun,
+            column("max_overrun"),
+            column("open_assignments"),
+            column("overdue_assignments"),
+        ])
+
+        # Rows of unknown pathways stay NaN throughout
+        features[np.isnan(raw[:, RAW["active"]])] = np.nan
+
+        return features
+
+    def load(self, db: Session, pathway_ids: List[int]) -> Dict[int, np.ndarray]:
+        """
+        Build raw vectors from the database with one query per aggregate
+        """
+        if not pathway_ids:
+            return {}
+
+        pathway = models.PatientPathway
+        completed = models.CompletedStep
+        assignment = models.StepAssignment
+
+        pathways = db.query(
+            pathway.id,
+            pathway.status,
+            pathway.start_date,
+            func.count(models.PathwayStep.id).label("total_steps")
+        ).outerjoin(
+            models.PathwayStep, models.PathwayStep.template_id == pathway.template_id
+        ).filter(
+            pathway.id.in_(pathway_ids)
+        ).group_by(pathway.id).all()
+
+        # Step duration runs from the previous completion (or the pathway start)
+        previous_completed_at = func.lag(completed.completed_at).over(
+            partition_by=completed.pathway_id,
+            order_by=(completed.completed_at, completed.id)
+        )
+        durations = select(
+            completed.pathway_id,
+            completed.completed_at,
+            models.PathwayStep.estimated_duration,
+            (extract(
+                "epoch",
+                completed.completed_at - func.coalesce(previous_completed_at, pathway.start_date)
+            ) / SECONDS_PER_DAY).label("duration_days")
+        ).join(
+            pathway, pathway.id == completed.pathway_id
+        ).join(
+            models.PathwayStep, models.PathwayStep.id == completed.step_id
+        ).where(
+            completed.pathway_id.in_(pathway_ids)
+        ).subquery()
+
+        estimated = durations.c.estimated_duration
+        progress = {row.pathway_id: row for row in db.execute(select(
+            durations.c.pathway_id,
+            func.count().label("completed_steps"),
+            func.max(durations.c.completed_at).label("last_completed_at"),
+            func.sum(durations.c.duration_days).label("elapsed_days"),
+            func.coalesce(func.sum(estimated), 0).label("estimated_days"),
+            func.coalesce(func.max(durations.c.duration_days / func.nullif(estimated, 0)), 0).label("max_overrun")
+        ).group_by(durations.c.pathway_id))}
+
+        is_open = assignment.status.notin_(CLOSED_ASSIGNMENT_STATUSES)
+        workload = {row.pathway_id: row for row in db.query(
+            assignment.pathway_id,
+            func.count().filter(is_open).label("open_assignments"),
+            func.count().filter(and_(is_open, assignment.overdue_at.isnot(None))).label("overdue_assignments")
+        ).filter(
+            assignment.pathway_id.in_(pathway_ids)
+        ).group_by(assignment.pathway_id)}
+
+        vectors = {}
+        for row in pathways:
+            done = progress.get(row.id)
+            work = workload.get(row.id)
+            vectors[row.id] = np.array([
+                1.0 if row.status == "active" else 0.0,
+                _epoch(row.start_date),
+                _epoch(done.last_completed_at) if done else np.nan,
+                row.total_steps,
+                done.completed_steps if done else 0,
+                float(done.elapsed_days or 0) if done else 0.0,
+                float(done.estimated_days) if done else 0.0,
+                float(done.max_overrun) if done else 0.0,
+                work.open_assignments if work else 0,
+                work.overdue_assignments if work else 0,
+            ], dtype=np.float64)
+
+        return vectors
+
+    def get_panel(self, db: Session, user_id: int):
+        """
+        Active pathways of the patients on a user's caseload
+        """
+        return db.query(
+            models.PatientPathway.id,
+            models.PatientPathway.patient_id
+        ).join(
+            models.UserPatientAccess, models.UserPatientAccess.patient_id == models.PatientPathway.patient_id
+        ).filter(
+            models.UserPatientAccess.user_id == user_id,
+            models.PatientPathway.status == "active"
+        ).order_by(models.PatientPathway.id).all()
+
+# Create a singleton instance
+feature_store = FeatureStore()
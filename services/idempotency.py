@@ -0,0 +1,191 @@
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import update, delete, or_, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+import models
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Any, Callable, Type
+from pydantic import BaseModel
+import hashlib
+import json
+import os
+import time
+from services.scheduler import scheduler
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A key still processing after this long is assumed abandoned and can be taken over
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", "60"))
+# How long a duplicate waits for the first execution before answering 409
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_PURGE_INTERVAL = int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "3600"))
+
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def _sha256(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+class IdempotencyService:
+    """
+    Runs a write at most once per Idempotency-Key.
+
+    The first request with a key claims it with an upsert and executes; its
+    response (2xx, or a 4xx rejection) is stored until the key expires and
+    replayed to every retry with the same method, path and body. Retries
+    that arrive while the first execution is running wait for its result.
+    Server errors release the key so the client can retry.
+    """
+
+    def __init__(self):
+        self.setup_scheduled_jobs()
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("idempotency-key-purge", IDEMPOTENCY_PURGE_INTERVAL, self.purge)
+
+    def fingerprint(self, method: str, path: str, payload: Any) -> str:
+        return _sha256(f"{method} {path} {json.dumps(payload, sort_keys=True, default=str)}")
+
+    def claim(self, db: Session, key_hash: str, fingerprint: str, now: datetime) -> bool:
+        """
+        Take the key for a new execution unless a live one holds it
+        """
+        key = models.IdempotencyKey
+        statement = pg_insert(key).values(
+            key_hash=key_hash,
+            fingerprint=fingerprint,
+            status="processing",
+            created_at=now,
+            expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL)
+        )
+
+        try:
+            claimed = db.execute(statement.on_conflict_do_update(
+                index_elements=["key_hash"],
+                set_={
+                    "fingerprint": statement.excluded.fingerprint,
+                    "status": "processing",
+                    "response_status": None,
+                    "response_body": None,
+                    "created_at": statement.excluded.created_at,
+                    "expires_at": statement.excluded.expires_at
+                },
+                # Only expired keys and abandoned executions are taken over
+                where=or_(
+                    key.expires_at <= now,
+                    and_(key.status == "processing", key.created_at < now - timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT))
+                )
+            ).returning(key.key_hash)).first()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        return claimed is not None
+
+    def record(self, db: Session, key_hash: str, status_code: int, body: Any):
+        try:
+            db.execute(
+                update(models.IdempotencyKey).where(models.IdempotencyKey.key_hash == key_hash).values(
+                    status="completed",
+                    response_status=status_code,
+                    response_body=body
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+    def release(self, db: Session, key_hash: str):
+        db.rollback()
+        try:
+            db.execute(delete(models.IdempotencyKey).where(
+                models.IdempotencyKey.key_hash == key_hash,
+                models.IdempotencyKey.status == "processing"
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error releasing idempotency key: {e}")
+
+    def replay(self, record: models.IdempotencyKey):
+        return JSONResponse(
+            status_code=record.response_status,
+            content=record.response_body,
+            headers={REPLAYED_HEADER: "true"}
+        )
+
+    def execute(self, db: Session, key: Optional[str], request: Request, payload: Any,
+                handler: Callable[[], Any], response_model: Type[BaseModel], status_code: int = 200):
+        """
+        Run handler for a request carrying an optional Idempotency-Key,
+        returning the serialized response or a replay of the stored one
+        """
+        if key is None:
+            return handler()
+
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+
+        key_hash = _sha256(key)
+        fingerprint = self.fingerprint(request.method, request.url.path, payload)
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        delay = 0.05
+
+        while not self.claim(db, key_hash, fingerprint, datetime.now(timezone.utc)):
+            record = db.query(models.IdempotencyKey).filter(
+                models.IdempotencyKey.key_hash == key_hash
+            ).first()
+
+            # Purged between the claim and the read; claim again
+            if record is None:
+                continue
+
+            if record.fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+            if record.status == "completed":
+                return self.replay(record)
+
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+            # End the read transaction so the next check sees the first execution's commit
+            db.rollback()
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        try:
+            result = handler()
+            body = response_model.model_validate(result).model_dump(mode="json")
+        except HTTPException as e:
+            # Rejections are deterministic, so they are replayed too; conflicts
+            # are transient and the retry must run again
+            if e.status_code < 500 and e.status_code != 409:
+                self.record(db, key_hash, e.status_code, {"detail": e.detail})
+            else:
+                self.release(db, key_hash)
+            raise e
+        except Exception as e:
+            self.release(db, key_hash)
+            raise e
+
+        self.record(db, key_hash, status_code, body)
+        return body
+
+    def purge(self, db: Session):
+        try:
+            db.execute(delete(models.IdempotencyKey).where(
+                models.IdempotencyKey.expires_at <= datetime.now(timezone.utc)
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+# Create a singleton instance
+idempotency_service = IdempotencyService()
@@ -0,0 +1,175 @@
+from sqlalchemy.orm import Session
+import models
+import schemas
+from typing import Optional, List, Dict, Any
+from decimal import Decimal
+from abc import ABC, abstractmethod
+import numpy as np
+import os
+from services.feature_store import FEATURE_NAMES
+from services.pathway_analytics import pathway_analytics
+
+# Name of the insight model used by the orchestrator and job queue
+INSIGHT_MODEL = os.getenv("INSIGHT_MODEL", "stub")
+
+
+class InsightModel(ABC):
+    """
+    Interface for insight generators. generate() receives requests of a
+    single insight_type, plus their pathway feature matrix (columns in
+    FEATURE_NAMES order, NaN rows where no pathway is known), and returns one
+    {"title", "description", "confidence"} dict per request, in order, so a
+    batch costs one model call.
+    """
+
+    # Largest batch the model accepts in one call
+    max_batch_size = 32
+
+    @abstractmethod
+    def generate(self, db: Session, insight_type: str, requests: List[schemas.AIInsightCreate],
+                 features: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def score(self, features: np.ndarray) -> np.ndarray:
+        """
+        Risk score in [0, 1] for each row of a feature matrix
+        """
+        pass
+
+
+class StubInsightModel(InsightModel):
+    """
+    Deterministic local model returning canned insights. Used until a real
+    model is configured, and in tests.
+    """
+
+    CANNED = {
+        "care-gap": (
+            "Potential Care Gap Detected",
+            "Patient may be missing recommended follow-up appointments based on their care history.",
+            Decimal("0.85")
+        ),
+        "recommendation": (
+            "Treatment Recommendation",
+            "Consider adjusting medication schedule based on recent lab results and patient feedback.",
+            Decimal("0.85")
+        ),
+        "optimization": (
+            "Pathway Optimization Opportunity",
+            "This step typically takes longer than estimated. Consider adjusting the timeline or providing additional resources.",
+            Decimal("0.85")
+        ),
+        "alert": (
+            "Clinical Alert",
+            "Recent vital signs indicate potential concern. Recommend immediate clinical review.",
+            Decimal("0.92")
+        ),
+    }
+
+    # Fixed logistic weights over FEATURE_NAMES
+    WEIGHTS = np.array([
+        0.0,   # active
+        -1.0,  # progress
+        0.0,   # completed_steps
+        0.1,   # remaining_steps
+        0.01,  # days_active
+        0.15,  # days_since_progress
+        0.8,   # overrun_ratio
+        0.3,   # max_overrun
+        0.05,  # open_assignments
+        0.6,   # overdue_assignments
+    ])
+    BIAS = -2.0
+
+    # Insight types whose confidence comes from the pathway risk score
+    SCORED_TYPES = ("care-gap", "recommendation", "alert")
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        z = np.nan_to_num(features, nan=0.0) @ self.WEIGHTS + self.BIAS
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def generate(self, db: Session, insight_type: str, requests: List[schemas.AIInsightCreate],
+                 features: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        title, description, confidence = self.CANNED.get(insight_type, ("", "", Decimal("0.85")))
+
+        bottlenecks: Dict[int, Optional[Dict[str, Any]]] = {}
+        if insight_type == "optimization":
+            bottlenecks = self.find_bottlenecks(db, requests)
+
+        # Score the whole batch at once; rows without a pathway keep the canned confidence
+        scores = None
+        if features is not None and insight_type in self.SCORED_TYPES:
+            scores = np.where(np.isnan(features).all(axis=1), np.nan, self.score(features))
+
+        results = []
+        for index, request in enumerate(requests):
+            result = {
+                "title": title or request.title,
+                "description": description or request.description,
+                "confidence": confidence
+            }
+
+            if scores is not None and not np.isnan(scores[index]):
+                result["confidence"] = Decimal(str(round(float(scores[index]), 4)))
+
+            bottleneck = bottlenecks.get(index)
+            if bottleneck:
+                result["description"] = (
+                    f"Step \"{bottleneck['step_name']}\" has a median duration of {bottleneck['p50_days']:.1f} days "
+                    f"(p90 {bottleneck['p90_days']:.1f}) against an estimate of {bottleneck['estimated_duration']} days "
+                    f"across {bottleneck['sample_count']} completions. Consider adjusting the timeline or providing additional resources."
+                )
+                result["confidence"] = Decimal(str(min(0.99, 0.5 + bottleneck["sample_count"] / 200))).quantize(Decimal("0.0001"))
+
+            results.append(result)
+
+        return results
+
+    def find_bottlenecks(self, db: Session, requests: List[schemas.AIInsightCreate]):
+        """
+        Worst bottleneck of each request's template, resolving templates from
+        the context or the related pathway. Each template is looked up once.
+        """
+        pathway_ids = {
+            request.related_pathway_id for request in requests
+            if not request.context.get("template_id") and request.related_pathway_id
+        }
+
+        templates_by_pathway = {}
+        if pathway_ids:
+            templates_by_pathway = dict(db.query(
+                models.PatientPathway.id,
+                models.PatientPathway.template_id
+            ).filter(
+                models.PatientPathway.id.in_(pathway_ids)
+            ).all())
+
+        by_template: Dict[int, Optional[Dict[str, Any]]] = {}
+        bottlenecks = {}
+        for index, request in enumerate(requests):
+            template_id = request.context.get("template_id") or templates_by_pathway.get(request.related_pathway_id)
+
+            if not template_id:
+                continue
+
+            if template_id not in by_template:
+                found = pathway_analytics.get_bottlenecks(db, template_id, limit=1)
+                by_template[template_id] = found[0] if found else None
+
+            bottlenecks[index] = by_template[template_id]
+
+        return bottlenecks
+
+
+# Available insight models by name
+INSIGHT_MODELS = {
+    "stub": StubInsightModel,
+}
+
+
+def get_insight_model(name: str = INSIGHT_MODEL) -> InsightModel:
+    if name not in INSIGHT_MODELS:
+        raise ValueError(f"Unknown insight model: {name}")
+
+    return INSIGHT_MODELS[name]()
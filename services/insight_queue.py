@@ -0,0 +1,294 @@
+from sqlalchemy import update, or_, and_
+from sqlalchemy.orm import Session, joinedload
+import models
+import schemas
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any
+import os
+import threading
+import time
+from services.ai_orchestrator import ai_orchestrator
+from services.event_bus import publish_events, subscribe_to_event
+from services.scheduler import scheduler
+
+INSIGHT_WORKERS = int(os.getenv("INSIGHT_WORKERS", "2"))
+INSIGHT_POLL_INTERVAL = float(os.getenv("INSIGHT_POLL_INTERVAL_SECONDS", "1"))
+INSIGHT_MAX_BATCHES_PER_TICK = int(os.getenv("INSIGHT_MAX_BATCHES_PER_TICK", "20"))
+INSIGHT_MAX_ATTEMPTS = int(os.getenv("INSIGHT_MAX_ATTEMPTS", "3"))
+# Running jobs older than this are assumed abandoned by a dead worker
+INSIGHT_JOB_TIMEOUT = int(os.getenv("INSIGHT_JOB_TIMEOUT_SECONDS", "300"))
+# Longest a GET /api/insights/jobs/{id}?wait= may block. Each waiter holds a
+# request thread for the whole wait, so this stays short and clients re-poll.
+INSIGHT_MAX_WAIT = float(os.getenv("INSIGHT_MAX_WAIT_SECONDS", "5"))
+
+FINISHED_JOB_STATUSES = ("completed", "failed")
+
+
+class InsightJobQueue:
+    """
+    Queue of insight requests processed by a pool of scheduler workers.
+    Each batch holds jobs of one insight_type so the model is called once
+    per batch, and results are written with bulk statements.
+    """
+
+    def __init__(self, workers: int = INSIGHT_WORKERS):
+        self.workers = workers
+        # Wakes long-polling readers when a batch in this process finishes
+        self._finished = threading.Condition()
+        self.setup_scheduled_jobs()
+        self.setup_event_listeners()
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("insight-jobs", INSIGHT_POLL_INTERVAL, self.run_tick,
+                           workers=self.workers, exclusive=False)
+
+    def setup_event_listeners(self):
+        subscribe_to_event("insight:job:finished", self.handle_job_finished)
+
+    def handle_job_finished(self, event):
+        with self._finished:
+            self._finished.notify_all()
+
+    def enqueue(self, db: Session, requests: List[schemas.AIInsightCreate]):
+        """
+        Store requests as pending jobs and return them in request order
+        """
+        jobs = [
+            models.InsightJob(
+                insight_type=request.insight_type,
+                request=request.model_dump(mode="json"),
+                status="pending",
+                attempts=0
+            ) for request in requests
+        ]
+
+        try:
+            db.add_all(jobs)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        return jobs
+
+    def get_job(self, db: Session, job_id: int):
+        return db.query(models.InsightJob).options(
+            joinedload(models.InsightJob.insight)
+        ).filter(
+            models.InsightJob.id == job_id
+        ).first()
+
+    def wait_for_job(self, db: Session, job_id: int, timeout: float):
+        """
+        Return the job once it has finished or the timeout passes. Finished
+        batches of this process wake the wait early; jobs finished by other
+        processes are seen on the next poll. The timeout is capped at
+        INSIGHT_MAX_WAIT.
+        """
+        deadline = time.monotonic() + min(timeout, INSIGHT_MAX_WAIT)
+
+        while True:
+            job = self.get_job(db, job_id)
+            remaining = deadline - time.monotonic()
+
+            if job is None or job.status in FINISHED_JOB_STATUSES or remaining <= 0:
+                return job
+
+            # Hand the connection back to the pool while waiting; the next
+            # poll checks one out again and sees new commits
+            db.close()
+
+            with self._finished:
+                self._finished.wait(min(remaining, INSIGHT_POLL_INTERVAL))
+
+    def run_tick(self, db: Session):
+        """
+        Process batches until the queue is empty or the per-tick limit is hit
+        """
+        processed = 0
+        self.fail_timed_out(db, datetime.now(timezone.utc))
+
+        for _ in range(INSIGHT_MAX_BATCHES_PER_TICK):
+            batch = self.process_batch(db)
+
+            if not batch:
+                break
+
+            processed += batch
+
+        return processed
+
+    def timed_out(self, now: datetime):
+        job = models.InsightJob
+        return and_(job.status == "running", job.started_at < now - timedelta(seconds=INSIGHT_JOB_TIMEOUT))
+
+    def fail_timed_out(self, db: Session, now: datetime):
+        """
+        Fail abandoned jobs that already used up their attempts, so a job that
+        keeps killing its worker is not reclaimed forever
+        """
+        job = models.InsightJob
+        error = f"Timed out after {INSIGHT_MAX_ATTEMPTS} attempts"
+
+        try:
+            failed = db.execute(
+                update(job).where(
+                    self.timed_out(now),
+                    job.attempts >= INSIGHT_MAX_ATTEMPTS
+                ).values(
+                    status="failed",
+                    error=error,
+                    completed_at=now
+                ).returning(job.id, job.insight_type),
+                execution_options={"synchronize_session": False}
+            ).all()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        self.publish_failed(db, failed, error)
+
+        return len(failed)
+
+    def claim_batch(self, db: Session, now: datetime):
+        """
+        Claim up to one model batch of jobs sharing the insight_type of the
+        oldest claimable job. SKIP LOCKED lets workers claim disjoint batches.
+        """
+        job = models.InsightJob
+        claimable = or_(
+            job.status == "pending",
+            and_(self.timed_out(now), job.attempts < INSIGHT_MAX_ATTEMPTS)
+        )
+
+        oldest = db.query(job.insight_type).filter(claimable).order_by(
+            job.created_at, job.id
+        ).limit(1).with_for_update(skip_locked=True).first()
+
+        if oldest is None:
+            db.rollback()
+            return []
+
+        rows = db.query(job.id, job.request).filter(
+            claimable,
+            job.insight_type == oldest.insight_type
+        ).order_by(
+            job.created_at, job.id
+        ).limit(ai_orchestrator.model.max_batch_size).with_for_update(skip_locked=True).all()
+
+        if rows:
+            db.execute(
+                update(job).where(job.id.in_([row.id for row in rows])).values(
+                    status="running",
+                    started_at=now,
+                    attempts=job.attempts + 1
+                ),
+                execution_options={"synchronize_session": False}
+            )
+
+        db.commit()
+
+        return rows
+
+    def process_batch(self, db: Session):
+        now = datetime.now(timezone.utc)
+        rows = self.claim_batch(db, now)
+
+        if not rows:
+            return 0
+
+        job_ids = [row.id for row in rows]
+        requests = [schemas.AIInsightCreate(**row.request) for row in rows]
+        insight_type = requests[0].insight_type
+
+        try:
+            # Inference runs outside any transaction; the claim is already committed
+            results = ai_orchestrator.generate_batch(db, insight_type, requests)
+            db.rollback()
+
+            if len(results) != len(requests):
+                raise ValueError(f"Insight model returned {len(results)} results for {len(requests)} requests")
+
+            insight_ids = ai_orchestrator.store_insights(db, requests, results)
+
+            finished_at = datetime.now(timezone.utc)
+            db.execute(update(models.InsightJob), [
+                {"id": job_id, "status": "completed", "insight_id": insight_id, "error": None, "completed_at": finished_at}
+                for job_id, insight_id in zip(job_ids, insight_ids)
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error generating {insight_type} insights for jobs {job_ids}: {e}")
+            self.fail_batch(db, job_ids, str(e))
+            # End the tick so retries wait for the next one
+            return 0
+
+        publish_events(db, [
+            {
+                "event_type": "insight:job:finished",
+                "aggregate_type": "insight_job",
+                "aggregate_id": str(job_id),
+                "data": {
+                    "job_id": job_id,
+                    "status": "completed",
+                    "insight_type": insight_type,
+                    "insight_id": insight_id
+                }
+            } for job_id, insight_id in zip(job_ids, insight_ids)
+        ])
+
+        return len(job_ids)
+
+    def fail_batch(self, db: Session, job_ids: List[int], error: str):
+        """
+        Return jobs to the queue, or fail those that used up their attempts
+        """
+        job = models.InsightJob
+
+        try:
+            failed = db.execute(
+                update(job).where(
+                    job.id.in_(job_ids),
+                    job.attempts >= INSIGHT_MAX_ATTEMPTS
+                ).values(
+                    status="failed",
+                    error=error,
+                    completed_at=datetime.now(timezone.utc)
+                ).returning(job.id, job.insight_type),
+                execution_options={"synchronize_session": False}
+            ).all()
+
+            db.execute(
+                update(job).where(
+                    job.id.in_(job_ids),
+                    job.status == "running"
+                ).values(status="pending", error=error),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        self.publish_failed(db, failed, error)
+
+    def publish_failed(self, db: Session, failed, error: str):
+        if failed:
+            publish_events(db, [
+                {
+                    "event_type": "insight:job:finished",
+                    "aggregate_type": "insight_job",
+                    "aggregate_id": str(row.id),
+                    "data": {
+                        "job_id": row.id,
+                        "status": "failed",
+                        "insight_type": row.insight_type,
+                        "error": error
+                    }
+                } for row in failed
+            ])
+
+# Create a singleton instance
+insight_queue = InsightJobQueue()
@@ -0,0 +1,280 @@
+"""
+Per-request latency and database instrumentation.
+
+MetricsMiddleware times every HTTP request and, through listeners on the
+SQLAlchemy engine, counts the queries it issues, their total time and the
+rows they return. Totals are aggregated per route template and exported in
+the Prometheus text format; requests over the slow thresholds are logged
+with their slowest and most repeated SQL, so N+1 patterns stand out.
+
+Queries run outside a request (scheduler jobs, workers) are not attributed.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple
+import os
+import threading
+import time
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", "50"))
+SLOW_REQUEST_LOG_SIZE = int(os.getenv("SLOW_REQUEST_LOG_SIZE", "100"))
+# Statements included in a slow request's log entry
+SLOW_REQUEST_STATEMENTS = 5
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RequestStats:
+    """
+    Database work of one request, keyed by SQL text
+    """
+
+    __slots__ = ("queries", "db_time", "rows", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        # sql -> [executions, seconds]
+        self.statements: Dict[str, List[float]] = {}
+
+    def record(self, statement: str, seconds: float, rows: int):
+        self.queries += 1
+        self.db_time += seconds
+        self.rows += rows
+
+        totals = self.statements.get(statement)
+        if totals is None:
+            self.statements[statement] = [1, seconds]
+        else:
+            totals[0] += 1
+            totals[1] += seconds
+
+
+# Set for the duration of a request; sync endpoints run in a threadpool that
+# copies the context, so they share the same RequestStats
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class RouteMetrics:
+    __slots__ = ("responses", "latency", "queries", "db_time", "rows")
+
+    def __init__(self):
+        self.responses: Dict[str, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_time = 0.0
+        self.rows = 0
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self._slow_requests = deque(maxlen=SLOW_REQUEST_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = RouteMetrics()
+
+            status_label = str(status)
+            metrics.responses[status_label] = metrics.responses.get(status_label, 0) + 1
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(stats.queries)
+            metrics.db_time += stats.db_time
+            metrics.rows += stats.rows
+
+        if seconds * 1000 >= SLOW_REQUEST_MS or stats.queries >= SLOW_REQUEST_QUERIES:
+            self.log_slow_request(method, route, status, seconds, stats)
+
+    def log_slow_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        ranked = sorted(stats.statements.items(), key=lambda item: item[1][1], reverse=True)
+        repeated = sorted(stats.statements.items(), key=lambda item: item[1][0], reverse=True)
+
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 2),
+            "queries": stats.queries,
+            "distinct_queries": len(stats.statements),
+            "db_ms": round(stats.db_time * 1000, 2),
+            "rows": stats.rows,
+            "slowest_statements": [
+                {"sql": sql, "executions": int(count), "total_ms": round(total * 1000, 2)}
+                for sql, (count, total) in ranked[:SLOW_REQUEST_STATEMENTS]
+            ],
+            "most_repeated_statements": [
+                {"sql": sql, "executions": int(count), "total_ms": round(total * 1000, 2)}
+                for sql, (count, total) in repeated[:SLOW_REQUEST_STATEMENTS] if count > 1
+            ]
+        }
+
+        with self._lock:
+            self._slow_requests.append(entry)
+
+        worst = " ".join(entry["slowest_statements"][0]["sql"].split()) if entry["slowest_statements"] else None
+        print(
+            f"Slow request {method} {route} -> {status}: {entry['duration_ms']}ms, "
+            f"{stats.queries} queries ({entry['distinct_queries']} distinct), {entry['db_ms']}ms in DB, "
+            f"{stats.rows} rows; slowest SQL: {worst}"
+        )
+
+    def get_slow_requests(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = list(self._slow_requests)
+
+        return entries[::-1][:limit]
+
+    def render(self) -> str:
+        """
+        All route metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                "# HELP http_requests_total HTTP responses by route and status.",
+                "# TYPE http_requests_total counter"
+            ]
+            for (method, route), metrics in routes:
+                labels = f'method="{method}",route="{_label(route)}"'
+                for status, count in sorted(metrics.responses.items()):
+                    lines.append(f'http_requests_total{{{labels},status="{status}"}} {count}')
+
+            for name, help_text, attribute in (
+                ("http_request_duration_seconds", "Request latency.", "latency"),
+                ("http_request_db_queries", "Database queries issued per request.", "queries")
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route), metrics in routes:
+                    labels = f'method="{method}",route="{_label(route)}"'
+                    histogram = getattr(metrics, attribute)
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            for name, help_text, attribute in (
+                ("http_request_db_seconds_total", "Time spent in database queries.", "db_time"),
+                ("http_request_db_rows_total", "Rows returned or affected by database queries.", "rows")
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (method, route), metrics in routes:
+                    labels = f'method="{method}",route="{_label(route)}"'
+                    lines.append(f"{name}{{{labels}}} {getattr(metrics, attribute)}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+            self._slow_requests.clear()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request.get()
+    if stats is None:
+        return
+
+    started = conn.info.get("query_started")
+    if not started:
+        return
+
+    seconds = time.perf_counter() - started.pop()
+    stats.record(statement, seconds, max(cursor.rowcount, 0))
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    connection = context.connection
+    started = connection.info.get("query_started") if connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine: Engine):
+    """
+    Attribute the engine's queries to the request running them
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and database work per route template
+    """
+
+    def __init__(self, app, registry: Optional[MetricsRegistry] = None):
+        self.app = app
+        self.registry = registry or metrics_registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = {"code": 500}
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            self.registry.observe(scope["method"], path, status["code"], elapsed, stats)
+
+# Create a singleton instance
+metrics_registry = MetricsRegistry()
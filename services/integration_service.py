@@ -1,11 +1,12 @@
 from sqlalchemy.orm import Session
 import models
 import schemas
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any
-import json
-import random
 from services.event_bus import subscribe_to_event
+from services.integration_worker import integration_worker
+from services.transformation_engine import transformation_engine
+from services.validation import check_references
 
 class IntegrationService:
     def __init__(self):
@@ -26,8 +27,12 @@ class IntegrationService:
         # For now, we'll just print a message
         print(f"Integration handling pathway:step:completed event: {event.id}")
     
-    def execute_integration(self, db: Session, config_id: int, operation: str, payload: Dict[str, Any]):
-        # Create integration request
+    def enqueue_request(self, db: Session, config_id: int, operation: str, payload: Dict[str, Any]):
+        """
+        Store a pending request for the integration worker
+        """
+        check_references(db, {"Integration config": (models.IntegrationConfig, config_id)})
+        
         request = models.IntegrationRequest(
             config_id=config_id,
             operation=operation,
@@ -35,75 +40,49 @@ class IntegrationService:
             status="pending"
         )
         
+        # Coalesced operations wait for the window their batch call is sent in
+        due_at = integration_worker.coalesce_at(db, config_id, operation, datetime.now(timezone.utc))
+        if due_at is not None:
+            request.next_attempt_at = due_at
+        
         db.add(request)
         db.commit()
         db.refresh(request)
         
-        try:
-            # Update status
-            request.status = "processing"
-            db.commit()
-            
-            # Execute the integration
-            # In a real implementation, this would call the external system
-            # For now, we'll simulate a successful response
-            result = None
-            
-            if operation == "getPatient":
-                result = {
-                    "id": payload.get("patientId"),
-                    "externalId": f"EHR-{payload.get('patientId')}",
-                    "demographics": {
-                        "firstName": "John",
-                        "lastName": "Smith",
-                        "dateOfBirth": "1955-03-15",
-                        "gender": "male"
-                    },
-                    "diagnoses": [
-                        {"code": "E11.9", "description": "Type 2 diabetes mellitus without complications"}
-                    ],
-                    "medications": [
-                        {"name": "Metformin", "dosage": "500mg", "frequency": "twice daily"}
-                    ]
-                }
-            elif operation == "createOrders":
-                result = {
-                    "orderId": f"order-{datetime.now().timestamp()}",
-                    "patientId": payload.get("patientId"),
-                    "tests": [
-                        {
-                            "code": test,
-                            "status": "ordered",
-                            "orderedDate": datetime.now().isoformat()
-                        } for test in payload.get("tests", [])
-                    ]
-                }
-            else:
-                result = {"message": "Operation executed successfully"}
-            
-            # Update request with result
-            request.status = "completed"
-            request.result = result
-            request.completed_at = datetime.now()
-            
-            db.commit()
-            db.refresh(request)
-            
-            return result
-        except Exception as e:
-            # Update request with error
-            request.status = "failed"
-            request.error = str(e)
-            request.completed_at = datetime.now()
-            
-            db.commit()
-            
-            raise e
+        return request
+    
+    def execute_integration(self, db: Session, config_id: int, operation: str, payload: Dict[str, Any]):
+        """
+        Queue an integration call and return the pending request without
+        waiting for it. The worker runs wherever the scheduler is enabled;
+        callers follow the request through GET /api/integrations/requests/{id},
+        which can long-poll with ?wait=.
+        """
+        return self.enqueue_request(db, config_id, operation, payload)
+    
+    def transform_payloads(self, db: Session, config_id: int, operation: str, payloads: List[Any]):
+        """
+        Apply a config's compiled mapping to payloads without calling the external system
+        """
+        config = db.query(
+            models.IntegrationConfig.id,
+            models.IntegrationConfig.mappings,
+            models.IntegrationConfig.transformations,
+            models.IntegrationConfig.updated_at
+        ).filter(models.IntegrationConfig.id == config_id).first()
+        
+        if config is None:
+            raise ValueError(f"Integration config {config_id} not found")
+        
+        return transformation_engine.transform_batch(dict(config._mapping), operation, payloads)
     
     def get_integration_configs(self, db: Session):
         return db.query(models.IntegrationConfig).order_by(models.IntegrationConfig.name.asc()).all()
     
     def upsert_integration_config(self, db: Session, config: Dict[str, Any]):
+        # Reject mappings that do not compile before they reach the worker
+        transformation_engine.compile(config.get("mappings"), config.get("transformations"))
+        
         if "id" in config and config["id"]:
             # Update existing config
             db_config = db.query(models.IntegrationConfig).filter(
@@ -133,7 +112,12 @@ class IntegrationService:
                 auth_config=config["auth_config"],
                 enabled=config.get("enabled", True),
                 mappings=config.get("mappings"),
-                transformations=config.get("transformations")
+                transformations=config.get("transformations"),
+                rate_limit_per_second=config.get("rate_limit_per_second"),
+                max_concurrency=config.get("max_concurrency", 4),
+                timeout_seconds=config.get("timeout_seconds", 10.0),
+                max_attempts=config.get("max_attempts", 5),
+                sync_patients=config.get("sync_patients", False)
             )
             
             db.add(db_config)
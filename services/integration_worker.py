@@ -0,0 +1,520 @@
+from sqlalchemy import select, update, or_, and_, func
+from sqlalchemy.orm import Session
+import models
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, List, Dict, Any, Tuple
+import httpx
+import os
+import random
+import threading
+import time
+from services.event_bus import publish_events, subscribe_to_event
+from services.scheduler import scheduler
+from services.transformation_engine import transformation_engine, MappingError
+
+INTEGRATION_WORKERS = int(os.getenv("INTEGRATION_WORKERS", "1"))
+INTEGRATION_POLL_INTERVAL = float(os.getenv("INTEGRATION_POLL_INTERVAL_SECONDS", "1"))
+INTEGRATION_BATCH_SIZE = int(os.getenv("INTEGRATION_BATCH_SIZE", "100"))
+INTEGRATION_MAX_BATCHES_PER_TICK = int(os.getenv("INTEGRATION_MAX_BATCHES_PER_TICK", "10"))
+# Upper bound on HTTP calls in flight per worker process
+INTEGRATION_MAX_IN_FLIGHT = int(os.getenv("INTEGRATION_MAX_IN_FLIGHT", "32"))
+INTEGRATION_BACKOFF_BASE = float(os.getenv("INTEGRATION_BACKOFF_BASE_SECONDS", "1"))
+INTEGRATION_BACKOFF_MAX = float(os.getenv("INTEGRATION_BACKOFF_MAX_SECONDS", "300"))
+# Processing requests older than this are assumed abandoned by a dead worker
+INTEGRATION_PROCESSING_TIMEOUT = int(os.getenv("INTEGRATION_PROCESSING_TIMEOUT_SECONDS", "600"))
+# Requests of a coalesced operation wait this long for others to join their call
+INTEGRATION_COALESCE_WINDOW = float(os.getenv("INTEGRATION_COALESCE_WINDOW_SECONDS", "0.5"))
+INTEGRATION_COALESCE_MAX_BATCH = int(os.getenv("INTEGRATION_COALESCE_MAX_BATCH", "50"))
+# Longest a GET /api/integrations/requests/{id}?wait= may block. Each waiter
+# holds a request thread for the whole wait, so this stays short and clients re-poll.
+INTEGRATION_MAX_WAIT = float(os.getenv("INTEGRATION_MAX_WAIT_SECONDS", "5"))
+
+FINISHED_REQUEST_STATUSES = ("completed", "failed")
+
+# Operations whose requests for the same config are merged into one call of
+# the batch operation: {"orders": [{"requestId", "order"}]} answered by
+# {"results": [{"requestId", "result"} or {"requestId", "error", "retryable"}]}
+COALESCED_OPERATIONS = {"createOrders": "createOrdersBatch"}
+
+
+class RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Token bucket allowing rate calls per second with bursts of up to burst
+    calls. Buckets live in memory, so each worker process has its own.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def backoff_delay(attempts: int, retry_after: Optional[float] = None) -> float:
+    """
+    Exponential backoff with jitter, never shorter than the server's Retry-After
+    """
+    delay = min(INTEGRATION_BACKOFF_MAX, INTEGRATION_BACKOFF_BASE * (2 ** max(attempts - 1, 0)))
+    delay = random.uniform(delay / 2, delay)
+
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+
+    return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def auth_headers(auth_type: str, auth_config: Dict[str, Any]) -> Dict[str, str]:
+    if auth_type == "bearer":
+        return {"Authorization": f"Bearer {auth_config.get('token', '')}"}
+
+    if auth_type == "api_key":
+        return {auth_config.get("header", "X-API-Key"): auth_config.get("key", "")}
+
+    return {}
+
+
+class IntegrationWorker:
+    """
+    Sends pending IntegrationRequest rows to their external systems.
+
+    Scheduler workers claim due requests in batches with SKIP LOCKED. Each
+    config's max_concurrency is enforced across processes by counting its
+    processing rows while its config row is locked. rate_limit_per_second is
+    a token bucket per process: with N processes running the worker the
+    external system can see up to N times the configured rate, so divide
+    the provider's limit by the number of worker processes (or run the
+    scheduler in a single process) when setting it. Calls go through one pooled HTTP client per
+    endpoint, and failures are retried with exponential backoff until the
+    config's max_attempts is used up. Responses are stored after the
+    config's compiled mapping is applied.
+
+    Requests of COALESCED_OPERATIONS are held for a short window and sent
+    together as one call per config, taking a single concurrency slot; the
+    batch response is fanned back out to the individual requests.
+    """
+
+    def __init__(self, workers: int = INTEGRATION_WORKERS):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=INTEGRATION_MAX_IN_FLIGHT, thread_name_prefix="integration-call")
+        self._clients: Dict[Tuple[str, int, float], httpx.Client] = {}
+        self._limiters: Dict[int, Tuple[float, RateLimiter]] = {}
+        self._lock = threading.Lock()
+        # Wakes callers waiting on a request when a batch in this process finishes
+        self._finished = threading.Condition()
+        self.setup_scheduled_jobs()
+        self.setup_event_listeners()
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("integration-requests", INTEGRATION_POLL_INTERVAL, self.run_tick,
+                           workers=self.workers, exclusive=False)
+
+    def setup_event_listeners(self):
+        subscribe_to_event("integration:request:finished", self.handle_request_finished)
+
+    def handle_request_finished(self, event):
+        with self._finished:
+            self._finished.notify_all()
+
+    def client_for(self, config: Dict[str, Any]) -> httpx.Client:
+        key = (config["endpoint"], config["max_concurrency"], config["timeout_seconds"])
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = httpx.Client(
+                    base_url=config["endpoint"],
+                    timeout=config["timeout_seconds"],
+                    limits=httpx.Limits(
+                        max_connections=config["max_concurrency"],
+                        max_keepalive_connections=config["max_concurrency"]
+                    )
+                )
+                self._clients[key] = client
+
+        return client
+
+    def limiter_for(self, config: Dict[str, Any]) -> Optional[RateLimiter]:
+        rate = config["rate_limit_per_second"]
+
+        if not rate:
+            return None
+
+        with self._lock:
+            current = self._limiters.get(config["id"])
+            if current is None or current[0] != rate:
+                current = (rate, RateLimiter(rate))
+                self._limiters[config["id"]] = current
+
+        return current[1]
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients = {}
+
+    def wait_for_request(self, db: Session, request_id: int, timeout: float):
+        """
+        Return the request once it has finished or the timeout passes,
+        capped at INTEGRATION_MAX_WAIT
+        """
+        deadline = time.monotonic() + min(timeout, INTEGRATION_MAX_WAIT)
+
+        while True:
+            request = db.query(models.IntegrationRequest).filter(
+                models.IntegrationRequest.id == request_id
+            ).first()
+            remaining = deadline - time.monotonic()
+
+            if request is None or request.status in FINISHED_REQUEST_STATUSES or remaining <= 0:
+                return request
+
+            # Hand the connection back to the pool while waiting; the next
+            # poll checks one out again and sees new commits
+            db.close()
+
+            with self._finished:
+                self._finished.wait(min(remaining, INTEGRATION_POLL_INTERVAL))
+
+    def coalesce_at(self, db: Session, config_id: int, operation: str, now: datetime) -> Optional[datetime]:
+        """
+        When a new request of a coalesced operation should become due: with
+        the requests already waiting in the open window, or at the end of a
+        new window. None for operations that are sent on their own.
+        """
+        if operation not in COALESCED_OPERATIONS:
+            return None
+
+        request = models.IntegrationRequest
+        window_end = db.query(func.max(request.next_attempt_at)).filter(
+            request.config_id == config_id,
+            request.operation == operation,
+            request.status == "pending",
+            request.attempts == 0,
+            request.next_attempt_at > now
+        ).scalar()
+
+        return window_end or now + timedelta(seconds=INTEGRATION_COALESCE_WINDOW)
+
+    def run_tick(self, db: Session):
+        processed = 0
+
+        for _ in range(INTEGRATION_MAX_BATCHES_PER_TICK):
+            batch = self.process_batch(db)
+
+            if not batch:
+                break
+
+            processed += batch
+
+        return processed
+
+    def claim_batch(self, db: Session, now: datetime):
+        request = models.IntegrationRequest
+        config = models.IntegrationConfig
+        stale = now - timedelta(seconds=INTEGRATION_PROCESSING_TIMEOUT)
+        # Coalesced requests share their call's concurrency slot
+        calls_in_flight = func.count(func.distinct(func.coalesce(request.batch_id, request.id)))
+
+        # Configs already at their concurrency cap are skipped up front
+        saturated = select(request.config_id).join(
+            config, config.id == request.config_id
+        ).where(
+            request.status == "processing",
+            request.started_at >= stale
+        ).group_by(
+            request.config_id, config.max_concurrency
+        ).having(calls_in_flight >= config.max_concurrency)
+
+        try:
+            candidates = db.query(
+                request.id,
+                request.config_id,
+                request.operation,
+                request.payload,
+                request.attempts
+            ).join(
+                config, config.id == request.config_id
+            ).filter(
+                or_(
+                    and_(request.status == "pending", request.next_attempt_at <= now),
+                    and_(request.status == "processing", request.started_at < stale)
+                ),
+                config.enabled.is_(True),
+                request.config_id.notin_(saturated)
+            ).order_by(
+                request.next_attempt_at, request.id
+            ).limit(INTEGRATION_BATCH_SIZE).with_for_update(of=request, skip_locked=True).all()
+
+            if not candidates:
+                db.rollback()
+                return [], {}
+
+            # Locking the configs serializes claimers so concurrency slots are counted once
+            configs = {
+                row.id: dict(row._mapping) for row in db.query(
+                    config.id,
+                    config.endpoint,
+                    config.auth_type,
+                    config.auth_config,
+                    config.rate_limit_per_second,
+                    config.max_concurrency,
+                    config.timeout_seconds,
+                    config.max_attempts,
+                    config.mappings,
+                    config.transformations,
+                    config.updated_at
+                ).filter(
+                    config.id.in_({row.config_id for row in candidates})
+                ).order_by(config.id).with_for_update().all()
+            }
+
+            in_flight = dict(db.query(request.config_id, calls_in_flight).filter(
+                request.config_id.in_(list(configs)),
+                request.status == "processing",
+                request.started_at >= stale
+            ).group_by(request.config_id).all())
+
+            # Each call is a list of rows; coalesced rows join the open call of
+            # their (config, operation) until it is full
+            calls = []
+            open_calls: Dict[Tuple[int, str], List[Any]] = {}
+            for row in candidates:
+                key = (row.config_id, row.operation)
+                open_call = open_calls.get(key)
+
+                if open_call is not None and len(open_call) < INTEGRATION_COALESCE_MAX_BATCH:
+                    open_call.append(row)
+                    continue
+
+                slots = configs[row.config_id]["max_concurrency"] - in_flight.get(row.config_id, 0)
+                if slots > 0:
+                    calls.append([row])
+                    in_flight[row.config_id] = in_flight.get(row.config_id, 0) + 1
+
+                    if row.operation in COALESCED_OPERATIONS:
+                        open_calls[key] = calls[-1]
+
+            if calls:
+                db.execute(update(request), [
+                    {
+                        "id": row.id,
+                        "status": "processing",
+                        "started_at": now,
+                        "attempts": row.attempts + 1,
+                        "batch_id": rows[0].id if rows[0].operation in COALESCED_OPERATIONS else None
+                    } for rows in calls for row in rows
+                ])
+
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        return calls, configs
+
+    def call(self, config: Dict[str, Any], operation: str, payload: Dict[str, Any]):
+        """
+        Send one request, raising RetryableError for failures worth retrying
+        """
+        limiter = self.limiter_for(config)
+        if limiter:
+            limiter.acquire()
+
+        try:
+            response = self.client_for(config).post(
+                f"/{operation}",
+                json=payload,
+                headers=auth_headers(config["auth_type"], config["auth_config"] or {})
+            )
+        except httpx.TransportError as e:
+            # Connection failures and timeouts
+            raise RetryableError(f"{type(e).__name__}: {e}")
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableError(
+                f"HTTP {response.status_code}: {response.text[:500]}",
+                parse_retry_after(response.headers.get("Retry-After"))
+            )
+
+        if response.status_code >= 400:
+            raise ValueError(f"HTTP {response.status_code}: {response.text[:500]}")
+
+        return response.json()
+
+    def outcome(self, row, config: Dict[str, Any], now: datetime, result: Any = None,
+                error: Optional[Exception] = None):
+        """
+        Column values to write back for a request that returned result or raised error
+        """
+        if error is None:
+            return {
+                "id": row.id, "status": "completed", "result": result, "error": None,
+                "next_attempt_at": None, "completed_at": datetime.now(timezone.utc)
+            }
+
+        attempts = row.attempts + 1
+
+        if isinstance(error, RetryableError) and attempts < config["max_attempts"]:
+            return {
+                "id": row.id, "status": "pending", "result": None, "error": str(error),
+                "next_attempt_at": now + timedelta(seconds=backoff_delay(attempts, error.retry_after)),
+                "completed_at": None
+            }
+
+        return {
+            "id": row.id, "status": "failed", "result": None, "error": str(error),
+            "next_attempt_at": None, "completed_at": datetime.now(timezone.utc)
+        }
+
+    def execute(self, row, config: Dict[str, Any], now: datetime):
+        """
+        Run one claimed request and return the column values to write back
+        """
+        try:
+            return self.outcome(row, config, now, result=self.call(config, row.operation, row.payload))
+        except Exception as e:
+            return self.outcome(row, config, now, error=e)
+
+    def execute_batch(self, rows, config: Dict[str, Any], now: datetime):
+        """
+        Send coalesced requests as one call and fan the response back out,
+        returning one outcome per row. A request missing from the response
+        fails rather than being retried, as the EHR may have accepted it.
+        """
+        try:
+            response = self.call(config, COALESCED_OPERATIONS[rows[0].operation], {
+                "orders": [{"requestId": row.id, "order": row.payload} for row in rows]
+            })
+        except Exception as e:
+            return [self.outcome(row, config, now, error=e) for row in rows]
+
+        items = {
+            item.get("requestId"): item for item in (response or {}).get("results") or []
+            if isinstance(item, dict)
+        }
+
+        outcomes = []
+        for row in rows:
+            item = items.get(row.id)
+
+            if item is None:
+                outcomes.append(self.outcome(row, config, now, error=ValueError("Missing from batch response")))
+            elif item.get("error"):
+                error_type = RetryableError if item.get("retryable") else ValueError
+                outcomes.append(self.outcome(row, config, now, error=error_type(str(item["error"]))))
+            else:
+                outcomes.append(self.outcome(row, config, now, result=item.get("result")))
+
+        return outcomes
+
+    def execute_call(self, rows, config: Dict[str, Any], now: datetime):
+        if len(rows) == 1:
+            return [self.execute(rows[0], config, now)]
+
+        return self.execute_batch(rows, config, now)
+
+    def map_results(self, rows, configs: Dict[int, Dict[str, Any]], outcomes: List[Dict[str, Any]]):
+        """
+        Run completed responses through their config's compiled mapping, one
+        batch per (config, operation). Responses that fail to map fail the request.
+        """
+        groups: Dict[Tuple[int, str], List[int]] = {}
+        for index, (row, outcome) in enumerate(zip(rows, outcomes)):
+            if outcome["status"] == "completed":
+                groups.setdefault((row.config_id, row.operation), []).append(index)
+
+        for (config_id, operation), indexes in groups.items():
+            try:
+                results, errors = transformation_engine.transform_batch(
+                    configs[config_id], operation, [outcomes[i]["result"] for i in indexes]
+                )
+            except MappingError as e:
+                results, errors = [None] * len(indexes), [f"Invalid mapping: {e}"] * len(indexes)
+
+            for index, result, error in zip(indexes, results, errors):
+                if error:
+                    outcomes[index].update(status="failed", result=None, error=error)
+                else:
+                    outcomes[index]["result"] = result
+
+    def process_batch(self, db: Session):
+        now = datetime.now(timezone.utc)
+        calls, configs = self.claim_batch(db, now)
+
+        if not calls:
+            return 0
+
+        results = self._executor.map(lambda rows: self.execute_call(rows, configs[rows[0].config_id], now), calls)
+        rows = [row for call_rows in calls for row in call_rows]
+        outcomes = [outcome for call_outcomes in results for outcome in call_outcomes]
+        self.map_results(rows, configs, outcomes)
+
+        try:
+            db.execute(update(models.IntegrationRequest), outcomes)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        rows_by_id = {row.id: row for row in rows}
+        finished = [outcome for outcome in outcomes if outcome["status"] in FINISHED_REQUEST_STATUSES]
+
+        if finished:
+            publish_events(db, [
+                {
+                    "event_type": "integration:request:finished",
+                    "aggregate_type": "integration_request",
+                    "aggregate_id": str(outcome["id"]),
+                    "data": {
+                        "request_id": outcome["id"],
+                        "config_id": rows_by_id[outcome["id"]].config_id,
+                        "operation": rows_by_id[outcome["id"]].operation,
+                        "status": outcome["status"]
+                    }
+                } for outcome in finished
+            ])
+
+        return len(rows)
+
+# Create a singleton instance
+integration_worker = IntegrationWorker()
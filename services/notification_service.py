@@ -1,3 +1,4 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 import models
 import schemas
@@ -54,6 +55,21 @@ class NotificationService:
         
         return notification
     
+    def create_notifications(self, db: Session, data: List[schemas.NotificationCreate], commit: bool = True):
+        """
+        Insert a batch of notifications in one statement. With commit=False
+        they join the caller's transaction.
+        """
+        if not data:
+            return
+
+        db.execute(insert(models.Notification), [
+            {**notification.model_dump(), "status": "unread"} for notification in data
+        ])
+
+        if commit:
+            db.commit()
+    
     def mark_as_read(self, db: Session, notification_id: int):
         notification = db.query(models.Notification).filter(
             models.Notification.id == notification_id
@@ -0,0 +1,113 @@
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+import models
+import schemas
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+import os
+from services.event_bus import publish_event
+from services.notification_service import notification_service
+from services.scheduler import scheduler
+
+OVERDUE_CHECK_INTERVAL = int(os.getenv("OVERDUE_CHECK_INTERVAL_SECONDS", "60"))
+OVERDUE_BATCH_SIZE = int(os.getenv("OVERDUE_BATCH_SIZE", "500"))
+OVERDUE_MAX_BATCHES_PER_TICK = int(os.getenv("OVERDUE_MAX_BATCHES_PER_TICK", "10"))
+
+
+class OverdueDetector:
+    def __init__(self, batch_size: int = OVERDUE_BATCH_SIZE, max_batches_per_tick: int = OVERDUE_MAX_BATCHES_PER_TICK):
+        self.batch_size = batch_size
+        self.max_batches_per_tick = max_batches_per_tick
+        self.setup_scheduled_jobs()
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("overdue-assignments", OVERDUE_CHECK_INTERVAL, self.run_tick)
+
+    def run_tick(self, db: Session, now: Optional[datetime] = None):
+        """
+        Mark overdue assignments, at most max_batches_per_tick batches per
+        call. Anything left over is picked up by the next tick. The whole
+        tick is one transaction, so each assignee gets a single notification
+        and one event covers every assignment marked.
+        """
+        now = now or datetime.now(timezone.utc)
+        rows = []
+
+        try:
+            for _ in range(self.max_batches_per_tick):
+                batch = self.mark_batch(db, now)
+                rows.extend(batch)
+
+                if len(batch) < self.batch_size:
+                    break
+
+            if not rows:
+                db.rollback()
+                return 0
+
+            counts_by_assignee: Dict[int, int] = {}
+            for row in rows:
+                counts_by_assignee[row.assigned_to_id] = counts_by_assignee.get(row.assigned_to_id, 0) + 1
+
+            # One notification per assignee rather than one per assignment
+            notification_service.create_notifications(db, [
+                schemas.NotificationCreate(
+                    recipient_id=user_id,
+                    title="Overdue Assignments",
+                    description=f"{count} of your assigned steps {'is' if count == 1 else 'are'} past due.",
+                    notification_type="overdue",
+                    priority="high"
+                ) for user_id, count in counts_by_assignee.items()
+            ], commit=False)
+
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        publish_event(db, {
+            "event_type": "assignments:overdue",
+            "aggregate_type": "assignment_batch",
+            "aggregate_id": now.isoformat(),
+            "data": {
+                "assignment_ids": [row.id for row in rows],
+                "pathway_ids": sorted({row.pathway_id for row in rows}),
+                "counts_by_assignee": {str(user_id): count for user_id, count in counts_by_assignee.items()},
+                "detected_at": now.isoformat()
+            }
+        })
+
+        return len(rows)
+
+    def mark_batch(self, db: Session, now: datetime):
+        """
+        Set overdue_at on the next batch of overdue assignments without
+        committing. Rows stay locked until the tick commits, and the next
+        batch skips them because overdue_at is no longer null.
+        """
+        assignment = models.StepAssignment
+
+        # Range scan over the partial overdue index; SKIP LOCKED lets
+        # concurrent detectors split the backlog instead of blocking
+        rows = db.query(
+            assignment.id,
+            assignment.pathway_id,
+            assignment.assigned_to_id
+        ).filter(
+            assignment.overdue_at.is_(None),
+            assignment.status.notin_(models.CLOSED_ASSIGNMENT_STATUSES),
+            assignment.due_date < now
+        ).order_by(
+            assignment.due_date.asc()
+        ).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+        if rows:
+            db.execute(
+                update(assignment).where(assignment.id.in_([row.id for row in rows])).values(overdue_at=now),
+                execution_options={"synchronize_session": False}
+            )
+
+        return rows
+
+# Create a singleton instance
+overdue_detector = OverdueDetector()
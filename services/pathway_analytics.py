@@ -0,0 +1,286 @@
+from sqlalchemy import select, insert, delete, extract, func, literal, cast, Integer
+from sqlalchemy.orm import Session
+import models
+from datetime import datetime, date, timedelta, timezone
+from typing import Optional, List, Dict, Any, Tuple
+import math
+import os
+from services.scheduler import scheduler
+
+SECONDS_PER_DAY = 86400.0
+
+# Seconds between incremental refreshes of the daily step aggregates
+ANALYTICS_REFRESH_INTERVAL = int(os.getenv("ANALYTICS_REFRESH_INTERVAL_SECONDS", "3600"))
+
+# Duration histogram buckets grow geometrically: bucket k holds durations in
+# [GROWTH**k, GROWTH**(k+1)) days, so a percentile read from merged buckets is
+# within one bucket width (5%) of the exact value. Shorter durations than
+# DURATION_BUCKET_MIN_DAYS (a minute) share the lowest bucket.
+DURATION_BUCKET_GROWTH = 1.05
+DURATION_BUCKET_MIN_DAYS = 1 / 1440.0
+
+
+def histogram_percentile(buckets: List[Tuple[int, int]], fraction: float) -> float:
+    """
+    Percentile of a duration histogram given as ascending (bucket, count)
+    pairs, interpolated geometrically within the bucket holding the rank
+    (the same rank percentile_cont uses)
+    """
+    total = sum(count for _, count in buckets)
+    rank = fraction * (total - 1)
+
+    seen = 0
+    for bucket, count in buckets:
+        if rank < seen + count:
+            within = (rank - seen + 0.5) / count
+            return DURATION_BUCKET_GROWTH ** (bucket + within)
+        seen += count
+
+    return DURATION_BUCKET_GROWTH ** (buckets[-1][0] + 1)
+
+
+class PathwayAnalytics:
+    def __init__(self):
+        self.setup_scheduled_jobs()
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("step-duration-refresh", ANALYTICS_REFRESH_INTERVAL, self.refresh)
+
+    def _daily_durations(self, day: date):
+        """
+        (template, step, duration) of every step completed on the given UTC
+        day. A step's duration runs from the previous completion in the same
+        pathway (or the pathway start) to its own completion.
+        """
+        start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+        end = start + timedelta(days=1)
+        completed = models.CompletedStep
+
+        # Only pathways with a completion on this day need their history windowed
+        touched = select(completed.pathway_id).where(
+            completed.completed_at >= start,
+            completed.completed_at < end
+        ).distinct()
+
+        previous_completed_at = func.lag(completed.completed_at).over(
+            partition_by=completed.pathway_id,
+            order_by=(completed.completed_at, completed.id)
+        )
+
+        durations = select(
+            models.PatientPathway.template_id,
+            completed.step_id,
+            completed.completed_at,
+            (extract(
+                "epoch",
+                completed.completed_at - func.coalesce(previous_completed_at, models.PatientPathway.start_date)
+            ) / SECONDS_PER_DAY).label("duration_days")
+        ).join(
+            models.PatientPathway, models.PatientPathway.id == completed.pathway_id
+        ).where(
+            completed.pathway_id.in_(touched),
+            completed.completed_at < end
+        ).subquery()
+
+        return select(durations).where(durations.c.completed_at >= start).subquery()
+
+    def _daily_duration_select(self, day: date):
+        """
+        Per (template, step) duration distribution for the given UTC day
+        """
+        durations = self._daily_durations(day)
+        duration = durations.c.duration_days
+
+        return select(
+            literal(day).label("day"),
+            durations.c.template_id,
+            durations.c.step_id,
+            func.count().label("sample_count"),
+            func.avg(duration).label("mean_days"),
+            func.percentile_cont(0.5).within_group(duration).label("p50_days"),
+            func.percentile_cont(0.9).within_group(duration).label("p90_days"),
+            func.max(duration).label("max_days"),
+            models.PathwayStep.estimated_duration
+        ).join(
+            models.PathwayStep, models.PathwayStep.id == durations.c.step_id
+        ).group_by(
+            durations.c.template_id,
+            durations.c.step_id,
+            models.PathwayStep.estimated_duration
+        )
+
+    def _daily_bucket_select(self, day: date):
+        """
+        Per (template, step) duration histogram for the given UTC day
+        """
+        durations = self._daily_durations(day)
+
+        bucketed = select(
+            durations.c.template_id,
+            durations.c.step_id,
+            cast(func.floor(
+                func.ln(func.greatest(durations.c.duration_days, DURATION_BUCKET_MIN_DAYS))
+                / math.log(DURATION_BUCKET_GROWTH)
+            ), Integer).label("bucket")
+        ).subquery()
+
+        return select(
+            literal(day).label("day"),
+            bucketed.c.template_id,
+            bucketed.c.step_id,
+            bucketed.c.bucket,
+            func.count().label("sample_count")
+        ).group_by(
+            bucketed.c.template_id,
+            bucketed.c.step_id,
+            bucketed.c.bucket
+        )
+
+    def materialize_day(self, db: Session, day: date):
+        """
+        Recompute the aggregates for one day, replacing any earlier rows
+        """
+        columns = [
+            "day", "template_id", "step_id", "sample_count", "mean_days",
+            "p50_days", "p90_days", "max_days", "estimated_duration"
+        ]
+
+        try:
+            db.execute(delete(models.StepDurationStat).where(models.StepDurationStat.day == day))
+            db.execute(delete(models.StepDurationBucket).where(models.StepDurationBucket.day == day))
+            result = db.execute(
+                insert(models.StepDurationStat).from_select(columns, self._daily_duration_select(day))
+            )
+            db.execute(
+                insert(models.StepDurationBucket).from_select(
+                    ["day", "template_id", "step_id", "bucket", "sample_count"], self._daily_bucket_select(day)
+                )
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        return result.rowcount
+
+    def refresh(self, db: Session, through: Optional[date] = None):
+        """
+        Materialize every day from the latest materialized day (which may have
+        been partial) through the given day. Returns the number of days processed.
+        """
+        through = through or datetime.now(timezone.utc).date()
+
+        last_day = db.query(func.max(models.StepDurationStat.day)).scalar()
+
+        # Days materialized before duration histograms existed are rebuilt from the start
+        if last_day is not None and db.query(func.max(models.StepDurationBucket.day)).scalar() is None:
+            last_day = None
+
+        if last_day is None:
+            first_completed_at = db.query(func.min(models.CompletedStep.completed_at)).scalar()
+
+            if first_completed_at is None:
+                return 0
+
+            last_day = first_completed_at.astimezone(timezone.utc).date()
+
+        day = last_day
+        processed = 0
+
+        while day <= through:
+            self.materialize_day(db, day)
+            day += timedelta(days=1)
+            processed += 1
+
+        return processed
+
+    def get_step_statistics(self, db: Session, template_id: int, days: int = 30):
+        """
+        Combine the daily aggregates of a template's steps over a trailing
+        window. Counts, means and maxima merge exactly; percentiles come from
+        the summed daily histograms, since percentiles of days cannot be averaged.
+        """
+        since = datetime.now(timezone.utc).date() - timedelta(days=days)
+        stat = models.StepDurationStat
+        bucket = models.StepDurationBucket
+        samples = func.sum(stat.sample_count)
+
+        histograms: Dict[int, List[Tuple[int, int]]] = {}
+        bucket_rows = db.query(
+            bucket.step_id,
+            bucket.bucket,
+            func.sum(bucket.sample_count)
+        ).filter(
+            bucket.template_id == template_id,
+            bucket.day >= since
+        ).group_by(
+            bucket.step_id,
+            bucket.bucket
+        ).order_by(
+            bucket.step_id,
+            bucket.bucket
+        ).all()
+        for step_id, step_bucket, count in bucket_rows:
+            histograms.setdefault(step_id, []).append((step_bucket, int(count)))
+
+        rows = db.query(
+            models.PathwayStep.id.label("step_id"),
+            models.PathwayStep.name.label("step_name"),
+            models.PathwayStep.step_order,
+            models.PathwayStep.estimated_duration,
+            samples.label("sample_count"),
+            (func.sum(stat.mean_days * stat.sample_count) / samples).label("mean_days"),
+            func.max(stat.max_days).label("max_days")
+        ).join(
+            stat, stat.step_id == models.PathwayStep.id
+        ).filter(
+            stat.template_id == template_id,
+            stat.day >= since
+        ).group_by(
+            models.PathwayStep.id
+        ).order_by(
+            models.PathwayStep.step_order
+        ).all()
+
+        statistics = []
+        for row in rows:
+            estimated = row.estimated_duration
+            histogram = histograms.get(row.step_id)
+            if not histogram:
+                continue
+
+            max_days = float(row.max_days)
+            # Never report a percentile past the exact maximum
+            p50_days = min(histogram_percentile(histogram, 0.5), max_days)
+            p90_days = min(histogram_percentile(histogram, 0.9), max_days)
+            statistics.append({
+                "template_id": template_id,
+                "step_id": row.step_id,
+                "step_name": row.step_name,
+                "step_order": row.step_order,
+                "estimated_duration": estimated,
+                "sample_count": int(row.sample_count),
+                "mean_days": float(row.mean_days),
+                "p50_days": p50_days,
+                "p90_days": p90_days,
+                "max_days": max_days,
+                "overrun_ratio": p50_days / estimated if estimated else None
+            })
+
+        return statistics
+
+    def get_bottlenecks(self, db: Session, template_id: int, days: int = 30, limit: int = 5, min_samples: int = 5):
+        """
+        Steps whose median duration exceeds their estimate, worst first
+        """
+        statistics = [
+            s for s in self.get_step_statistics(db, template_id, days)
+            if s["sample_count"] >= min_samples and s["overrun_ratio"] is not None and s["overrun_ratio"] > 1
+        ]
+
+        statistics.sort(key=lambda s: s["overrun_ratio"], reverse=True)
+
+        return statistics[:limit]
+
+# Create a singleton instance
+pathway_analytics = PathwayAnalytics()
@@ -1,25 +1,41 @@
+from sqlalchemy import select, update, func, case, true
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 import models
 import schemas
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 import random
 from services.event_bus import publish_event
+from services.profiling import span, traced
+from services.validation import StaleVersionError
+
+
+def progress_percent(steps_completed: int, total_steps: int, completed: bool = False) -> float:
+    # Decision points can skip steps, so a finished pathway is 100% regardless of the count
+    if completed:
+        return 100.0
+    if not total_steps:
+        return 0.0
+    return min(round(100.0 * steps_completed / total_steps, 1), 100.0)
+
 
 class PathwayEngine:
+    @traced("PathwayEngine.initialize_pathway")
     def initialize_pathway(self, db: Session, data: schemas.PatientPathwayCreate):
-        # Get the template
-        template = db.query(models.PathwayTemplate).filter(
-            models.PathwayTemplate.id == data.template_id
-        ).first()
-        
-        if not template:
-            raise ValueError(f"Pathway template {data.template_id} not found")
-        
-        # Get the steps
-        steps = db.query(models.PathwayStep).filter(
-            models.PathwayStep.template_id == template.id
-        ).order_by(models.PathwayStep.step_order).all()
+        with span("load template and steps"):
+            # Get the template
+            template = db.query(models.PathwayTemplate).filter(
+                models.PathwayTemplate.id == data.template_id
+            ).first()
+            
+            if not template:
+                raise ValueError(f"Pathway template {data.template_id} not found")
+            
+            # Get the steps
+            steps = db.query(models.PathwayStep).filter(
+                models.PathwayStep.template_id == template.id
+            ).order_by(models.PathwayStep.step_order).all()
         
         if not steps:
             raise ValueError(f"Pathway template {data.template_id} has no steps")
@@ -36,12 +52,16 @@ class PathwayEngine:
             status="active",
             start_date=datetime.now(),
             estimated_end_date=estimated_end_date,
-            created_by=data.created_by_id
+            created_by=data.created_by_id,
+            steps_completed=0,
+            total_steps=len(steps),
+            progress_percent=0.0
         )
         
-        db.add(pathway)
-        db.commit()
-        db.refresh(pathway)
+        with span("commit pathway", "db"):
+            db.add(pathway)
+            db.commit()
+            db.refresh(pathway)
         
         # Publish event
         publish_event(db, {
@@ -58,11 +78,13 @@ class PathwayEngine:
         
         return pathway
     
+    @traced("PathwayEngine.complete_step")
     def complete_step(self, db: Session, pathway_id: int, data: schemas.CompleteStepRequest):
         # Get the pathway
-        pathway = db.query(models.PatientPathway).filter(
-            models.PatientPathway.id == pathway_id
-        ).first()
+        with span("load pathway"):
+            pathway = db.query(models.PatientPathway).filter(
+                models.PatientPathway.id == pathway_id
+            ).first()
         
         if not pathway:
             raise ValueError(f"Pathway {pathway_id} not found")
@@ -77,37 +99,40 @@ class PathwayEngine:
                 pathway_id=pathway_id,
                 step_id=data.step_id,
                 completed_by=data.completed_by_id,
+                completed_at=datetime.now(),
                 notes=data.notes
             )
             db.add(completed_step)
             
-            # Get decision points for this step
-            decision_point = db.query(models.DecisionPoint).filter(
-                models.DecisionPoint.step_id == data.step_id
-            ).first()
-            
             next_step_id = None
             is_pathway_completed = False
+            previous_status = pathway.status
             
-            if decision_point:
-                # In a real implementation, we would evaluate the condition
-                # For now, we'll just randomly choose true or false
-                condition_result = random.random() > 0.5
-                next_step_id = decision_point.true_step_id if condition_result else decision_point.false_step_id
-            else:
-                # Find the next sequential step
-                template = db.query(models.PathwayTemplate).join(
-                    models.PatientPathway, models.PathwayTemplate.id == models.PatientPathway.template_id
-                ).filter(models.PatientPathway.id == pathway_id).first()
-                
-                steps = db.query(models.PathwayStep).filter(
-                    models.PathwayStep.template_id == template.id
-                ).order_by(models.PathwayStep.step_order).all()
+            with span("resolve next step"):
+                # Get decision points for this step
+                decision_point = db.query(models.DecisionPoint).filter(
+                    models.DecisionPoint.step_id == data.step_id
+                ).first()
                 
-                current_step_index = next((i for i, step in enumerate(steps) if step.id == data.step_id), -1)
-                
-                if current_step_index < len(steps) - 1:
-                    next_step_id = steps[current_step_index + 1].id
+                if decision_point:
+                    # In a real implementation, we would evaluate the condition
+                    # For now, we'll just randomly choose true or false
+                    condition_result = random.random() > 0.5
+                    next_step_id = decision_point.true_step_id if condition_result else decision_point.false_step_id
+                else:
+                    # Find the next sequential step
+                    template = db.query(models.PathwayTemplate).join(
+                        models.PatientPathway, models.PathwayTemplate.id == models.PatientPathway.template_id
+                    ).filter(models.PatientPathway.id == pathway_id).first()
+                    
+                    steps = db.query(models.PathwayStep).filter(
+                        models.PathwayStep.template_id == template.id
+                    ).order_by(models.PathwayStep.step_order).all()
+                    
+                    current_step_index = next((i for i, step in enumerate(steps) if step.id == data.step_id), -1)
+                    
+                    if current_step_index < len(steps) - 1:
+                        next_step_id = steps[current_step_index + 1].id
             
             # Update the pathway
             if next_step_id:
@@ -121,8 +146,21 @@ class PathwayEngine:
                 pathway.current_step_id = None
                 pathway.updated_at = datetime.now()
             
-            db.commit()
-            db.refresh(pathway)
+            # Progress is written with the step, under the same version check
+            pathway.steps_completed = (pathway.steps_completed or 0) + 1
+            pathway.progress_percent = progress_percent(
+                pathway.steps_completed, pathway.total_steps, is_pathway_completed
+            )
+            pathway.last_completed_at = completed_step.completed_at
+            
+            # The UPDATE matches on the version read above, so a concurrent
+            # completion of the same step fails here instead of duplicating it
+            with span("commit step", "db"):
+                try:
+                    db.commit()
+                except StaleDataError:
+                    raise StaleVersionError(f"Pathway {pathway_id} was modified concurrently; reload and retry")
+                db.refresh(pathway)
             
             # Publish event
             publish_event(db, {
@@ -144,7 +182,9 @@ class PathwayEngine:
                     "aggregate_id": str(pathway_id),
                     "data": {
                         "pathway_id": pathway_id,
-                        "patient_id": pathway.patient_id
+                        "patient_id": pathway.patient_id,
+                        "template_id": pathway.template_id,
+                        "old_status": previous_status
                     }
                 })
             
@@ -154,16 +194,130 @@ class PathwayEngine:
             db.rollback()
             raise e
     
+    @traced("PathwayEngine.update_pathway")
+    def update_pathway(self, db: Session, pathway_id: int, data: schemas.PatientPathwayUpdate):
+        pathway = db.query(models.PatientPathway).filter(
+            models.PatientPathway.id == pathway_id
+        ).first()
+        
+        if not pathway:
+            return None
+        
+        if data.version is not None and data.version != pathway.version:
+            raise StaleVersionError(
+                f"Pathway {pathway_id} is at version {pathway.version}, not {data.version}; reload and retry"
+            )
+        
+        old_status = pathway.status
+        
+        # Only allow updating status and currentStepId
+        if data.status is not None:
+            pathway.status = data.status
+        
+        if data.current_step_id is not None:
+            pathway.current_step_id = data.current_step_id
+        
+        # Completing or reopening a pathway changes its percentage; so can a
+        # manual step move if the template changed since the counts were taken
+        if pathway.status != old_status or data.current_step_id is not None:
+            pathway.total_steps = db.query(models.PathwayStep).filter(
+                models.PathwayStep.template_id == pathway.template_id
+            ).count()
+            pathway.progress_percent = progress_percent(
+                pathway.steps_completed, pathway.total_steps, pathway.status == "completed"
+            )
+        
+        pathway.updated_at = datetime.now()
+        
+        try:
+            db.commit()
+        except StaleDataError:
+            db.rollback()
+            raise StaleVersionError(f"Pathway {pathway_id} was modified concurrently; reload and retry")
+        db.refresh(pathway)
+        
+        if pathway.status != old_status:
+            publish_event(db, {
+                "event_type": "pathway:status:changed",
+                "aggregate_type": "pathway",
+                "aggregate_id": str(pathway_id),
+                "data": {
+                    "pathway_id": pathway_id,
+                    "template_id": pathway.template_id,
+                    "old_status": old_status,
+                    "new_status": pathway.status
+                }
+            })
+        
+        return pathway
+    
+    def refresh_progress(self, db: Session, pathway_ids: Optional[List[int]] = None, missing_only: bool = False):
+        """
+        Recompute the progress fields from the template steps and completed
+        steps, for pathways written outside the engine (bulk loads, rows from
+        before the fields existed). Refreshes every pathway unless ids are
+        given; missing_only limits it to pathways whose total_steps was never set.
+        """
+        pathway = models.PatientPathway
+        
+        total_steps = select(func.count()).where(
+            models.PathwayStep.template_id == pathway.template_id
+        ).scalar_subquery()
+        completed = select(
+            func.count().label("steps_completed"),
+            func.max(models.CompletedStep.completed_at).label("last_completed_at")
+        ).where(
+            models.CompletedStep.pathway_id == pathway.id
+        ).lateral()
+        
+        progress = select(
+            pathway.id,
+            total_steps.label("total_steps"),
+            completed.c.steps_completed,
+            completed.c.last_completed_at
+        ).join(completed, true())
+        if pathway_ids is not None:
+            progress = progress.where(pathway.id.in_(pathway_ids))
+        if missing_only:
+            progress = progress.where(pathway.total_steps == 0)
+        progress = progress.subquery()
+        
+        percent = case(
+            (pathway.status == "completed", 100.0),
+            (progress.c.total_steps == 0, 0.0),
+            else_=func.least(func.round(100.0 * progress.c.steps_completed / progress.c.total_steps, 1), 100.0)
+        )
+        
+        try:
+            result = db.execute(
+                update(pathway).where(pathway.id == progress.c.id).values(
+                    total_steps=progress.c.total_steps,
+                    steps_completed=progress.c.steps_completed,
+                    progress_percent=percent,
+                    last_completed_at=progress.c.last_completed_at
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+        
+        return result.rowcount
+    
+    @traced("PathwayEngine.get_patient_pathway")
     def get_patient_pathway(self, db: Session, pathway_id: int):
         return db.query(models.PatientPathway).filter(
             models.PatientPathway.id == pathway_id
         ).first()
     
+    @traced("PathwayEngine.get_patient_pathways")
     def get_patient_pathways(self, db: Session, patient_id: int):
         return db.query(models.PatientPathway).filter(
             models.PatientPathway.patient_id == patient_id
         ).order_by(models.PatientPathway.created_at.desc()).all()
     
+    @traced("PathwayEngine.get_active_pathways")
     def get_active_pathways(self, db: Session, limit: Optional[int] = None):
         query = db.query(models.PatientPathway).filter(
             models.PatientPathway.status == "active"
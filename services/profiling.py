@@ -0,0 +1,391 @@
+"""
+Opt-in hot-path profiling for single requests.
+
+With PROFILING_ENABLED=true, a request sent with an "X-Profile: spans"
+header records timing spans: PathwayEngine methods and their phases, every
+event bus commit and subscriber call, and each SQL statement. With
+"X-Profile: sample" a sampling profiler also captures the Python stacks of
+the threads running those spans. The finished trace id is returned in the
+X-Profile-Trace response header. The trace itself is served in Chrome Trace
+Event format from /api/profiling/traces/{id}; open it offline in Perfetto
+or chrome://tracing. Without the header, spans cost one context variable
+lookup.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import OrderedDict
+from contextlib import nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_SAMPLE_INTERVAL = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "2")) / 1000
+PROFILING_TRACE_LOG_SIZE = int(os.getenv("PROFILING_TRACE_LOG_SIZE", "20"))
+# Also write each trace to <dir>/<trace id>.json when set
+PROFILING_TRACE_DIR = os.getenv("PROFILING_TRACE_DIR")
+# Spans kept per trace; later ones are counted but dropped
+PROFILING_MAX_SPANS = int(os.getenv("PROFILING_MAX_SPANS", "20000"))
+
+PROFILE_HEADER = b"x-profile"
+TRACE_HEADER = b"x-profile-trace"
+PROFILE_MODES = ("spans", "sample")
+
+# Chrome trace process ids for the two views of a request
+SPANS_PID = 1
+SAMPLES_PID = 2
+
+
+class Trace:
+    """
+    Spans and stack samples of one request, with times in microseconds
+    since the request started
+    """
+
+    def __init__(self, name: str, sample: bool = False):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.created_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.duration_us: Optional[float] = None
+        self.spans: List[Tuple[str, str, float, float, int, Dict[str, Any]]] = []
+        self.dropped_spans = 0
+        self.thread_names: Dict[int, str] = {}
+        # Threads currently inside one of this trace's spans, with nesting depth
+        self.active_threads: Dict[int, int] = {}
+        self.samples: Dict[int, List[Tuple[float, Tuple[str, ...]]]] = {}
+        self.lock = threading.Lock()
+        self.sampler = Sampler(self) if sample else None
+
+    def now_us(self) -> float:
+        return (time.perf_counter() - self.started) * 1e6
+
+    def enter_thread(self):
+        thread = threading.get_ident()
+        with self.lock:
+            self.active_threads[thread] = self.active_threads.get(thread, 0) + 1
+            if thread not in self.thread_names:
+                self.thread_names[thread] = threading.current_thread().name
+
+    def exit_thread(self):
+        thread = threading.get_ident()
+        with self.lock:
+            depth = self.active_threads.get(thread, 0) - 1
+            if depth > 0:
+                self.active_threads[thread] = depth
+            else:
+                self.active_threads.pop(thread, None)
+
+    def add_span(self, name: str, category: str, start_us: float, end_us: float, args: Dict[str, Any]):
+        thread = threading.get_ident()
+        with self.lock:
+            if len(self.spans) >= PROFILING_MAX_SPANS:
+                self.dropped_spans += 1
+                return
+            self.spans.append((name, category, start_us, end_us - start_us, thread, args))
+            if thread not in self.thread_names:
+                self.thread_names[thread] = threading.current_thread().name
+
+    def start(self):
+        if self.sampler:
+            self.sampler.start()
+
+    def finish(self):
+        self.duration_us = self.now_us()
+        if self.sampler:
+            self.sampler.stop()
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            spans = len(self.spans)
+            dropped_spans = self.dropped_spans
+            samples = sum(len(thread_samples) for thread_samples in self.samples.values())
+
+        return {
+            "id": self.id,
+            "name": self.name,
+            "created_at": self.created_at.isoformat(),
+            "duration_ms": round((self.duration_us or 0) / 1000, 2),
+            "spans": spans,
+            "dropped_spans": dropped_spans,
+            "samples": samples
+        }
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        The trace as Chrome Trace Event JSON: spans as complete events, and
+        stack samples folded into nested events per thread (a flame chart)
+        """
+        end = self.duration_us if self.duration_us is not None else self.now_us()
+
+        # The sampler and span threads keep appending while a trace is still
+        # running, so work from copies taken under the lock
+        with self.lock:
+            thread_names = dict(self.thread_names)
+            spans = list(self.spans)
+            samples_by_thread = {thread: list(samples) for thread, samples in self.samples.items()}
+
+        events: List[Dict[str, Any]] = [
+            {"ph": "M", "name": "process_name", "pid": SPANS_PID, "args": {"name": f"{self.name} spans"}},
+            {"ph": "M", "name": "process_name", "pid": SAMPLES_PID, "args": {"name": f"{self.name} samples"}},
+        ]
+
+        for thread, thread_name in thread_names.items():
+            for pid in (SPANS_PID, SAMPLES_PID):
+                events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": thread, "args": {"name": thread_name}})
+
+        for name, category, start, duration, thread, args in spans:
+            events.append({
+                "ph": "X", "name": name, "cat": category, "ts": round(start, 1), "dur": round(duration, 1),
+                "pid": SPANS_PID, "tid": thread, "args": args
+            })
+
+        # Consecutive samples further apart than this mean the thread left the spans
+        gap = PROFILING_SAMPLE_INTERVAL * 1e6 * 3
+
+        for thread, samples in samples_by_thread.items():
+            open_frames: List[Tuple[str, float]] = []
+            previous = 0.0
+            for at, stack in samples + [(end, ())]:
+                if open_frames and at - previous > gap:
+                    for frame, started in reversed(open_frames):
+                        events.append({
+                            "ph": "X", "name": frame, "cat": "sample", "ts": round(started, 1),
+                            "dur": round(previous - started, 1), "pid": SAMPLES_PID, "tid": thread
+                        })
+                    open_frames = []
+                previous = at
+
+                common = 0
+                while common < len(open_frames) and common < len(stack) and open_frames[common][0] == stack[common]:
+                    common += 1
+
+                for frame, started in reversed(open_frames[common:]):
+                    events.append({
+                        "ph": "X", "name": frame, "cat": "sample", "ts": round(started, 1), "dur": round(at - started, 1),
+                        "pid": SAMPLES_PID, "tid": thread
+                    })
+
+                open_frames = open_frames[:common] + [(frame, at) for frame in stack[common:]]
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {**self.summary(), "sample_interval_ms": PROFILING_SAMPLE_INTERVAL * 1000}
+        }
+
+
+class Sampler:
+    """
+    Periodically records the Python stacks of threads inside the trace's spans
+    """
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.run, name=f"profiler-{trace.id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def run(self):
+        trace = self.trace
+
+        while not self._stopped.wait(PROFILING_SAMPLE_INTERVAL):
+            with trace.lock:
+                threads = list(trace.active_threads)
+
+            if not threads:
+                continue
+
+            frames = sys._current_frames()
+            at = trace.now_us()
+            stacks = []
+
+            for thread in threads:
+                frame = frames.get(thread)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+
+                if stack:
+                    stacks.append((thread, tuple(reversed(stack))))
+
+            with trace.lock:
+                for thread, stack in stacks:
+                    trace.samples.setdefault(thread, []).append((at, stack))
+
+
+# Trace of the request being handled; threadpool endpoints inherit it
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+_NO_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "category", "args", "started")
+
+    def __init__(self, trace: Trace, name: str, category: str, args: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.trace.enter_thread()
+        self.started = self.trace.now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.trace.add_span(self.name, self.category, self.started, self.trace.now_us(), self.args)
+        self.trace.exit_thread()
+        return False
+
+
+def span(name: str, category: str = "app", **args):
+    """
+    Time a block in the current request's trace; a no-op when not profiling
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name, category, args)
+
+
+def traced(name: Optional[str] = None, category: str = "app"):
+    """
+    Decorator wrapping every call of a function in a span
+    """
+    def decorate(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            trace = current_trace.get()
+            if trace is None:
+                return function(*args, **kwargs)
+            with _Span(trace, label, category, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace.get()
+    if trace is not None and context is not None:
+        context._profiling_started = trace.now_us()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace.get()
+    started = getattr(context, "_profiling_started", None)
+    if trace is None or started is None:
+        return
+
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    trace.add_span(f"sql {verb}", "sql", started, trace.now_us(), {
+        "statement": " ".join(statement.split())[:1000],
+        "rows": cursor.rowcount
+    })
+
+
+def instrument_engine(engine: Engine):
+    """
+    Record each SQL statement run by a profiled request as a span
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class TraceStore:
+    """
+    The most recent finished traces, oldest evicted first
+    """
+
+    def __init__(self, size: int = PROFILING_TRACE_LOG_SIZE):
+        self.size = size
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.id] = trace
+            while len(self._traces) > self.size:
+                self._traces.popitem(last=False)
+
+        if PROFILING_TRACE_DIR:
+            try:
+                os.makedirs(PROFILING_TRACE_DIR, exist_ok=True)
+                with open(os.path.join(PROFILING_TRACE_DIR, f"{trace.id}.json"), "w") as f:
+                    json.dump(trace.to_chrome_trace(), f)
+            except OSError as e:
+                print(f"Error writing profiling trace {trace.id}: {e}")
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._traces.values())
+        return [trace.summary() for trace in reversed(traces)]
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware tracing requests that carry the X-Profile header
+    """
+
+    def __init__(self, app, store: Optional[TraceStore] = None, enabled: Optional[bool] = None):
+        self.app = app
+        self.store = store or trace_store
+        self.enabled = PROFILING_ENABLED if enabled is None else enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        mode = dict(scope["headers"]).get(PROFILE_HEADER, b"").decode().strip().lower()
+        if mode not in PROFILE_MODES:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}", sample=mode == "sample")
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(TRACE_HEADER, trace.id.encode())]
+            await send(message)
+
+        token = current_trace.set(trace)
+        trace.start()
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            current_trace.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            trace.add_span(f"{scope['method']} {route or scope['path']}", "request", 0.0, trace.now_us(), {"path": scope["path"]})
+            trace.finish()
+            self.store.add(trace)
+
+# Create a singleton instance
+trace_store = TraceStore()
@@ -0,0 +1,110 @@
+from sqlalchemy import select, func
+from database import SessionLocal, engine
+from typing import Dict, Any, Callable, List
+import threading
+import zlib
+
+
+def job_lock_key(name: str) -> int:
+    """
+    Advisory lock key of a job, stable across processes
+    """
+    return zlib.crc32(f"scheduler:{name}".encode())
+
+
+class Scheduler:
+    """
+    Runs registered jobs periodically on daemon threads. Each run gets its
+    own database session, mirroring the per-request sessions of the API.
+
+    Every API process (e.g. each uvicorn worker) starts the same threads.
+    Exclusive jobs take a Postgres advisory lock per run, so only one
+    process runs them at a time and the others skip that tick; queue
+    consumers that already split work with SKIP LOCKED opt out.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def register(self, name: str, interval_seconds: float, job: Callable, workers: int = 1,
+                 exclusive: bool = True):
+        """
+        Register a job taking a database session. Re-registering a name
+        replaces the previous job.
+        """
+        self.jobs[name] = {
+            "name": name,
+            "interval": interval_seconds,
+            "job": job,
+            "workers": workers,
+            "exclusive": exclusive
+        }
+
+    def run_job(self, name: str):
+        """
+        Run a registered job once in the calling thread. An exclusive job
+        already running in another process is skipped and returns None.
+        """
+        job = self.jobs[name]
+
+        if not job["exclusive"]:
+            return self._run(job)
+
+        # The lock is held on its own connection for the whole run; the
+        # job's session commits freely without releasing it
+        key = job_lock_key(name)
+        with engine.connect() as connection:
+            locked = connection.execute(select(func.pg_try_advisory_lock(key))).scalar()
+            connection.commit()
+            if not locked:
+                return None
+
+            try:
+                return self._run(job)
+            finally:
+                connection.execute(select(func.pg_advisory_unlock(key)))
+                connection.commit()
+
+    def _run(self, job: Dict[str, Any]):
+        db = SessionLocal()
+        try:
+            return job["job"](db)
+        finally:
+            db.close()
+
+    def _loop(self, job: Dict[str, Any]):
+        while not self._stop.wait(job["interval"]):
+            try:
+                self.run_job(job["name"])
+            except Exception as e:
+                print(f"Error in scheduled job {job['name']}: {e}")
+
+    def start(self):
+        if self._threads:
+            return
+
+        self._stop.clear()
+
+        for job in self.jobs.values():
+            for worker in range(job["workers"]):
+                thread = threading.Thread(
+                    target=self._loop,
+                    args=(job,),
+                    name=f"{job['name']}-{worker}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+
+        for thread in self._threads:
+            thread.join(timeout)
+
+        self._threads = []
+
+# Create a singleton instance
+scheduler = Scheduler()
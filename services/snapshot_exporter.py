@@ -0,0 +1,320 @@
+from sqlalchemy import select, update, or_, tuple_
+from sqlalchemy import Integer, Float, Numeric, Boolean, DateTime, Date, JSON, ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+import models
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Tuple
+import itertools
+import json
+import os
+import shutil
+from services.scheduler import scheduler
+
+# Root directory of the Parquet snapshots; the scheduled export is off while unset
+SNAPSHOT_EXPORT_DIR = os.getenv("SNAPSHOT_EXPORT_DIR")
+SNAPSHOT_EXPORT_INTERVAL = int(os.getenv("SNAPSHOT_EXPORT_INTERVAL_SECONDS", "3600"))
+# Rows fetched from the server-side cursor and written as one row group
+SNAPSHOT_CHUNK_SIZE = int(os.getenv("SNAPSHOT_CHUNK_SIZE", "50000"))
+# Rows newer than this are left for the next run, so transactions still in
+# flight when a run starts cannot commit a timestamp behind the watermark
+SNAPSHOT_WATERMARK_LAG = int(os.getenv("SNAPSHOT_WATERMARK_LAG_SECONDS", "60"))
+# A running export older than this is assumed dead and can be taken over
+SNAPSHOT_STALE_SECONDS = int(os.getenv("SNAPSHOT_STALE_SECONDS", "3600"))
+
+# Exported table -> (model, watermark column). Incremental runs append rows
+# whose watermark moved past the last export; tables without an updated_at
+# only pick up new rows, so later edits there need a full export.
+SNAPSHOT_TABLES = {
+    "patient_pathways": (models.PatientPathway, "updated_at"),
+    "completed_steps": (models.CompletedStep, "completed_at"),
+    "step_assignments": (models.StepAssignment, "assigned_at"),
+    "notifications": (models.Notification, "created_at"),
+    "ai_insights": (models.AIInsight, "created_at"),
+}
+
+FULL_RUN_KEY = "full"
+
+
+def _arrow_column(column):
+    """
+    Arrow type of a table column and the converter applied to its values
+    """
+    import pyarrow as pa
+
+    column_type = column.type
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC" if column_type.timezone else None), None
+    if isinstance(column_type, Date):
+        return pa.date32(), None
+    if isinstance(column_type, Boolean):
+        return pa.bool_(), None
+    if isinstance(column_type, Integer):
+        return pa.int64(), None
+    if isinstance(column_type, (Float, Numeric)):
+        return pa.float64(), float
+    if isinstance(column_type, (JSON, ARRAY)):
+        return pa.string(), json.dumps
+    return pa.string(), str
+
+
+class SnapshotExporter:
+    """
+    Writes the core tables to Parquet for analytics, off the OLTP path.
+
+    Files are laid out as <dir>/<table>/date=<YYYY-MM-DD>/part-<run>.parquet,
+    partitioned by the UTC day of the table's watermark column. Rows stream
+    from a server-side cursor in (watermark, id) order, so each chunk becomes
+    a row group and only one partition file is open at a time. Files are
+    written under a temporary name and renamed once the table is done; only
+    then does the stored watermark advance. A run's files are named after
+    the position it started from, so a retried run overwrites its own
+    output instead of duplicating it.
+
+    Incremental files form a change log: a pathway updated twice appears
+    twice, and readers keep the newest row per id.
+
+    <dir>/<table> is a symlink to a versioned directory beside it. A full
+    export is built in a new version and the symlink is replaced atomically,
+    so readers always find the table directory, old or new.
+    """
+
+    def __init__(self):
+        self.setup_scheduled_jobs()
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("snapshot-export", SNAPSHOT_EXPORT_INTERVAL, self.export_all)
+
+    def export_all(self, db: Session, full: bool = False, output_dir: Optional[str] = None):
+        output_dir = output_dir or SNAPSHOT_EXPORT_DIR
+        if not output_dir:
+            return []
+
+        states = []
+        for table_name in SNAPSHOT_TABLES:
+            try:
+                states.append(self.export_table(db, table_name, output_dir, full))
+            except Exception as e:
+                print(f"Error exporting {table_name} snapshot: {e}")
+
+        return states
+
+    def get_states(self, db: Session):
+        return db.query(models.SnapshotExportState).order_by(models.SnapshotExportState.table_name).all()
+
+    def claim(self, db: Session, table_name: str, now: datetime) -> bool:
+        state = models.SnapshotExportState
+
+        try:
+            db.execute(pg_insert(state).values(
+                table_name=table_name,
+                status="idle",
+                rows_exported=0,
+                files_written=0
+            ).on_conflict_do_nothing())
+
+            claimed = db.execute(
+                update(state).where(
+                    state.table_name == table_name,
+                    or_(
+                        state.status != "running",
+                        state.started_at < now - timedelta(seconds=SNAPSHOT_STALE_SECONDS)
+                    )
+                ).values(
+                    status="running",
+                    started_at=now,
+                    last_error=None
+                ).returning(state.table_name),
+                execution_options={"synchronize_session": False}
+            ).first()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        return claimed is not None
+
+    def export_table(self, db: Session, table_name: str, output_dir: str, full: bool = False):
+        """
+        Export one table, incrementally from its stored watermark unless full.
+        Returns the state, or None when an export of the table is already running.
+        """
+        if table_name not in SNAPSHOT_TABLES:
+            raise ValueError(f"Unknown snapshot table {table_name}")
+
+        now = datetime.now(timezone.utc)
+        if not self.claim(db, table_name, now):
+            return None
+
+        state = db.query(models.SnapshotExportState).filter(
+            models.SnapshotExportState.table_name == table_name
+        ).first()
+        after = None if full or state.watermark is None else (state.watermark, state.last_id or 0)
+
+        table_dir = os.path.join(output_dir, table_name)
+        if full:
+            # Built beside the live version and swapped in at the end
+            target_dir = self.new_version(table_dir)
+        else:
+            target_dir = table_dir
+            if not os.path.exists(table_dir):
+                self.swap(table_dir, self.new_version(table_dir))
+
+        run_key = FULL_RUN_KEY if after is None else f"{after[0].strftime('%Y%m%dT%H%M%S%f')}-{after[1]}"
+
+        try:
+            position, rows, files = self.write_partitions(
+                db, table_name, target_dir, run_key, after, now - timedelta(seconds=SNAPSHOT_WATERMARK_LAG)
+            )
+
+            if full:
+                retired = self.swap(table_dir, target_dir)
+                if retired is not None:
+                    shutil.rmtree(retired, ignore_errors=True)
+
+            values = {
+                "status": "idle",
+                "completed_at": datetime.now(timezone.utc),
+                "files_written": models.SnapshotExportState.files_written + files
+            }
+            if full:
+                values["rows_exported"] = rows
+                values["files_written"] = files
+            else:
+                values["rows_exported"] = models.SnapshotExportState.rows_exported + rows
+            if position is not None:
+                values["watermark"], values["last_id"] = position
+
+            db.execute(
+                update(models.SnapshotExportState).where(
+                    models.SnapshotExportState.table_name == table_name
+                ).values(**values),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            if full and os.path.realpath(table_dir) != os.path.realpath(target_dir):
+                shutil.rmtree(target_dir, ignore_errors=True)
+            db.execute(
+                update(models.SnapshotExportState).where(
+                    models.SnapshotExportState.table_name == table_name
+                ).values(status="failed", last_error=str(e)),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+            raise e
+
+        db.refresh(state)
+        return state
+
+    def new_version(self, table_dir: str) -> str:
+        version_dir = f"{table_dir}.v{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}"
+        os.makedirs(version_dir)
+        return version_dir
+
+    def swap(self, table_dir: str, version_dir: str) -> Optional[str]:
+        """
+        Point the table symlink at version_dir. Returns the directory it
+        replaced, for the caller to remove, or None.
+        """
+        retired = None
+        if os.path.islink(table_dir):
+            retired = os.path.realpath(table_dir)
+        elif os.path.isdir(table_dir):
+            # A real directory from before versioned snapshots has to move
+            # aside first; it is missing between these two renames, once
+            retired = f"{table_dir}.retired"
+            shutil.rmtree(retired, ignore_errors=True)
+            os.rename(table_dir, retired)
+
+        # rename() replaces a symlink atomically, so the new one is made
+        # under a temporary name first
+        link = f"{table_dir}.link"
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.basename(version_dir), link)
+        os.replace(link, table_dir)
+
+        return retired if retired != os.path.realpath(version_dir) else None
+
+    def write_partitions(self, db: Session, table_name: str, target_dir: str, run_key: str,
+                         after: Optional[Tuple[datetime, int]], until: datetime):
+        """
+        Stream the table's rows past the watermark into day partitions.
+        Returns the last (watermark, id) written, the row count and the file count.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        model, watermark_name = SNAPSHOT_TABLES[table_name]
+        table = model.__table__
+        watermark = table.c[watermark_name]
+
+        columns = list(table.columns)
+        arrow_types = [_arrow_column(column) for column in columns]
+        schema = pa.schema([(column.name, arrow_type) for column, (arrow_type, _) in zip(columns, arrow_types)])
+        watermark_index = columns.index(watermark)
+        id_index = columns.index(table.c.id)
+
+        statement = select(*columns).where(watermark.isnot(None), watermark < until)
+        if after is not None:
+            statement = statement.where(tuple_(watermark, table.c.id) > tuple_(*after))
+        statement = statement.order_by(watermark, table.c.id)
+
+        result = db.connection().execute(statement, execution_options={"yield_per": SNAPSHOT_CHUNK_SIZE})
+
+        writer = None
+        partition = None
+        pending: List[Tuple[str, str]] = []
+        position = None
+        rows = 0
+
+        def close_writer():
+            if writer is not None:
+                writer.close()
+
+        try:
+            for chunk in result.partitions():
+                # Rows arrive in watermark order, so each day is one contiguous run
+                days = itertools.groupby(chunk, key=lambda row: row[watermark_index].astimezone(timezone.utc).date())
+                for day, batch in days:
+                    batch = list(batch)
+                    if day != partition:
+                        close_writer()
+                        partition_dir = os.path.join(target_dir, f"date={day.isoformat()}")
+                        os.makedirs(partition_dir, exist_ok=True)
+                        path = os.path.join(partition_dir, f"part-{run_key}.parquet")
+                        pending.append((f"{path}.tmp", path))
+                        writer = pq.ParquetWriter(f"{path}.tmp", schema, compression="zstd")
+                        partition = day
+
+                    arrays = []
+                    for index, (arrow_type, converter) in enumerate(arrow_types):
+                        values = [row[index] for row in batch]
+                        if converter is not None:
+                            values = [None if value is None else converter(value) for value in values]
+                        arrays.append(pa.array(values, type=arrow_type))
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+                    rows += len(batch)
+                    position = (batch[-1][watermark_index], batch[-1][id_index])
+
+            close_writer()
+            writer = None
+        except Exception:
+            close_writer()
+            for temporary, _ in pending:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+            raise
+        finally:
+            result.close()
+
+        for temporary, path in pending:
+            os.replace(temporary, path)
+
+        return position, rows, len(pending)
+
+# Create a singleton instance
+snapshot_exporter = SnapshotExporter()
@@ -0,0 +1,204 @@
+from sqlalchemy import select, insert, delete, func, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, object_session
+import models
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+import os
+from models import CLOSED_ASSIGNMENT_STATUSES
+from services.event_bus import subscribe_to_event
+from services.scheduler import scheduler
+
+# Seconds between full reconciles of the counter tables
+SUMMARY_RECONCILE_INTERVAL = int(os.getenv("SUMMARY_RECONCILE_INTERVAL_SECONDS", "900"))
+
+
+def pathway_status_deltas(status: Optional[str], sign: int) -> Dict[str, int]:
+    if status in ("active", "completed"):
+        return {status: sign}
+    return {}
+
+
+def assignment_status_deltas(status: Optional[str], sign: int) -> Dict[str, int]:
+    if status == "completed":
+        return {"completed": sign}
+    if status in CLOSED_ASSIGNMENT_STATUSES:
+        return {}
+    return {"active": sign}
+
+
+def overdue_deltas(was_overdue: bool, new_status: Optional[str]) -> Dict[str, int]:
+    # Closing an assignment that was marked overdue takes it off the overdue count
+    if was_overdue and new_status in CLOSED_ASSIGNMENT_STATUSES:
+        return {"overdue": -1}
+    return {}
+
+
+def merge_deltas(*deltas: Dict[str, int]) -> Dict[str, int]:
+    merged: Dict[str, int] = {}
+    for delta in deltas:
+        for key, value in delta.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+class SummaryService:
+    def __init__(self):
+        self.setup_event_listeners()
+        self.setup_scheduled_jobs()
+
+    def setup_event_listeners(self):
+        # Keep the dashboard counters in step with pathway and assignment events
+        subscribe_to_event("pathway:initialized", self.handle_pathway_initialized)
+        subscribe_to_event("pathway:completed", self.handle_pathway_completed)
+        subscribe_to_event("pathway:status:changed", self.handle_pathway_status_changed)
+        subscribe_to_event("step:assigned", self.handle_step_assigned)
+        subscribe_to_event("assignment:status:changed", self.handle_assignment_status_changed)
+        subscribe_to_event("assignment:deleted", self.handle_assignment_deleted)
+        subscribe_to_event("assignment:overdue:cleared", self.handle_assignment_overdue_cleared)
+        subscribe_to_event("assignments:overdue", self.handle_assignments_overdue)
+
+    def setup_scheduled_jobs(self):
+        scheduler.register("summary-reconcile", SUMMARY_RECONCILE_INTERVAL, self.reconcile)
+
+    def handle_pathway_initialized(self, event):
+        self.apply_template_deltas(object_session(event), event.data.get("template_id"), {"active": 1})
+
+    def handle_pathway_completed(self, event):
+        # A pathway on hold can still complete its last step; events recorded
+        # before old_status was carried always came from active pathways
+        deltas = merge_deltas(
+            pathway_status_deltas(event.data.get("old_status", "active"), -1),
+            pathway_status_deltas("completed", 1)
+        )
+        self.apply_template_deltas(object_session(event), event.data.get("template_id"), deltas)
+
+    def handle_pathway_status_changed(self, event):
+        deltas = merge_deltas(
+            pathway_status_deltas(event.data.get("old_status"), -1),
+            pathway_status_deltas(event.data.get("new_status"), 1)
+        )
+        self.apply_template_deltas(object_session(event), event.data.get("template_id"), deltas)
+
+    def handle_step_assigned(self, event):
+        deltas = assignment_status_deltas(event.data.get("status", "pending"), 1)
+        self.apply_assignee_deltas(object_session(event), event.data.get("assigned_to_id"), deltas)
+
+    def handle_assignment_status_changed(self, event):
+        deltas = merge_deltas(
+            assignment_status_deltas(event.data.get("old_status"), -1),
+            assignment_status_deltas(event.data.get("new_status"), 1),
+            overdue_deltas(event.data.get("was_overdue"), event.data.get("new_status"))
+        )
+        self.apply_assignee_deltas(object_session(event), event.data.get("assigned_to_id"), deltas)
+
+    def handle_assignment_deleted(self, event):
+        deltas = merge_deltas(
+            assignment_status_deltas(event.data.get("status"), -1),
+            {"overdue": -1} if event.data.get("was_overdue") else {}
+        )
+        self.apply_assignee_deltas(object_session(event), event.data.get("assigned_to_id"), deltas)
+
+    def handle_assignment_overdue_cleared(self, event):
+        self.apply_assignee_deltas(object_session(event), event.data.get("assigned_to_id"), {"overdue": -1})
+
+    def handle_assignments_overdue(self, event):
+        counts = event.data.get("counts_by_assignee", {})
+        self.apply_assignee_overdue_counts(object_session(event), {int(user_id): count for user_id, count in counts.items()})
+
+    def _increment(self, db: Session, model, key: str, key_value: Optional[int], deltas: Dict[str, int]):
+        deltas = {column: value for column, value in deltas.items() if value}
+
+        if key_value is None or not deltas:
+            return
+
+        self._increment_many(db, model, key, [{key: key_value, **deltas}], list(deltas))
+
+    def _increment_many(self, db: Session, model, key: str, rows: List[Dict[str, int]], columns: List[str]):
+        if db is None or not rows:
+            return
+
+        # Upsert so the first event for a key creates its counter row
+        table = model.__table__
+        statement = pg_insert(model).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[key],
+            set_={
+                **{column: table.c[column] + statement.excluded[column] for column in columns},
+                "updated_at": func.now()
+            }
+        )
+
+        try:
+            db.execute(statement)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+    def apply_template_deltas(self, db: Session, template_id: Optional[int], deltas: Dict[str, int]):
+        self._increment(db, models.TemplateStatusSummary, "template_id", template_id, deltas)
+
+    def apply_assignee_deltas(self, db: Session, user_id: Optional[int], deltas: Dict[str, int]):
+        self._increment(db, models.AssigneeWorkloadSummary, "user_id", user_id, deltas)
+
+    def apply_assignee_overdue_counts(self, db: Session, counts: Dict[int, int]):
+        rows = [{"user_id": user_id, "overdue": count} for user_id, count in counts.items() if count]
+        self._increment_many(db, models.AssigneeWorkloadSummary, "user_id", rows, ["overdue"])
+
+    def reconcile(self, db: Session):
+        """
+        Rebuild both counter tables from the source tables in one transaction,
+        correcting any drift and refreshing the time-based pathway overdue counts
+        """
+        now = datetime.now(timezone.utc)
+        pathway = models.PatientPathway
+        assignment = models.StepAssignment
+        is_active_pathway = pathway.status == "active"
+        is_open_assignment = assignment.status.notin_(CLOSED_ASSIGNMENT_STATUSES)
+
+        template_counts = select(
+            pathway.template_id,
+            func.count().filter(is_active_pathway),
+            func.count().filter(pathway.status == "completed"),
+            func.count().filter(and_(is_active_pathway, pathway.estimated_end_date < now))
+        ).group_by(pathway.template_id)
+
+        assignee_counts = select(
+            assignment.assigned_to_id,
+            func.count().filter(is_open_assignment),
+            func.count().filter(assignment.status == "completed"),
+            func.count().filter(and_(is_open_assignment, assignment.overdue_at.isnot(None)))
+        ).group_by(assignment.assigned_to_id)
+
+        try:
+            db.execute(delete(models.TemplateStatusSummary))
+            db.execute(insert(models.TemplateStatusSummary).from_select(
+                ["template_id", "active", "completed", "overdue"], template_counts
+            ))
+            db.execute(delete(models.AssigneeWorkloadSummary))
+            db.execute(insert(models.AssigneeWorkloadSummary).from_select(
+                ["user_id", "active", "completed", "overdue"], assignee_counts
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+    def get_summary(self, db: Session, template_id: Optional[int] = None, assignee_id: Optional[int] = None):
+        templates = db.query(models.TemplateStatusSummary)
+        assignees = db.query(models.AssigneeWorkloadSummary)
+
+        if template_id:
+            templates = templates.filter(models.TemplateStatusSummary.template_id == template_id)
+
+        if assignee_id:
+            assignees = assignees.filter(models.AssigneeWorkloadSummary.user_id == assignee_id)
+
+        return {
+            "templates": templates.order_by(models.TemplateStatusSummary.template_id).all(),
+            "assignees": assignees.order_by(models.AssigneeWorkloadSummary.user_id).all()
+        }
+
+# Create a singleton instance
+summary_service = SummaryService()
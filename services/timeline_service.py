@@ -0,0 +1,258 @@
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+import models
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+import base64
+import heapq
+import itertools
+import json
+
+# Entry kinds, in the order entries with the same timestamp are listed
+TIMELINE_KINDS = (
+    "pathway_completed",
+    "pathway_started",
+    "step_completed",
+    "step_assigned",
+    "notification",
+    "insight",
+)
+KIND_RANK = {kind: rank for rank, kind in enumerate(TIMELINE_KINDS)}
+
+# Rows fetched per source query while streaming
+TIMELINE_CHUNK_SIZE = 200
+
+
+def encode_cursor(entry: Dict[str, Any]) -> str:
+    position = {"t": entry["occurred_at"].isoformat(), "k": entry["kind"], "i": entry["id"]}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str, int]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        occurred_at = datetime.fromisoformat(position["t"])
+        kind, entry_id = position["k"], int(position["i"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid timeline cursor")
+
+    if kind not in KIND_RANK:
+        raise ValueError("Invalid timeline cursor")
+
+    return occurred_at, kind, entry_id
+
+
+def _pathway_source(patient_id: int, completed: bool):
+    pathway = models.PatientPathway
+    occurred_at = pathway.actual_end_date if completed else pathway.start_date
+
+    statement = select(
+        occurred_at.label("occurred_at"),
+        pathway.id.label("id"),
+        pathway.id.label("pathway_id"),
+        models.PathwayTemplate.name.label("title"),
+        pathway.template_id,
+        pathway.status
+    ).join(
+        models.PathwayTemplate, models.PathwayTemplate.id == pathway.template_id
+    ).where(
+        pathway.patient_id == patient_id,
+        occurred_at.isnot(None)
+    )
+
+    return statement, occurred_at, pathway.id
+
+
+def _step_completed_source(patient_id: int):
+    completed = models.CompletedStep
+
+    statement = select(
+        completed.completed_at.label("occurred_at"),
+        completed.id.label("id"),
+        completed.pathway_id,
+        models.PathwayStep.name.label("title"),
+        completed.step_id,
+        completed.completed_by.label("completed_by_id"),
+        completed.notes
+    ).join(
+        models.PatientPathway, models.PatientPathway.id == completed.pathway_id
+    ).join(
+        models.PathwayStep, models.PathwayStep.id == completed.step_id
+    ).where(
+        models.PatientPathway.patient_id == patient_id,
+        completed.completed_at.isnot(None)
+    )
+
+    return statement, completed.completed_at, completed.id
+
+
+def _step_assigned_source(patient_id: int):
+    assignment = models.StepAssignment
+
+    statement = select(
+        assignment.assigned_at.label("occurred_at"),
+        assignment.id.label("id"),
+        assignment.pathway_id,
+        models.PathwayStep.name.label("title"),
+        assignment.step_id,
+        assignment.assigned_to_id,
+        assignment.assigned_by_id,
+        assignment.due_date,
+        assignment.status
+    ).join(
+        models.PatientPathway, models.PatientPathway.id == assignment.pathway_id
+    ).join(
+        models.PathwayStep, models.PathwayStep.id == assignment.step_id
+    ).where(
+        models.PatientPathway.patient_id == patient_id,
+        assignment.assigned_at.isnot(None)
+    )
+
+    return statement, assignment.assigned_at, assignment.id
+
+
+def _notification_source(patient_id: int):
+    notification = models.Notification
+
+    statement = select(
+        notification.created_at.label("occurred_at"),
+        notification.id.label("id"),
+        notification.related_pathway_id.label("pathway_id"),
+        notification.title,
+        notification.notification_type,
+        notification.recipient_id,
+        notification.priority
+    ).where(
+        notification.related_patient_id == patient_id,
+        notification.created_at.isnot(None)
+    )
+
+    return statement, notification.created_at, notification.id
+
+
+def _insight_source(patient_id: int):
+    insight = models.AIInsight
+
+    statement = select(
+        insight.created_at.label("occurred_at"),
+        insight.id.label("id"),
+        insight.related_pathway_id.label("pathway_id"),
+        insight.title,
+        insight.insight_type,
+        insight.confidence,
+        insight.status
+    ).where(
+        insight.related_patient_id == patient_id,
+        insight.created_at.isnot(None)
+    )
+
+    return statement, insight.created_at, insight.id
+
+
+# Kind -> function building (statement, timestamp column, id column) for a patient
+TIMELINE_SOURCES = {
+    "pathway_completed": lambda patient_id: _pathway_source(patient_id, completed=True),
+    "pathway_started": lambda patient_id: _pathway_source(patient_id, completed=False),
+    "step_completed": _step_completed_source,
+    "step_assigned": _step_assigned_source,
+    "notification": _notification_source,
+    "insight": _insight_source,
+}
+
+
+class TimelineService:
+    """
+    A patient's history across pathways, completed steps, assignments,
+    notifications and insights, newest first.
+
+    Each source is read lazily in keyset-paginated chunks using its
+    (patient, timestamp) index, and heapq.merge interleaves the sorted
+    streams, so a page costs at most one small query per source no matter
+    how long the history is. Entries are ordered by (occurred_at, kind, id)
+    descending; the cursor is the last entry's position in that order.
+    """
+
+    def stream_source(self, db: Session, kind: str, patient_id: int,
+                      after: Optional[Tuple[datetime, str, int]] = None,
+                      chunk_size: int = TIMELINE_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+        statement, occurred_at, id_column = TIMELINE_SOURCES[kind](patient_id)
+        rank = KIND_RANK[kind]
+
+        while True:
+            query = statement
+            if after is not None:
+                after_at, after_kind, after_id = after
+                after_rank = KIND_RANK[after_kind]
+                # Strictly after the cursor in (occurred_at, kind, id) descending order;
+                # the kind is constant per source, so this reduces to a bound on the index
+                if rank < after_rank:
+                    query = query.where(occurred_at < after_at)
+                elif rank > after_rank:
+                    query = query.where(occurred_at <= after_at)
+                else:
+                    query = query.where(tuple_(occurred_at, id_column) < tuple_(after_at, after_id))
+
+            rows = db.execute(
+                query.order_by(occurred_at.desc(), id_column.desc()).limit(chunk_size)
+            ).mappings().all()
+
+            for row in rows:
+                entry = dict(row)
+                entry["kind"] = kind
+                yield entry
+
+            if len(rows) < chunk_size:
+                return
+
+            last = rows[-1]
+            after = (last["occurred_at"], kind, last["id"])
+
+    def stream(self, db: Session, patient_id: int, cursor: Optional[str] = None,
+               kinds: Optional[List[str]] = None, chunk_size: int = TIMELINE_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the patient's timeline entries after the cursor, merged across sources
+        """
+        after = decode_cursor(cursor) if cursor else None
+
+        kinds = kinds or list(TIMELINE_KINDS)
+        unknown = set(kinds) - set(TIMELINE_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown timeline kinds: {', '.join(sorted(unknown))}")
+
+        streams = [
+            self.stream_source(db, kind, patient_id, after, chunk_size)
+            for kind in TIMELINE_KINDS if kind in kinds
+        ]
+
+        # Each stream is descending on (occurred_at, -rank, id), which is the merge key
+        return heapq.merge(
+            *streams,
+            key=lambda entry: (entry["occurred_at"], -KIND_RANK[entry["kind"]], entry["id"]),
+            reverse=True
+        )
+
+    def get_page(self, db: Session, patient_id: int, limit: int = 50, cursor: Optional[str] = None,
+                 kinds: Optional[List[str]] = None) -> Dict[str, Any]:
+        # One extra entry tells whether another page exists; a page never
+        # needs more than that from any single source
+        entries = list(itertools.islice(
+            self.stream(db, patient_id, cursor, kinds, chunk_size=limit + 1), limit + 1
+        ))
+
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        return {
+            "entries": [self.to_entry(entry) for entry in entries],
+            "next_cursor": encode_cursor(entries[-1]) if has_more else None
+        }
+
+    def to_entry(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        base = ("kind", "occurred_at", "id", "pathway_id", "title")
+        return {
+            **{key: entry[key] for key in base},
+            "detail": {key: value for key, value in entry.items() if key not in base}
+        }
+
+# Create a singleton instance
+timeline_service = TimelineService()
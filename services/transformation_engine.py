@@ -0,0 +1,331 @@
+"""
+Compiles IntegrationConfig mappings into callables applied to EHR payloads.
+
+mappings holds one mapping per operation, with "*" as the fallback:
+
+    {
+        "getPatient": {
+            "first_name": "demographics.firstName",
+            "gender": {"source": "demographics.gender", "transform": "gender_code"},
+            "mrn": {"source": "identifier[0].value", "default": None},
+            "codes": {"source": "diagnoses[*].code", "transform": ["upper"], "each": True},
+            "identifiers": {"source": "identifier[*]", "fields": {"system": "system", "value": "value"}},
+            "source_system": {"value": "ehr"}
+        }
+    }
+
+Target keys may be dotted to build nested output. Sources are paths of keys,
+list indexes ([0], [-1]) and wildcards ([*]). transform names a pipeline in
+transformations, a built-in op, or is an inline list of ops, where an op is
+a name or {"op": name, ...params}:
+
+    {"gender_code": ["lower", {"op": "map", "values": {"male": "M", "female": "F"}, "default": "U"}]}
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Callable, Tuple, Union
+import re
+import threading
+
+MISSING = object()
+
+_PATH_TOKEN = re.compile(r"([^.\[\]]+)|\[(\*|-?\d+)\]")
+
+
+class MappingError(ValueError):
+    pass
+
+
+def _parse_date(value: str):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _op_date(format: str = "%Y-%m-%d"):
+    # Clinical payloads repeat the same dates heavily, so conversions are memoized
+    @lru_cache(maxsize=4096)
+    def convert(value: str):
+        return _parse_date(value).strftime(format)
+
+    return lambda value: convert(value) if isinstance(value, str) else value
+
+
+def _op_map(values: Dict[str, Any], default: Any = MISSING):
+    if default is MISSING:
+        return lambda value: values.get(value, value)
+    return lambda value: values.get(value, default)
+
+
+def _op_first():
+    return lambda value: (value[0] if value else None) if isinstance(value, list) else value
+
+
+# Built-in ops; each factory takes the op's params and returns value -> value
+TRANSFORMS: Dict[str, Callable[..., Callable[[Any], Any]]] = {
+    "upper": lambda: lambda value: value.upper() if isinstance(value, str) else value,
+    "lower": lambda: lambda value: value.lower() if isinstance(value, str) else value,
+    "strip": lambda: lambda value: value.strip() if isinstance(value, str) else value,
+    "str": lambda: str,
+    "int": lambda: int,
+    "float": lambda: float,
+    "bool": lambda: bool,
+    "date": _op_date,
+    "map": _op_map,
+    "first": _op_first,
+    "join": lambda sep=" ": lambda value: sep.join(str(item) for item in value if item is not None) if isinstance(value, list) else value,
+    "split": lambda sep=",": lambda value: value.split(sep) if isinstance(value, str) else value,
+    "default": lambda value=None: lambda current: value if current is None else current,
+}
+
+
+def parse_path(path: str) -> List[Union[str, int]]:
+    """
+    Split a source path into keys, int indexes and "*" wildcards
+    """
+    tokens: List[Union[str, int]] = []
+    position = 0
+
+    for match in _PATH_TOKEN.finditer(path):
+        if match.start() != position and path[position:match.start()] != ".":
+            raise MappingError(f"Invalid path: {path}")
+        position = match.end()
+
+        key, index = match.groups()
+        if key is not None:
+            tokens.append(key)
+        elif index == "*":
+            tokens.append("*")
+        else:
+            tokens.append(int(index))
+
+    if not tokens or position != len(path):
+        raise MappingError(f"Invalid path: {path}")
+
+    return tokens
+
+
+def compile_path(path: str) -> Callable[[Any], Any]:
+    """
+    Compile a source path into a getter returning MISSING for absent values
+    """
+    return _compile_tokens(parse_path(path))
+
+
+def _compile_tokens(tokens: List[Union[str, int]]) -> Callable[[Any], Any]:
+    # Runs of plain keys are fused into one loop; a wildcard maps the rest
+    # of the path over each list item
+    if "*" not in tokens:
+        keys = tuple(tokens)
+
+        if len(keys) == 1:
+            key = keys[0]
+
+            def get(value):
+                try:
+                    return value[key]
+                except (KeyError, IndexError, TypeError):
+                    return MISSING
+
+            return get
+
+        def get(value):
+            for key in keys:
+                try:
+                    value = value[key]
+                except (KeyError, IndexError, TypeError):
+                    return MISSING
+            return value
+
+        return get
+
+    split = tokens.index("*")
+    head = _compile_tokens(tokens[:split])
+    rest = _compile_tokens(tokens[split + 1:])
+
+    def get_each(value):
+        items = head(value)
+        if not isinstance(items, list):
+            return MISSING
+        results = [rest(item) for item in items]
+        return [item for item in results if item is not MISSING]
+
+    return get_each
+
+
+class TransformationEngine:
+    """
+    Compiles and caches mapping pipelines per config, recompiling when the
+    config's updated_at changes
+    """
+
+    def __init__(self):
+        self._cache: Dict[int, Tuple[Any, Dict[str, Optional[Callable]]]] = {}
+        self._lock = threading.Lock()
+
+    def compile_ops(self, ops: Any, transformations: Dict[str, Any], seen: Tuple[str, ...] = ()) -> Callable[[Any], Any]:
+        if isinstance(ops, (str, dict)):
+            ops = [ops]
+
+        if not isinstance(ops, list):
+            raise MappingError(f"Invalid transform: {ops!r}")
+
+        functions = []
+        for op in ops:
+            if isinstance(op, str) and op in transformations and op not in TRANSFORMS:
+                if op in seen:
+                    raise MappingError(f"Transformation {op} refers to itself")
+                functions.append(self.compile_ops(transformations[op], transformations, seen + (op,)))
+                continue
+
+            name, params = (op, {}) if isinstance(op, str) else (op.get("op"), {k: v for k, v in op.items() if k != "op"})
+
+            if name not in TRANSFORMS:
+                raise MappingError(f"Unknown transform: {name}")
+
+            try:
+                functions.append(TRANSFORMS[name](**params))
+            except TypeError as e:
+                raise MappingError(f"Invalid parameters for transform {name}: {e}")
+
+        if len(functions) == 1:
+            return functions[0]
+
+        def pipeline(value):
+            for function in functions:
+                value = function(value)
+            return value
+
+        return pipeline
+
+    def compile_field(self, spec: Any, transformations: Dict[str, Any]) -> Callable[[Any], Any]:
+        if isinstance(spec, str):
+            spec = {"source": spec}
+
+        if not isinstance(spec, dict):
+            raise MappingError(f"Invalid field mapping: {spec!r}")
+
+        if "value" in spec:
+            constant = spec["value"]
+            return lambda document: constant
+
+        if "source" not in spec:
+            raise MappingError(f"Field mapping needs a source or value: {spec!r}")
+
+        get = compile_path(spec["source"])
+        default = spec.get("default")
+        each = spec.get("each", False)
+
+        if "fields" in spec:
+            convert = self.compile_mapping(spec["fields"], transformations)
+            each = True
+        elif "transform" in spec:
+            convert = self.compile_ops(spec["transform"], transformations)
+        else:
+            convert = None
+
+        if convert is None:
+            def field(document):
+                value = get(document)
+                return default if value is MISSING or value is None else value
+        elif each:
+            def field(document):
+                value = get(document)
+                if value is MISSING or value is None:
+                    return default
+                if isinstance(value, list):
+                    return [convert(item) if item is not None else None for item in value]
+                return convert(value)
+        else:
+            def field(document):
+                value = get(document)
+                if value is MISSING or value is None:
+                    return default
+                return convert(value)
+
+        return field
+
+    def compile_mapping(self, mapping: Dict[str, Any], transformations: Dict[str, Any]) -> Callable[[Any], Dict[str, Any]]:
+        """
+        Compile {target: spec} into a function building the output document
+        """
+        if not isinstance(mapping, dict):
+            raise MappingError("A mapping must be an object of target fields")
+
+        # Group dotted targets into a tree so each output level is one dict build
+        tree: Dict[str, Any] = {}
+        for target, spec in mapping.items():
+            node = tree
+            parts = target.split(".")
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+                if callable(node):
+                    raise MappingError(f"Target {target} conflicts with another field")
+            if parts[-1] in node:
+                raise MappingError(f"Target {target} is mapped more than once")
+            node[parts[-1]] = self.compile_field(spec, transformations)
+
+        def build(node):
+            fields = tuple(
+                (key, value if callable(value) else build(value)) for key, value in node.items()
+            )
+            return lambda document: {key: field(document) for key, field in fields}
+
+        return build(tree)
+
+    def compile(self, mappings: Optional[Dict[str, Any]], transformations: Optional[Dict[str, Any]]) -> Dict[str, Callable]:
+        """
+        Compile every operation's mapping, raising MappingError on invalid specs
+        """
+        transformations = transformations or {}
+
+        if not isinstance(transformations, dict):
+            raise MappingError("transformations must be an object of named pipelines")
+
+        return {
+            operation: self.compile_mapping(mapping, transformations)
+            for operation, mapping in (mappings or {}).items()
+        }
+
+    def get_pipeline(self, config: Dict[str, Any], operation: str) -> Optional[Callable]:
+        """
+        Compiled mapping of a config for an operation, or None to pass payloads
+        through unchanged. config needs id, updated_at, mappings and transformations.
+        """
+        with self._lock:
+            cached = self._cache.get(config["id"])
+
+        if cached is None or cached[0] != config["updated_at"]:
+            cached = (config["updated_at"], self.compile(config["mappings"], config["transformations"]))
+            with self._lock:
+                self._cache[config["id"]] = cached
+
+        pipelines = cached[1]
+        return pipelines.get(operation, pipelines.get("*"))
+
+    def transform_batch(self, config: Dict[str, Any], operation: str, payloads: List[Any]):
+        """
+        Apply a config's mapping to many payloads. Returns (results, errors)
+        lists parallel to payloads; errors[i] is None when payload i mapped.
+        """
+        pipeline = self.get_pipeline(config, operation)
+
+        if pipeline is None:
+            return list(payloads), [None] * len(payloads)
+
+        results: List[Any] = []
+        errors: List[Optional[str]] = []
+        for payload in payloads:
+            try:
+                results.append(pipeline(payload))
+                errors.append(None)
+            except Exception as e:
+                results.append(None)
+                errors.append(f"Mapping failed: {type(e).__name__}: {e}")
+
+        return results, errors
+
+    def invalidate(self, config_id: int):
+        with self._lock:
+            self._cache.pop(config_id, None)
+
+# Create a singleton instance
+transformation_engine = TransformationEngine()
@@ -0,0 +1,117 @@
+from sqlalchemy import select, exists, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Optional, List, Dict, Any, Iterable, Tuple, Union
+from contextlib import contextmanager
+
+# Messages for unique constraints that stand in for check-then-insert lookups
+CONFLICT_MESSAGES = {
+    "uq_step_assignments_pathway_step": "Assignment already exists for this step",
+    "uq_care_team_members_team_user": "User is already a member of this care team",
+}
+
+
+class ValidationError(ValueError):
+    def __init__(self, message: str, index: Optional[int] = None):
+        super().__init__(message)
+        self.index = index
+
+
+class ReferenceNotFoundError(ValidationError):
+    pass
+
+
+class ConflictError(ValidationError):
+    pass
+
+
+class StaleVersionError(ValidationError):
+    """
+    A row changed between being read and written; the caller can reload and retry
+    """
+    pass
+
+
+def check_references(db: Session, references: Dict[str, Tuple[Any, Union[int, Iterable[int], None]]]):
+    """
+    Verify foreign references of a write in one round trip.
+
+    references maps a label to (model, id) or (model, ids); None ids are
+    skipped. Raises ReferenceNotFoundError("<label> not found") for the first
+    missing reference, in the order given.
+    """
+    columns = []
+    expected: Dict[str, Any] = {}
+
+    for label, (model, value) in references.items():
+        if value is None:
+            continue
+
+        if isinstance(value, int):
+            columns.append(exists().where(model.id == value).label(label))
+            expected[label] = value
+        else:
+            ids = sorted(set(value))
+            if not ids:
+                continue
+            # Collect the ids that do exist so missing ones can be reported
+            found = select(func.array_agg(model.id)).where(model.id.in_(ids)).scalar_subquery()
+            columns.append(found.label(label))
+            expected[label] = ids
+
+    if not columns:
+        return
+
+    row = db.execute(select(*columns)).one()._mapping
+
+    for label, value in expected.items():
+        if isinstance(value, int):
+            if not row[label]:
+                raise ReferenceNotFoundError(f"{label} not found")
+        else:
+            missing = sorted(set(value) - set(row[label] or []))
+            if missing:
+                raise ReferenceNotFoundError(f"{label} not found: {', '.join(str(i) for i in missing)}")
+
+
+def conflict_from_integrity_error(error: IntegrityError, index: Optional[int] = None):
+    """
+    Map a unique or foreign key violation to a ConflictError or
+    ReferenceNotFoundError. Returns None for anything else.
+    """
+    diag = getattr(error.orig, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    code = getattr(error.orig, "pgcode", None)
+
+    if constraint in CONFLICT_MESSAGES:
+        return ConflictError(CONFLICT_MESSAGES[constraint], index)
+
+    # foreign_key_violation: a referenced row vanished after validation
+    if code == "23503":
+        return ReferenceNotFoundError("Referenced record not found", index)
+
+    return None
+
+
+@contextmanager
+def conflicts_mapped(db: Session):
+    """
+    Roll back and translate constraint violations raised inside the block
+    into validation errors
+    """
+    try:
+        yield
+    except IntegrityError as e:
+        db.rollback()
+        conflict = conflict_from_integrity_error(e)
+        if conflict:
+            raise conflict
+        raise e
+
+
+def commit_or_raise_conflict(db: Session):
+    """
+    Commit, translating constraint violations into validation errors
+    """
+    with conflicts_mapped(db):
+        db.commit()